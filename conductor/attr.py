@@ -31,6 +31,9 @@ class Attr(object):
         m_freshness: Freshness of connection - fraction of max_age since last triggerred
     """
 
+    __slots__ = ('m_type', 'm_id', 'm_origvalue', 'm_createtime', 'm_value',
+                 'm_updatetime', 'm_freshness')
+
     def __init__(self, a_type, a_id, value=None):
         self.m_type = a_type
         self.m_id = a_id
@@ -38,6 +38,10 @@ class Body(object):
 
     """
 
+    __slots__ = ('m_field', 'm_id', 'm_x', 'm_y', 'm_ex', 'm_ey', 'm_spd',
+                 'm_espd', 'm_facing', 'm_efacing', 'm_diam', 'm_sigmadiam',
+                 'm_sep', 'm_sigmasep', 'm_leftness', 'm_vis')
+
     def __init__(self, field, b_id, x=None, y=None, ex=None, ey=None,
                  spd=None, espd=None, facing=None, efacing=None,
                  diam=None, sigmadiam=None, sep=None, sigmasep=None,
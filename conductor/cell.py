@@ -29,7 +29,6 @@ import config
 from attr import Attr
 from body import Body
 from leg import Leg
-from journal import Journal
 import logging
 
 # init logging
@@ -48,7 +47,7 @@ class Cell(object):
         m_visible: is this cell displayed currently? (boolean)
         m_conx_dict: connectors attached to this cell (index by cid)
         m_attr_dict: dict of attrs applied to this cell (indexed by type)
-        m_leglist: list of Leg objects
+        m_leglist: list of Leg objects (grows as legs are reported)
         m_body: Body object
         m_gid: GID of group this cell belongs to
         m_fromcenter: dist cell is from geo center of everyone
@@ -63,9 +62,16 @@ class Cell(object):
     set_attrs: add attrs to the attrs list
     add_connector: add new connector to the list connected to this cell
     del_connector: delete a connector from the list connected to this cell
+    make_body: make the cell's Body (subclasses make their own kind)
 
     """
 
+    __slots__ = ('m_field', 'm_id', 'm_x', 'm_y', 'm_vx', 'm_vy', 'm_major',
+                 'm_body_diam', 'm_diam', 'm_minor', 'm_gid', 'm_gsize',
+                 'm_visible', 'm_attr_dict', 'm_conx_dict', 'm_body',
+                 'm_leglist', 'm_fromcenter', 'm_fromnearest', 'm_fromexit',
+                 'm_createtime', 'm_updatetime', 'm_frame')
+
     def __init__(self, field, cellid, x=None, y=None, vx=None, vy=None, major=None,
                  minor=None, gid=None, gsize=None, visible=None, frame=None):
         # passed params
@@ -90,22 +96,24 @@ class Cell(object):
         self.m_diam = self.m_body_diam + config.diam_padding
         if visible is None:
             self.m_visible = True
+        else:
+            self.m_visible = visible
         #
         # init vars
         self.m_attr_dict = {}
         self.m_conx_dict = {}
-        self.m_body = Body(field, cellid)
-        # create an array of leg instances
+        self.m_body = self.make_body(field, cellid)
+        # leg instances are created as the tracker reports them
         self.m_leglist = []
-        for i in range(config.max_legs):
-            self.m_leglist.append(Leg(field, cellid, i))
         self.m_fromcenter = 0
         self.m_fromnearest = 0
         self.m_fromexit = 0
         self.m_createtime = time()
         self.m_updatetime = time()
         self.m_frame = frame
-        self.m_history = []
+
+    def make_body(self, field, cellid):
+        return Body(field, cellid)
 
     def update(self, x=None, y=None, vx=None, vy=None, major=None,
                minor=None, gid=None, gsize=None, visible=None, frame=None):
@@ -148,13 +156,17 @@ class Cell(object):
                     spd=None, espd=None, facing=None, efacing=None,
                     diam=None, sigmadiam=None, sep=None, sigmasep=None,
                     leftness=None, vis=None):
+        self.m_updatetime = time()
         self.m_body.update(x, y, ex, ey, spd, espd, facing, efacing, diam, sigmadiam,
                            sep, sigmasep, leftness, vis)
 
     def update_leg(self, leg, nlegs=None, x=None, y=None,
                    ex=None, ey=None, spd=None, espd=None,
                    heading=None, eheading=None, vis=None):
-        self.m_leglist[leg].update(nlegs, x, y, ex, ey, spd, espd, heading, eheading, vis)
+        self.m_updatetime = time()
+        while len(self.m_leglist) <= leg:
+            self.m_leglist.append(Leg(self.m_field, self.m_id, len(self.m_leglist)))
+        self.m_leglist[leg].update(leg, nlegs, x, y, ex, ey, spd, espd, heading, eheading, vis)
 
     def add_attr(self, atype, value):
         self.m_attr_dict[atype] = Attr(atype, self.m_id, value)
@@ -207,19 +219,3 @@ class Cell(object):
             # we may not need this because the connector calls the same thing
             # for it's two cells, including this one
             #self.del_connector(connector)
-
-    def record_history(self, atype, uid, value, htime):
-        self.m_history.append(Journal(atype, self.m_id, uid, value, htime))
-
-    def get_history(self, uid1):
-        shared_history = []
-        for entry in self.m_history:
-            if entry.uid1 == uid1:
-                shared_history.append(entry)
-        return shared_history
-
-    def have_history(self, uid1):
-        for entry in self.m_history:
-            if entry.uid == uid1:
-                return True
-        return False
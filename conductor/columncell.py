@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Cell that keeps its values in a ColumnStore.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+
+__appname__ = "columncell.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# local classes
+from cell import Cell
+from body import Body
+
+
+def column_property(name, cast=float):
+    """Make a property that reads and writes our slot of a column.
+    NaN in the column reads as None, and None writes as NaN."""
+    def getter(self):
+        value = self.m_store.m_columns[name][self.m_slot]
+        if value != value:
+            return None
+        return cast(value)
+    def setter(self, value):
+        if value is None:
+            value = float('nan')
+        self.m_store.m_columns[name][self.m_slot] = value
+    return property(getter, setter)
+
+
+class ColumnBody(Body):
+    """A Body whose facing lives in the cell's ColumnStore slot."""
+
+    __slots__ = ('m_store', 'm_slot')
+
+    m_facing = column_property('facing')
+
+    def __init__(self, field, b_id, store, slot):
+        self.m_store = store
+        self.m_slot = slot
+        super(ColumnBody, self).__init__(field, b_id)
+
+
+class ColumnCell(Cell):
+    """A Cell that is a thin view over a slot in the field's ColumnStore.
+
+    Works just like a Cell (cell.m_x and friends read and write as before),
+    but the values in COLUMNS live in numpy arrays so bulk code can read a
+    whole column at once.
+
+    Stores the following values (in addition to Cell's):
+        m_store: the ColumnStore we keep our values in
+        m_slot: our row in the store
+
+    detach: copy our values out of the field's store before it reuses our
+        slot
+
+    """
+
+    __slots__ = ('m_store', 'm_slot')
+
+    m_x = column_property('x')
+    m_y = column_property('y')
+    m_vx = column_property('vx')
+    m_vy = column_property('vy')
+    m_major = column_property('major')
+    m_minor = column_property('minor')
+    m_gid = column_property('gid', int)
+    m_fromnearest = column_property('fromnearest')
+    m_createtime = column_property('createtime')
+    m_updatetime = column_property('updatetime')
+
+    def __init__(self, field, cellid, *args, **kwargs):
+        self.m_store = field.m_store
+        self.m_slot = self.m_store.alloc(cellid)
+        super(ColumnCell, self).__init__(field, cellid, *args, **kwargs)
+
+    def make_body(self, field, cellid):
+        return ColumnBody(field, cellid, self.m_store, self.m_slot)
+
+    def detach(self):
+        """Hold on to our values, and let the store reuse our slot.
+
+        Deleted cells may still be referenced elsewhere, so rather than
+        leave them looking at someone else's slot, they get a copy.
+        """
+        store = self.m_store
+        slot = self.m_slot
+        self.m_store = store.snapshot(slot)
+        self.m_slot = 0
+        self.m_body.m_store = self.m_store
+        self.m_body.m_slot = 0
+        store.release(slot)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Columnar backing store for cells.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+
+__appname__ = "columnstore.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# installed modules
+import numpy
+
+# the columns we keep, in the order we keep them
+COLUMNS = ('x', 'y', 'vx', 'vy', 'major', 'minor', 'gid', 'facing',
+           'fromnearest', 'createtime', 'updatetime')
+
+# how many slots we start with
+DEFAULT_CAPACITY = 64
+
+
+class ColumnStore(object):
+    """Keeps cell values in numpy columns, one row (slot) per live cell.
+
+    Each live uid gets a slot that it keeps until it is released, so a
+    column can be read as a whole (e.g., store.column('x')[store.live_slots()])
+    without gathering values from each cell. Unset values are NaN.
+
+    Note that the columns are reallocated when the store grows, so don't
+    hang on to a column across frames.
+
+    Stores the following values:
+        m_columns: dict of float arrays, indexed by column name
+        m_uid: uid that owns each slot (-1 if free)
+        m_free: list of free slots
+        m_capacity: how many slots we have room for
+
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.m_capacity = capacity
+        self.m_columns = {}
+        for name in COLUMNS:
+            self.m_columns[name] = numpy.empty(capacity)
+            self.m_columns[name].fill(numpy.nan)
+        self.m_uid = numpy.empty(capacity, dtype=int)
+        self.m_uid.fill(-1)
+        # pop from the end, so hand out low slots first
+        self.m_free = range(capacity-1, -1, -1)
+
+    def alloc(self, uid):
+        """Give uid a slot and return it."""
+        if not self.m_free:
+            self.grow(self.m_capacity*2)
+        slot = self.m_free.pop()
+        self.m_uid[slot] = uid
+        return slot
+
+    def release(self, slot):
+        """Free up a slot for reuse."""
+        for column in self.m_columns.itervalues():
+            column[slot] = numpy.nan
+        self.m_uid[slot] = -1
+        self.m_free.append(slot)
+
+    def grow(self, capacity):
+        oldcap = self.m_capacity
+        for name, column in self.m_columns.items():
+            newcol = numpy.empty(capacity)
+            newcol.fill(numpy.nan)
+            newcol[:oldcap] = column
+            self.m_columns[name] = newcol
+        newuid = numpy.empty(capacity, dtype=int)
+        newuid.fill(-1)
+        newuid[:oldcap] = self.m_uid
+        self.m_uid = newuid
+        self.m_free = range(capacity-1, oldcap-1, -1) + self.m_free
+        self.m_capacity = capacity
+
+    def column(self, name):
+        """Return the whole column (live and free slots)."""
+        return self.m_columns[name]
+
+    def live_slots(self):
+        """Return an index array of the slots in use."""
+        return numpy.flatnonzero(self.m_uid >= 0)
+
+    def snapshot(self, slot):
+        """Return a one-slot store holding a copy of this slot."""
+        copy = ColumnStore(1)
+        for name, column in self.m_columns.iteritems():
+            copy.m_columns[name][0] = column[slot]
+        copy.m_uid[0] = self.m_uid[slot]
+        copy.m_free = []
+        return copy
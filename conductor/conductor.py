@@ -18,7 +18,7 @@ __license__ = "GNU GPL 3.0 or later"
 
 # core modules
 from time import time
-from math import sqrt
+from math import sqrt, exp
 from itertools import combinations
 from copy import copy
 from cmath import phase, pi
@@ -29,6 +29,11 @@ from cmath import phase, pi
 import config
 import logging
 
+# local classes
+from rhythm import Rhythm
+from xcorr import CrossCorrelator
+from sequence import SequenceMatcher
+
 # constants to make program text cleaner
 CELL_AVG = config.cell_avg_triggers
 CELL_MEM = config.cell_memory_time
@@ -50,6 +55,16 @@ class Conductor(object):
         m_field: store a back ref to the field that called us
         connector_tests: an indexed list of handlers for testing connectors
         m_avg_table: keeps an indexed list of running averages
+        m_avg_time: when each running average last took a sample
+        m_tick: how many times we have tested the connectors
+        m_conx_turns: how many of those ticks each conx type was tested on
+            (fewer when it's in m_skip_types), indexed by type
+        m_rhythm: scores how rhythmic each cell's motion is
+        m_xcorr: correlates the movements of nearby pairs
+        m_skip_types: low priority conx types we only test on alternate frames
+        m_sequences: matches events that unfold over time (tag, transfer)
+        m_cell_every, m_conx_every: how many ticks apart we evaluate slow
+            types, indexed by type (see config.cell_eval_every)
 
     send_rollcall: send the current rollcall to concerned systems
 
@@ -94,10 +109,10 @@ class Conductor(object):
             'contact': self.test_conx_contact,
             'friends': self.test_conx_friends,
             'coord': self.test_conx_coord,
-            #'mirror': self.test_conx_mirror,
-            #'fof': self.test_conx_fof,
+            'mirror': self.test_conx_mirror,
+            'fof': self.test_conx_fof,
             'irlbuds': self.test_conx_irlbuds,
-            #'leastconx': self.test_conx_leastconx,
+            'leastconx': self.test_conx_leastconx,
             'nearby': self.test_conx_nearby,
             'strangers': self.test_conx_strangers,
             #'tag': self.test_conx_tag,
@@ -107,27 +122,57 @@ class Conductor(object):
             # Happenings
             #
             'fusion': self.test_conx_fusion,
-            #'transfer': self.test_conx_transfer
             }
         self.event_tests = {
             #
             # Events
             #
             'touch': self.test_event_touch,
-            'tag': self.test_event_tag
             }
+        # events that unfold over time (tag, transfer) are matched by
+        # m_sequences from config.sequence_rules
 
         self.m_avg_table = {}
+        self.m_avg_time = {}
+        self.m_tick = 0
+        self.m_conx_turns = dict((atype, 0) for atype in self.conx_tests)
+        self.m_rhythm = Rhythm()
+        self.m_xcorr = CrossCorrelator()
+        self.m_sequences = SequenceMatcher()
         self.m_dist_table = {}
         self.m_current_eid=1
+        self.m_skip_types = []
+        self.m_cell_every = self.eval_intervals(config.cell_eval_every)
+        self.m_conx_every = self.eval_intervals(config.connector_eval_every)
         
-    def update(self, field=None, condglobal=None, cellglobal=None):
+    def update(self, field=None, condglobal=None, cellglobal=None,
+               skiptypes=None):
         if field != None:
             self.m_field = field
         if condglobal != None:
             self.m_condglobal = condglobal
         if cellglobal != None:
             self.m_cellglobal = cellglobal
+        if skiptypes != None:
+            self.m_skip_types = skiptypes
+
+    def eval_intervals(self, every):
+        """How many ticks apart to evaluate each type, keeping within
+        config.eval_max_interval."""
+        rate = config.conductor_rate or config.framerate
+        most = max(1, int(config.eval_max_interval * rate))
+        return dict((atype, min(ticks, most)) for atype, ticks in
+                    every.iteritems() if ticks > 1)
+
+    def is_my_turn(self, every, atype, phase, turn):
+        """Is it this cell or pair's turn to evaluate atype this tick?
+
+        turn counts the ticks atype has been tested on, so skipping ticks
+        while shedding load doesn't keep some pairs from ever getting one.
+        """
+        if atype not in every:
+            return True
+        return (turn + phase) % every[atype] == 0
 
     def update_cell_param(self, atype, param, value):
         mod_array = None
@@ -195,6 +240,9 @@ class Conductor(object):
                         record the new value
         """
         #logger.debug("update_all_conx")
+        # correlate movements for coord and mirror (on its own cadence)
+        self.m_xcorr.update(self.m_field)
+
         # Make a copy so we don't run into problems when deleting connections
         new_conx_dict = copy(self.m_field.m_conx_dict)
 
@@ -226,6 +274,20 @@ class Conductor(object):
                     # delete attr and maybe conx
                     self.m_field.del_conx_attr(cid, atype)
 
+        # When we are shedding load, low priority types sit out odd ticks
+        self.m_tick += 1
+        if self.m_tick % 2:
+            skip_types = self.m_skip_types
+        else:
+            skip_types = []
+        for atype in self.m_conx_turns:
+            if atype not in skip_types:
+                self.m_conx_turns[atype] += 1
+
+        # Pairs that ran out of time in a sequence start over
+        now = self.m_field.now()
+        self.m_sequences.expire(now)
+
         # Now add new connections
         for (cell0, cell1) in list(combinations(self.m_field.m_cell_dict.values(), 2)):
             uid0 = cell0.m_id
@@ -237,6 +299,11 @@ class Conductor(object):
                 # calc distance once
                 self.m_dist_table[cid] = self.dist(cell0, cell1)
                 for atype, conx_test in self.conx_tests.iteritems():
+                    if atype in skip_types or \
+                            not self.is_my_turn(self.m_conx_every, atype,
+                                                uid0 + uid1,
+                                                self.m_conx_turns[atype]):
+                        continue
                     running_avg = conx_test(cid, atype, cell0, cell1)
                     if atype in CONX_AVG:
                         avg_trigger = CONX_AVG[atype]
@@ -252,20 +319,26 @@ class Conductor(object):
                         # create or update connection
                         self.m_field.update_conx_attr(cid, uid0, uid1, atype, running_avg, running_avg >= avg_trigger)
                 for etype, event_test in self.event_tests.iteritems():
-                    if etype in CONX_AGE:
-                        max_age = CONX_AGE[etype]
-                    else:
-                        max_age = 5
-
                     score = event_test(cid, etype, cell0, cell1)
                     if score > 0:
-                        eid=self.m_field.find_or_delete_event(uid0, uid1, etype,max_age)
-                        if eid==None:
-                            eid=self.m_current_eid
-                            self.m_current_eid+=1
-                            logger.info("triggerred event %s %s between %d and %d with score %.3f, maxage=%.2f",eid, etype, uid0, uid1, score,max_age)
-                            self.m_field.new_event(eid, uid0, uid1, etype, score)
-                            
+                        self.fire_event(uid0, uid1, etype, score)
+                for (etype, uida, uidb, score) in self.m_sequences.advance(
+                        cid, cell0, cell1, self.m_dist_table[cid], now):
+                    self.fire_event(uida, uidb, etype, score)
+
+    def fire_event(self, uid0, uid1, etype, score):
+        """Send an event, unless we sent the same one within its max age."""
+        if etype in CONX_AGE:
+            max_age = CONX_AGE[etype]
+        else:
+            max_age = 5
+        eid=self.m_field.find_or_delete_event(uid0, uid1, etype,max_age)
+        if eid==None:
+            eid=self.m_current_eid
+            self.m_current_eid+=1
+            logger.info("triggerred event %s %s between %d and %d with score %.3f, maxage=%.2f",eid, etype, uid0, uid1, score,max_age)
+            self.m_field.new_event(eid, uid0, uid1, etype, score)
+
     def record_conx_avg(self, uid, atype, sample):
         """Track Exponentially decaying weighted moving averages (ema) in an indexed dict."""
         index = str(uid)+'-'+str(atype)
@@ -273,16 +346,7 @@ class Conductor(object):
             mem_time = CONX_MEM[atype]
         else:
             mem_time = CONX_MEM["default"]
-        if mem_time:
-            k = 1 - 1/(config.framerate*float(mem_time))
-            if index in self.m_avg_table:
-                old_avg = self.m_avg_table[index]
-            else:
-                old_avg = 0
-            self.m_avg_table[index] = k*old_avg + (1-k)*sample
-        else:
-            self.m_avg_table[index] = sample
-        return self.m_avg_table[index]
+        return self.record_avg(index, mem_time, sample)
 
     def get_conx_avg(self, uid, atype):
         """Retreive Exponentially decaying weighted moving averages (ema) in an indexed dict."""
@@ -325,6 +389,7 @@ class Conductor(object):
                         record the new value
         """
         #logger.debug( "update_all_cells")
+        self.m_rhythm.update(self.m_field)
         new_cell_dict = copy(self.m_field.m_cell_dict)
 
         # iterate over every connector
@@ -362,6 +427,9 @@ class Conductor(object):
         for uid in self.m_field.m_cell_dict:
             if self.m_field.is_cell_good_to_go(uid):
                 for atype, cell_test in self.cell_tests.iteritems():
+                    if not self.is_my_turn(self.m_cell_every, atype, uid,
+                                           self.m_tick):
+                        continue
                     running_avg = cell_test(uid, atype)
                     if atype in CELL_AVG:
                         avg_trigger = CELL_AVG[atype]
@@ -383,15 +451,30 @@ class Conductor(object):
             mtime = CELL_MEM[atype]
         else:
             mtime = CELL_MEM["default"]
-        if index in self.m_avg_table:
-            old_avg = self.m_avg_table[index]
-        else:
-            old_avg = 0
-        if float(mtime)*config.framerate <= 1:
+        return self.record_avg(index, mtime, sample)
+
+    def record_avg(self, index, mem_time, sample):
+        """Fold a sample into the ema at index, weighted by the time since
+        the last sample.
+
+        The decay is exp(-dt/mem_time), so the average behaves the same
+        whether we sample every tracker frame or only a few times a second.
+        dt comes from the tracker clock when we have it (see Field.now).
+        """
+        now = self.m_field.now()
+        last = self.m_avg_time.get(index)
+        self.m_avg_time[index] = now
+        if float(mem_time)*config.framerate <= 1:
             self.m_avg_table[index] = sample
+            return sample
+        if last is None or now < last:
+            # first sample, or the tracker clock restarted
+            dt = 1.0/config.framerate
         else:
-            k = 1 - 1/(config.framerate*float(mtime))
-            self.m_avg_table[index] = k*old_avg + (1-k)*sample
+            dt = now - last
+        k = exp(-dt/float(mem_time))
+        old_avg = self.m_avg_table.get(index, 0)
+        self.m_avg_table[index] = k*old_avg + (1-k)*sample
         return self.m_avg_table[index]
 
     def get_cell_avg(self, uid, atype):
@@ -486,45 +569,55 @@ class Conductor(object):
         **Implemented & Not Tested
 
         Evaluates the folllowing criteria
-            1. similarity of velocities of two cells
-                Note: Empirically  10m/s is highest vel
-                    so 20m/s is the largest likely diff
-            2. The similar velocities can't be near zero
-            3. length of time they've been synchronized
-            score = max(0, 1 - float(dist_of_velocities) / max_dist)
+            1. correlation of the velocities of two cells over a recent
+               window, allowing one to lag the other (see xcorr.py)
+            2. both have to be moving at coord-min (RMS over the window)
+            score = max(0, peak correlation)
         Returns:
             The exponentially decaying weighted moving average
         """
         # we calculate a score
-        # score = 1 if the values are exactly the same
-        # score = 0 if the values are very different
-#        tmplogger = logging.getLogger(__name__+".coord")
+        # score = 1 if they move exactly the same (maybe with a lag)
+        # score = 0 if they don't move alike or aren't near each other
         if not 'coord-min' in CONX_QUAL:
             logger.error("No connector_qualifying_triggers set for type '%s'", 'coord-min')
             return 0
         min_spd = CONX_QUAL['coord-min']
-        spd0 = sqrt(cell0.m_vx**2+cell0.m_vy**2)
-        spd1 = sqrt(cell1.m_vx**2+cell1.m_vy**2)
-        if spd0 < min_spd or spd1 < min_spd:
-            score = 0.01
+        result = self.m_xcorr.get_coord(cid)
+        spd0 = self.m_xcorr.get_speed(cell0.m_id)
+        spd1 = self.m_xcorr.get_speed(cell1.m_id)
+        if result is None or spd0 < min_spd or spd1 < min_spd:
+            result = None
+            score = 0
         else:
-            score = min(1,max(0,(cell0.m_vx*cell1.m_vx+cell0.m_vy*cell1.m_vy)/(spd0*spd1)))   #BST-use correlation between velocities instead
+            (peak, lag) = result
+            score = max(0, peak)
         avgscore = self.record_conx_avg(cid, atype, score)
-#        tmplogger.debug( "coord: spd0=%.2f (%.2f,%.2f), spd1=%.2f (%.2f,%.2f), score=%.3f, avg=%.3f",spd0, cell0.m_vx, cell0.m_vy, spd1, cell1.m_vx, cell1.m_vy, score, avgscore)
+        if result is not None and score:
+            logging.getLogger(__name__+".coord").debug("coord: cid=%s, peak=%.3f, lag=%.2fs, avg=%.3f",
+                                                       cid, peak, lag, avgscore)
 
         # we record our score in our running avg table
         return avgscore
 
-    def test_conx_fof(self, cid, atype, cell0, cell1):   #pylint: disable=W0613
+    def test_conx_fof(self, cid, atype, cell0, cell1):
         """Are these cells connected through a third person?
-        **Not Yes Implemented
+        **Implemented & Not Tested
 
         Meets the following conditions:
-            1.
+            1. They are not connected to each other
+            2. They are both connected to someone else (see conxgraph.py)
         Returns:
-            value: 1.0 if connected, 0 if no
+            The exponentially decaying weighted moving average
         """
-        return 0
+        graph = self.m_field.m_conx_graph
+        uid0 = cell0.m_id
+        uid1 = cell1.m_id
+        if not graph.adjacent(uid0, uid1) and graph.common_neighbors(uid0, uid1):
+            score = 1.0
+        else:
+            score = 0.0
+        return self.record_conx_avg(cid, atype, score)
 
     def test_conx_irlbuds(self, cid, atype, cell0, cell1):   #pylint: disable=W0613
         """Did these people come in together? Have they spent most of their
@@ -557,29 +650,49 @@ class Conductor(object):
         # we record our score in our running avg table to make it into a fraction of time that these 2 people were within max_dist of each other
         return self.record_conx_avg(cid, atype, score)
 
-    def test_conx_leastconx(self, cid, atype, cell0, cell1):   #pylint: disable=W0613
+    def test_conx_leastconx(self, cid, atype, cell0, cell1):
         """Are these individuals among the least connected in the field?
 
-        **Not Yes Implemented
+        **Implemented & Not Tested
 
         Meets the following conditions:
-            1.
+            1. Somebody in the field is connected (or everyone is least)
+            2. Both have no more than the fewest connections anyone has,
+               plus a little slack (see conxgraph.py)
         Returns:
-            value: 1.0 if connected, 0 if no
+            The exponentially decaying weighted moving average
         """
-        return 0
+        graph = self.m_field.m_conx_graph
+        if not atype in CONX_QUAL:
+            logger.error("No connector_qualifying_triggers set for type '%s'", atype)
+            return 0
+        most = graph.min_degree() + CONX_QUAL[atype]
+        if graph.m_nedges and graph.degree(cell0.m_id) <= most and \
+                graph.degree(cell1.m_id) <= most:
+            score = 1.0
+        else:
+            score = 0.0
+        return self.record_conx_avg(cid, atype, score)
 
     def test_conx_mirror(self, cid, atype, cell0, cell1):   #pylint: disable=W0613
         """Are individuals moving in a mirrorwise way?
 
-        **Not Yes Implemented
+        **Implemented & Not Tested
 
         Meets the following conditions:
-            1.
+            1. One's velocity correlates with the other's reflected across
+               the line halfway between them, over a recent window,
+               allowing one to lag the other (see xcorr.py)
+            2. both have to be moving (xcorr_min_speed)
         Returns:
-            value: 1.0 if connected, 0 if no
+            The exponentially decaying weighted moving average
         """
-        return 0
+        result = self.m_xcorr.get_mirror(cid)
+        if result is None:
+            score = 0
+        else:
+            score = max(0, result[0])
+        return self.record_conx_avg(cid, atype, score)
 
     def test_conx_nearby(self, cid, atype, cell0, cell1):   #pylint: disable=W0613
         """Are cells near each other but not otherwise connected?
@@ -624,9 +737,11 @@ class Conductor(object):
         Evaluates the folllowing criteria
             1. Both cells have been in the space for a while
             2. These two cells are not in a group
+            3. These two cells have never been connected (see pairhistory.py)
             Score = 0.0 in space for less than min time
                   = 1.0 if they are not in group together
                   = 0.0 if they are in group together
+                  = 0.0 if they have ever been connected
         Returns:
             The exponentially decaying weighted moving average
         """
@@ -643,6 +758,9 @@ class Conductor(object):
         else:
             if cell0.m_gid == cell1.m_gid and cell0.m_gid != 0:
                 score = 0.0
+            elif self.m_field.have_history(cell0.m_id, cell1.m_id,
+                                           config.pair_history_ignore):
+                score = 0.0
             else:
                 score = 1.0
         # we record our score in our running avg table
@@ -774,18 +892,6 @@ class Conductor(object):
         return 1.0 - ((cell_dist-min_dist) /
                       (max_dist-min_dist))
 
-    def test_conx_transfer(self, cid, atype, cell0, cell1):   #pylint: disable=W0613
-        """Is a transfer of highlight happening between these cells?
-
-        **Not Yes Implemented
-
-        Meets the following conditions:
-            1.
-        Returns:
-            value: 1.0 if connected, 0 if no
-        """
-        return 0
-
     #
     # Event Tests
     #
@@ -815,38 +921,28 @@ class Conductor(object):
         # tmplogger.info( "touch: cid=%s, pos0=(%.2f,%.2f), pos1=(%.2f, %.2f), vel0= (%.2f,%.2f), vel1= (%.2f,%.2f), relspeed=%.3f, dist=%.3f,score=%.3f", cid, cell0.m_x, cell0.m_y, cell1.m_x, cell1.m_y, cell0.m_vx, cell0.m_vy, cell1.m_vx, cell1.m_vy, relspeed, dist, score)
         return score
 
-    def test_event_tag(self, cid, atype, cell0, cell1):   #pylint: disable=W0613
-        """Did one of these individuals tag the other?
-
-        **Not Yes Implemented
-
-        Note: This requires something to be saved over time.
-        Meets the following conditions:
-            1.
-        Returns:
-            value: 1.0 if connected, 0 if no
-        """
-        return 0
-
     #
     # Cell Tests
     #
 
-    def test_cell_dance(self, uid, atype):   #pylint: disable=W0613
+    def test_cell_dance(self, uid, atype):
         """Does this cell have a history of behavior that looks like dancing?
 
-        **Not Yes Implemented
+        **Implemented & Not Tested
 
         Evaluates the folllowing criteria:
-            1. xxx
+            1. Does their velocity or leg separation rise and fall at a dance
+               tempo? (see rhythm.py)
         Returns:
             The exponentially decaying weighted moving average
         """
-        # we calculate a score
-        # evaluate something here
+        if not atype in CELL_QUAL:
+            logger.error("No cell_qualifying_triggers set for type '%s'", atype)
+            return 0
+        min_share = CELL_QUAL[atype]
+        score = min(1.0, self.m_rhythm.get_score(uid) / min_share)
         # we record our score in our running avg table
-        #return self.record_cell_avg(uid, atype, score)
-        return 0
+        return self.record_cell_avg(uid, atype, score)
 
     def test_cell_interactive(self, uid, atype):
         """Does this cell have a history of being interactive?
@@ -974,53 +1070,83 @@ class Conductor(object):
         # we record our score in our running avg table
         return self.record_cell_avg(uid, atype, score)
 
-    def test_cell_spin(self, uid, atype):   #pylint: disable=W0613
-        """Does this cell have a history of xxx?
+    def test_cell_spin(self, uid, atype):
+        """Does this cell have a history of spinning?
 
-        **Not Yes Implemented
+        **Implemented & Not Tested
 
         Evaluates the folllowing criteria:
-            1. xxx
+            1. How fast has this person turned over their recent track?
         Returns:
             The exponentially decaying weighted moving average
         """
-        # we calculate a score
-        # evaluate something here
+        track = self.m_field.get_track(uid)
+        if track is None or track.m_count < config.track_min_samples or \
+                not track.duration():
+            return self.record_cell_avg(uid, atype, 0)
+        if not atype in CELL_QUAL:
+            logger.error("No cell_qualifying_triggers set for type '%s'", atype)
+            return 0
+        min_rate = CELL_QUAL[atype]
+        # facing is unwrapped, so this is how far they've turned
+        rate = abs(track.last('facing') - track.first('facing')) / track.duration()
+        score = min(1.0, rate / min_rate)
         # we record our score in our running avg table
-        #return self.record_cell_avg(uid, atype, score)
-        return 0
+        return self.record_cell_avg(uid, atype, score)
 
-    def test_cell_quantum(self, uid, atype):   #pylint: disable=W0613
-        """Does this cell have a history of xxx?
+    def test_cell_quantum(self, uid, atype):
+        """Does this cell have a history of moving in stops and starts?
 
-        **Not Yes Implemented
+        **Implemented & Not Tested
 
         Evaluates the folllowing criteria:
-            1. xxx
+            1. Is this person moving at all over their recent track?
+            2. Does their speed vary a lot compared to its mean?
         Returns:
             The exponentially decaying weighted moving average
         """
-        # we calculate a score
-        # evaluate something here
+        track = self.m_field.get_track(uid)
+        if track is None or track.m_count < config.track_min_samples:
+            return self.record_cell_avg(uid, atype, 0)
+        if not atype in CELL_QUAL or not 'static' in CELL_QUAL:
+            logger.error("No cell_qualifying_triggers set for type '%s'", atype)
+            return 0
+        min_var = CELL_QUAL[atype]
+        mean_spd = track.mean('spd')
+        if mean_spd < CELL_QUAL['static']:
+            score = 0.0
+        elif track.std('spd') / mean_spd >= min_var:
+            score = 1.0
+        else:
+            score = 0.0
         # we record our score in our running avg table
-        #return self.record_cell_avg(uid, atype, score)
-        return 0
+        return self.record_cell_avg(uid, atype, score)
 
-    def test_cell_jacks(self, uid, atype):   #pylint: disable=W0613
-        """Does this cell have a history of xxx?
+    def test_cell_jacks(self, uid, atype):
+        """Does this cell have a history of jumping jacks?
 
-        **Not Yes Implemented
+        **Implemented & Not Tested
 
         Evaluates the folllowing criteria:
-            1. xxx
+            1. Has this person stayed put over their recent track?
+            2. Have their legs been opening and closing?
         Returns:
             The exponentially decaying weighted moving average
         """
-        # we calculate a score
-        # evaluate something here
+        track = self.m_field.get_track(uid)
+        if track is None or track.m_count < config.track_min_samples:
+            return self.record_cell_avg(uid, atype, 0)
+        if not atype in CELL_QUAL or not 'static' in CELL_QUAL:
+            logger.error("No cell_qualifying_triggers set for type '%s'", atype)
+            return 0
+        min_sep_std = CELL_QUAL[atype]
+        if track.mean('spd') < CELL_QUAL['static'] and \
+                track.std('legsep') >= min_sep_std:
+            score = 1.0
+        else:
+            score = 0.0
         # we record our score in our running avg table
-        #return self.record_cell_avg(uid, atype, score)
-        return 0
+        return self.record_cell_avg(uid, atype, score)
 
     def test_cell_chosen(self, uid, atype):   #pylint: disable=W0613
         """Does this cell have a history of xxx?
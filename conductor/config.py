@@ -4,7 +4,77 @@
 
 # system configuration
 framerate = 25.0
+conductor_rate = 0      # (Hz) how often we run inference, 0 = every tracker frame
 max_lost_patience = 2   # (sec)
+max_lost_group_patience = 2   # (sec) suspect a group after this, delete after twice this
+frame_assembly_timeout = 0.01   # (sec) apply a quiet frame record after this
+clock_restart_jump = 1.0    # (sec) tracker time going back more is a restart, less is jitter
+columnar_cells = False  # keep cell values in numpy columns (needs numpy)
+track_length = 128      # (frames) how much motion history we keep per cell
+track_min_samples = 25  # (frames) how much we need before we judge motion
+rhythm_window = 64      # (frames) how much motion we look for a beat in
+rhythm_cadence = 5      # (ticks) how often we look
+rhythm_batch = 32       # most cells we look at each time (others wait a turn)
+rhythm_band = (1.0, 3.0)    # (Hz) dance tempos we listen for (60-180 bpm)
+xcorr_window = 64       # (frames) how much movement we compare for coord/mirror
+xcorr_max_lag = 25      # (frames) how far one can lag behind the other
+xcorr_cadence = 5       # (ticks) how often we compare
+xcorr_max_dist = 4      # (m) pairs farther apart are only compared if connected
+xcorr_min_speed = 0.1   # (m/s rms) both have to be moving this much
+pair_history_retention = 3600   # (sec) forget pairs we haven't seen together in this long
+pair_history_max = 20000    # most pairs we remember (~0.5KB each)
+pair_history_gap = 1.0      # (sec) longer gaps between updates don't count as connected
+pair_history_prune_interval = 60    # (sec)
+pair_history_ignore = ['strangers', 'nearby']   # don't mean they've been connected
+conxgraph_ignore = ['strangers', 'nearby', 'fof', 'leastconx']   # don't count as edges
+sequence_resolution = 0.1  # (sec) tick of the timer wheel for sequence rules
+sequence_slots = 64         # ticks around the wheel (longer limits take extra turns)
+
+# Events that unfold over time (see sequence.py)
+#   event type: list of (condition, params, within), where within is how
+#   long after the previous step (sec) the step has to happen. Rules need at
+#   least two steps.
+sequence_rules = {
+    # touch, then run apart
+    'tag': [('touch', {'dist': .33}, 0),
+            ('part', {'dist': .75, 'speed': 1.0}, 1.5)],
+    # one walks up to someone standing still, stops, and the other walks off
+    'transfer': [('meet', {'dist': .5, 'moving': .5, 'still': .2}, 0),
+                 ('swap', {'dist': .75, 'moving': .5, 'still': .2}, 3)],
+}
+
+# multi-rate evaluation
+#   Slow types only need looking at every few ticks. Each cell or pair takes
+#   its turn, so 1/n of them are evaluated each tick, and the running
+#   averages are weighted by the time between samples. Types not listed are
+#   evaluated every tick.
+eval_max_interval = 0.5     # (sec) never go longer than this between looks
+                            # (keep it under pair_history_gap)
+cell_eval_every = {
+    # in ticks
+    'timein': 10,
+}
+connector_eval_every = {
+    # in ticks
+    'friends': 4,
+    'irlbuds': 10,
+    'strangers': 10,
+}
+
+# load shedding configuration
+#
+frame_budget = 0    # (sec) 0 = one conductor tick
+load_shed_steps = [
+    # degradation steps, applied in this order as we fall further behind
+    'skip_low_priority',    # test low priority conx types on alternate frames
+    'stretch_reports',      # stretch report_frequency intervals
+    'coalesce_frames',      # only process the newest of backlogged tracker frames
+]
+load_shed_low_priority = ['facing', 'strangers']
+load_shed_report_stretch = 3    # multiply report intervals by this
+load_shed_overrun_frames = 5    # frames over budget in a row before we shed more
+load_shed_recover_frames = 50   # frames under budget in a row before we recover
+load_shed_recover_fraction = 0.6    # under budget means below this part of it
 
 # OSC configuration
 
@@ -113,6 +183,10 @@ cell_qualifying_triggers = {
     'kinetic': 0.5,  # m/s
     'timein': 60,   # sec
     'fast':2,
+    'spin': 90,     # deg/s of steady turning
+    'jacks': 0.08,  # m, std dev of leg separation (while staying put)
+    'quantum': 1.0, # std dev / mean of speed (stop and go)
+    'dance': 0.4,   # share of motion power at one tempo
 }
 
 connector_avg_triggers = {
@@ -124,10 +198,10 @@ connector_avg_triggers = {
     'contact': 0.3,    # implemented; tested
     'friends': 0.6,    # implemented; tested
     'coord': 0.1,      # implemented
-    'mirror': 0,
-    'fof': 0,
+    'mirror': 0.4,     # implemented
+    'fof': 0.5,        # implemented
     'irlbuds': 0.33,    # implemented
-    'leastconx': 0,
+    'leastconx': 0.5,  # implemented
     'nearby': 0.4,
     'strangers': 0.4,  # implemented
     'chosen': 0,
@@ -149,6 +223,7 @@ connector_memory_time = {
     'contact': 3,
     'friends': 10,
     'coord': 2,
+    'mirror': 3,
     'fof': 0,
     'irlbuds': 30,
     'leastconx': 5,
@@ -201,6 +276,7 @@ connector_qualifying_triggers = {
     'nearby-min': 1.5,   # m
     'nearby-max': 4, # m
     'strangers-min': 5, # sec
+    'leastconx': 0,  # how many connections above the fewest still counts as least
     # happening values
     'fusion-min': .5, # m
     # event values
@@ -219,5 +295,6 @@ report_frequency = {
     'gattrs': 5,
     'uisettings':50,
     'health':25,
+    'load':25,
 }
 osctimeout = 0
@@ -42,6 +42,9 @@ class Connector(object):
 
     """
 
+    __slots__ = ('m_field', 'm_id', 'm_cell0', 'm_cell1', 'm_attr_dict',
+                 'm_path', 'm_score', 'm_visible', 'm_frame')
+
     def __init__(self, field, uid, cell0, cell1, frame=None):
         # process passed params
         self.m_field=field
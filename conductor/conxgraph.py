@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Incremental index of who is connected to whom.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+
+__appname__ = "conxgraph.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# local modules
+import config
+
+
+class DegreeHeap(object):
+    """Min-heap of (degree, uid) that can find and change any uid's entry.
+
+    Stores the following values:
+        m_heap: list of [degree, uid] in heap order
+        m_pos: index of each uid's entry in m_heap, indexed by uid
+
+    """
+
+    def __init__(self):
+        self.m_heap = []
+        self.m_pos = {}
+
+    def __len__(self):
+        return len(self.m_heap)
+
+    def __contains__(self, uid):
+        return uid in self.m_pos
+
+    def push(self, uid, degree=0):
+        self.m_heap.append([degree, uid])
+        self.m_pos[uid] = len(self.m_heap) - 1
+        self._up(len(self.m_heap) - 1)
+
+    def change(self, uid, delta):
+        """Add delta to uid's degree."""
+        i = self.m_pos[uid]
+        self.m_heap[i][0] += delta
+        if delta < 0:
+            self._up(i)
+        else:
+            self._down(i)
+
+    def degree(self, uid):
+        return self.m_heap[self.m_pos[uid]][0]
+
+    def remove(self, uid):
+        i = self.m_pos.pop(uid)
+        last = self.m_heap.pop()
+        if i < len(self.m_heap):
+            self.m_heap[i] = last
+            self.m_pos[last[1]] = i
+            self._up(i)
+            self._down(self.m_pos[last[1]])
+
+    def min_degree(self):
+        if not self.m_heap:
+            return 0
+        return self.m_heap[0][0]
+
+    def _swap(self, i, j):
+        heap = self.m_heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self.m_pos[heap[i][1]] = i
+        self.m_pos[heap[j][1]] = j
+
+    def _up(self, i):
+        heap = self.m_heap
+        while i:
+            parent = (i - 1) >> 1
+            if heap[i][0] >= heap[parent][0]:
+                break
+            self._swap(i, parent)
+            i = parent
+
+    def _down(self, i):
+        heap = self.m_heap
+        size = len(heap)
+        while True:
+            child = 2*i + 1
+            if child >= size:
+                break
+            if child + 1 < size and heap[child+1][0] < heap[child][0]:
+                child += 1
+            if heap[i][0] <= heap[child][0]:
+                break
+            self._swap(i, child)
+            i = child
+
+
+class ConxGraph(object):
+    """Keeps the connector graph indexed as connections come and go.
+
+    Two cells are adjacent while their connector has at least one attr type
+    that isn't in config.conxgraph_ignore (types that say nothing about a
+    real connection, or that are computed from this graph). Field keeps us
+    up to date as cells, connectors and attrs are created and deleted.
+
+    Stores the following values:
+        m_adj: set of adjacent uids, indexed by uid
+        m_edge_types: set of counted attr types, indexed by (uid0, uid1)
+        m_degrees: DegreeHeap of how many cells each cell is adjacent to
+        m_nedges: how many adjacent pairs there are
+        m_parent: union-find parents for component membership
+        m_dirty: whether m_parent needs rebuilding (after a deletion)
+
+    """
+
+    def __init__(self):
+        self.m_adj = {}
+        self.m_edge_types = {}
+        self.m_degrees = DegreeHeap()
+        self.m_nedges = 0
+        self.m_parent = {}
+        self.m_dirty = False
+
+    def key(self, uid0, uid1):
+        if uid0 < uid1:
+            return (uid0, uid1)
+        return (uid1, uid0)
+
+    # Keeping up to date
+
+    def add_node(self, uid):
+        if uid not in self.m_adj:
+            self.m_adj[uid] = set()
+            self.m_degrees.push(uid)
+            self.m_parent[uid] = uid
+
+    def remove_node(self, uid):
+        if uid in self.m_adj:
+            for other in list(self.m_adj[uid]):
+                self.remove_edge(uid, other)
+            del self.m_adj[uid]
+            self.m_degrees.remove(uid)
+            if uid in self.m_parent:
+                self.m_dirty = True
+
+    def add_type(self, uid0, uid1, atype):
+        """Note that the connector between uid0 and uid1 has an atype attr."""
+        if atype in config.conxgraph_ignore:
+            return
+        key = self.key(uid0, uid1)
+        if key in self.m_edge_types:
+            self.m_edge_types[key].add(atype)
+            return
+        self.add_node(uid0)
+        self.add_node(uid1)
+        self.m_edge_types[key] = set([atype])
+        self.m_adj[uid0].add(uid1)
+        self.m_adj[uid1].add(uid0)
+        self.m_degrees.change(uid0, 1)
+        self.m_degrees.change(uid1, 1)
+        self.m_nedges += 1
+        if not self.m_dirty:
+            self.union(uid0, uid1)
+
+    def remove_type(self, uid0, uid1, atype):
+        """Note that the atype attr is gone from the connector."""
+        key = self.key(uid0, uid1)
+        if key in self.m_edge_types:
+            self.m_edge_types[key].discard(atype)
+            if not self.m_edge_types[key]:
+                self.remove_edge(uid0, uid1)
+
+    def remove_edge(self, uid0, uid1):
+        """Note that the connector between uid0 and uid1 is gone."""
+        key = self.key(uid0, uid1)
+        if key not in self.m_edge_types:
+            return
+        del self.m_edge_types[key]
+        self.m_adj[uid0].discard(uid1)
+        self.m_adj[uid1].discard(uid0)
+        self.m_degrees.change(uid0, -1)
+        self.m_degrees.change(uid1, -1)
+        self.m_nedges -= 1
+        # union-find can't split, so we rebuild when next asked
+        self.m_dirty = True
+
+    # Queries
+
+    def adjacent(self, uid0, uid1):
+        return uid0 in self.m_adj and uid1 in self.m_adj[uid0]
+
+    def common_neighbors(self, uid0, uid1):
+        """Return the set of cells both are adjacent to."""
+        if uid0 not in self.m_adj or uid1 not in self.m_adj:
+            return set()
+        adj0 = self.m_adj[uid0]
+        adj1 = self.m_adj[uid1]
+        if len(adj0) > len(adj1):
+            (adj0, adj1) = (adj1, adj0)
+        return set(uid for uid in adj0 if uid in adj1)
+
+    def degree(self, uid):
+        if uid not in self.m_degrees:
+            return 0
+        return self.m_degrees.degree(uid)
+
+    def min_degree(self):
+        return self.m_degrees.min_degree()
+
+    def same_component(self, uid0, uid1):
+        """Are these cells connected by any chain of connections?"""
+        if uid0 not in self.m_adj or uid1 not in self.m_adj:
+            return False
+        if self.m_dirty:
+            self.rebuild()
+        return self.find(uid0) == self.find(uid1)
+
+    # Union-find
+
+    def find(self, uid):
+        parent = self.m_parent
+        root = uid
+        while parent[root] != root:
+            root = parent[root]
+        while parent[uid] != root:
+            (parent[uid], uid) = (root, parent[uid])
+        return root
+
+    def union(self, uid0, uid1):
+        root0 = self.find(uid0)
+        root1 = self.find(uid1)
+        if root0 != root1:
+            self.m_parent[root1] = root0
+
+    def rebuild(self):
+        self.m_parent = dict((uid, uid) for uid in self.m_adj)
+        for (uid0, uid1) in self.m_edge_types:
+            self.union(uid0, uid1)
+        self.m_dirty = False
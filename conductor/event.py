@@ -34,6 +34,9 @@ class Event(object):
 
     """
 
+    __slots__ = ('m_field', 'm_id', 'm_type', 'm_uid0', 'm_uid1', 'm_value',
+                 'm_createtime', 'm_timestamp')
+
     def __init__(self, field, eid, etype=None, uid0=None, uid1=None, value=None):
         self.m_field=field
         self.m_id = eid
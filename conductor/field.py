@@ -28,6 +28,10 @@ from cell import Cell
 from connector import Connector
 from group import Group
 from event import Event
+from liveness import Liveness
+from track import Track
+from pairhistory import PairHistory
+from conxgraph import ConxGraph
 
 # init logging
 logger=logging.getLogger(__name__)
@@ -46,13 +50,23 @@ class Field(object):
         m_event_dict: dictionary of all events we have
         m_suspect_cells: list of cells we suspect are dead
         m_suspect_groups: list of groups we suspect are dead
+        m_cell_liveness: finds cells we haven't heard from in a while
+        m_group_liveness: finds groups we haven't heard from in a while
         m_frame: which frame is the tracker reporting
+        m_tracktime: the tracker's elapsed time for that frame (sec)
+        m_tracktime_at: our time() when we got m_tracktime
+        m_lastnow: the last time now() returned
         m_scene: the current scene we are performing
         m_scene_variant: the current scene variant we are performing
         m_scene_value: value associated with scene
+        m_store: ColumnStore backing our cells (if config.columnar_cells)
+        m_track_dict: recent motion of each cell (Track), indexed by uid
+        m_pair_history: which pairs have been connected, and for how long
+        m_conx_graph: index of who is connected to whom (see conxgraph.py)
     
     """
 
+    cellClass = Cell
     groupClass = Group
 
     def __init__(self):
@@ -69,18 +83,33 @@ class Field(object):
         self.m_suspect_cells = {}
         # a dict of missing groups, indexed by gid
         self.m_suspect_groups = {}
+        self.m_cell_liveness = Liveness(config.max_lost_patience)
+        self.m_group_liveness = Liveness(config.max_lost_group_patience)
         #self.allpaths = []
         self.m_giddist = config.group_distance
         self.m_ungroupdist = config.ungroup_distance
         self.m_oscfps = config.framerate
         self.m_frame = 0
+        self.m_tracktime = None
+        self.m_tracktime_at = None
+        self.m_lastnow = None
         self.m_scene = None
         self.m_scene_variant = None
         self.m_scene_value = None
         self.m_osc = None
+        self.m_track_dict = {}
+        self.m_pair_history = PairHistory()
+        self.m_conx_graph = ConxGraph()
+        self.m_store = None
+        if config.columnar_cells:
+            # numpy is only needed if we want columns
+            from columnstore import ColumnStore
+            from columncell import ColumnCell
+            self.m_store = ColumnStore()
+            self.cellClass = ColumnCell
         
     def update(self, groupdist=None, ungroupdist=None, oscfps=None,
-               osc=None, frame=None):
+               osc=None, frame=None, tracktime=None):
         if groupdist is not None:
             self.m_giddist = groupdist
         if ungroupdist is not None:
@@ -93,6 +122,28 @@ class Field(object):
             self.m_frame = frame
             if frame%config.report_frequency['debug'] == 0:
                 logger.debug( "update:frame:"+str(frame))
+        if tracktime is not None:
+            self.m_tracktime = tracktime
+            self.m_tracktime_at = time()
+
+    def now(self):
+        """The time now, by the tracker's clock if we have it.
+
+        That's the time of the latest frame plus however long ago we got it,
+        so time keeps passing (and averages keep decaying) while the tracker
+        is quiet. Frames that come late or bunched up would take it back a
+        little, so it holds still until it catches up instead (going back
+        more than config.clock_restart_jump is a tracker restart, and we let
+        that through).
+        """
+        if self.m_tracktime is None:
+            return time()
+        now = self.m_tracktime + time() - self.m_tracktime_at
+        if self.m_lastnow is not None and \
+                self.m_lastnow - config.clock_restart_jump <= now < self.m_lastnow:
+            now = self.m_lastnow
+        self.m_lastnow = now
+        return now
 
     def update_scene(self, scene, variant, value):
         self.m_scene = scene
@@ -136,6 +187,7 @@ class Field(object):
                 group = self.groupClass(self, gid)
                 # add to the group list
                 self.m_group_dict[gid] = group
+                self.m_group_liveness.watch(gid, group.m_updatetime)
                 logger.debug( "group "+str(gid)+" created")
                 #self.m_our_group_count += 1
                 #logger.debug("create_group:count:"+str(self.m_our_group_count))
@@ -157,6 +209,9 @@ class Field(object):
         if gid in self.m_group_dict:
             self.m_group_dict[gid].drop_all_cells()
             del self.m_group_dict[gid]
+            self.m_group_liveness.forget(gid)
+            if gid in self.m_suspect_groups:
+                del self.m_suspect_groups[gid]
 
     # Legs and Body
 
@@ -187,9 +242,11 @@ class Field(object):
         if not uid in self.m_cell_dict:
             # note1: we access the cell class indirectly for local subclassing
             # note2: pass self since we want a back reference to field instance
-            cell = Cell(self, uid)
+            cell = self.cellClass(self, uid)
             # add to the cell list
             self.m_cell_dict[uid] = cell
+            self.m_cell_liveness.watch(uid, cell.m_updatetime)
+            self.m_conx_graph.add_node(uid)
             self.m_our_cell_count += 1
             logger.debug("create_cell:count:"+str(self.m_our_cell_count))
         # but if it already exists
@@ -245,6 +302,43 @@ class Field(object):
         self.check_for_missing_cell(uid)
         self.m_cell_dict[uid].geoupdate(fromcenter, fromnearest, fromexit)
 
+    def apply_frame(self, record):
+        """Apply a whole tracker frame (see frame.py) in one pass.
+
+        Each cell mentioned is checked for and fetched once, then given its
+        update, body, legs and geo in turn. Groups are updated last, once
+        cell membership has settled. The frame number only advances once
+        the record is applied, so the conductor never sees a half-updated
+        frame.
+        """
+        for uid in record.uids():
+            self.check_for_missing_cell(uid)
+            cell = self.m_cell_dict[uid]
+            if uid in record.m_updates:
+                (x, y, vx, vy, major, minor, gid, gsize) = record.m_updates[uid]
+                if gid is not None:
+                    self.check_for_missing_group(gid)
+                    self.check_for_new_group(uid, gid)
+                    cell.m_gid = gid
+                    if gid and uid not in self.m_group_dict[gid].m_cell_dict:
+                        self.m_group_dict[gid].m_cell_dict[uid] = cell
+                        logger.debug("cell "+str(uid)+" added to group "+str(gid))
+                cell.update(x, y, vx, vy, major, minor, gid, gsize,
+                            frame=record.m_frame)
+            if uid in record.m_bodies:
+                cell.update_body(*record.m_bodies[uid])
+            if uid in record.m_legs:
+                for leg, values in record.m_legs[uid].iteritems():
+                    cell.update_leg(leg, *values)
+            if uid in record.m_geos:
+                cell.geoupdate(*record.m_geos[uid])
+            if uid in record.m_updates:
+                self.record_track(uid, record.m_tracktime,
+                                  record.m_legs.get(uid, {}))
+        for gid, values in record.m_groups.iteritems():
+            self.update_group(gid, *values)
+        self.update(frame=record.m_frame, tracktime=record.m_tracktime)
+
     def del_cell(self, uid):
         """Delete a cell.
 
@@ -283,7 +377,13 @@ class Field(object):
                 self.del_connector(cid)
             # Note that this only deletes the cell from the master list, but
             # doesn't destroy the instance, which may still be refd elsewhere.
+            if self.m_store is not None:
+                self.m_cell_dict[uid].detach()
             del self.m_cell_dict[uid]
+            self.m_cell_liveness.forget(uid)
+            self.m_conx_graph.remove_node(uid)
+            if uid in self.m_track_dict:
+                del self.m_track_dict[uid]
             if uid in self.m_suspect_cells:
                 del self.m_suspect_cells[uid]
             else:
@@ -345,10 +445,15 @@ class Field(object):
             # Note2: we pass self since we want a back reference to field instance
             connector = Connector(self, cid, cell0, cell1,frame=self.m_frame)
             self.m_conx_dict[cid] = connector
+            self.m_conx_graph.add_node(uid0)
+            self.m_conx_graph.add_node(uid1)
         return connector
 
     def del_connector(self, cid):
         if cid in self.m_conx_dict:
+            connector = self.m_conx_dict[cid]
+            self.m_conx_graph.remove_edge(connector.m_cell0.m_id,
+                                          connector.m_cell1.m_id)
             # make sure the cells that this connector is attached to, delete
             # refs to it
             self.m_conx_dict[cid].conx_disconnect_thyself()
@@ -371,6 +476,8 @@ class Field(object):
         connector = self.m_conx_dict[cid]
         logger.debug("updating connection "+str(connector.m_id)+" "+str(atype)+" to "+str(value))
         connector.update_attr(atype, value, aboveTrigger)
+        self.m_pair_history.record(uid0, uid1, atype, time())
+        self.m_conx_graph.add_type(uid0, uid1, atype)
 
     def del_conx_attr(self, cid, atype):
         """Delete an attribute to a connector, removing the connector if the
@@ -379,6 +486,8 @@ class Field(object):
             connector = self.m_conx_dict[cid]
             if atype in connector.m_attr_dict:
                 connector.del_attr(atype)
+                self.m_conx_graph.remove_type(connector.m_cell0.m_id,
+                                              connector.m_cell1.m_id, atype)
                 logger.debug( "del_conx_attr:del_attr:"+str(cid)+" "+str(atype))
             if not len(connector.m_attr_dict):
                 self.del_connector(cid)
@@ -412,6 +521,9 @@ class Field(object):
                 # remove from suspect list
                 del self.m_suspect_groups[gid]
                 logger.debug("group "+str(gid)+" was suspected lost but is now above suspicion")
+            # a cell claiming membership is as good as hearing from the group
+            self.m_group_dict[gid].m_updatetime = time()
+            self.m_group_liveness.watch(gid, self.m_group_dict[gid].m_updatetime)
 
     def check_for_new_group(self, uid, gid):
         """If this is a new group, disconnect the old one."""
@@ -519,30 +631,80 @@ class Field(object):
             return False
         return True
 
-    def check_for_lost_cell(self, uid):
-        time_since_last_update = time() - self.m_cell_dict[uid].m_updatetime
-        if time_since_last_update > config.max_lost_patience:
-            logger.info("deleting cell %d that has been lost for %.2f sec",uid,time_since_last_update)
+    def check_for_abandoned_cells(self):
+        """Check to see if any cells or groups have been abandoned.
+
+        Rather than look at every cell, we ask the liveness trackers for the
+        ones whose deadline has passed.
+        """
+        now = time()
+        for uid in self.m_cell_liveness.expired(now, self.cell_lastseen):
+            logger.info("deleting cell %d that has been lost for %.2f sec",uid,
+                        now - self.m_cell_dict[uid].m_updatetime)
             self.del_cell(uid)
+        self.check_for_abandoned_groups(now)
+        self.m_pair_history.prune(now)
 
-    def check_for_abandoned_cells(self):
-        """Check to see if any cells have been abandoned."""
-        # we make a copy because we can't iterate over the dict if we are
-        # deleting stuff from it!
-        new_cell_dict = self.m_cell_dict.copy()
-        for uid in new_cell_dict:
-            self.check_for_lost_cell(uid)
-
-    def record_history(self, atype, uid0, uid1, value, htime):
+    def check_for_abandoned_groups(self, now):
+        """Suspect groups we haven't heard from, and delete them if they
+        stay quiet."""
+        for gid in self.m_group_liveness.expired(now, self.group_lastseen):
+            if gid in self.m_suspect_groups:
+                logger.info("deleting group %d that has been lost for %.2f sec",gid,
+                            now - self.m_group_dict[gid].m_updatetime)
+                self.del_group(gid)
+            else:
+                logger.debug("group "+str(gid)+" is suspected lost")
+                self.m_suspect_groups[gid] = 1
+                # give it one more round of patience before we delete it
+                self.m_group_liveness.schedule(gid, now + config.max_lost_group_patience)
+
+    def cell_lastseen(self, uid):
+        if uid in self.m_cell_dict:
+            return self.m_cell_dict[uid].m_updatetime
+        return None
+
+    def group_lastseen(self, gid):
+        if gid in self.m_group_dict:
+            return self.m_group_dict[gid].m_updatetime
+        return None
+
+    def record_track(self, uid, t=None, legs=None):
+        """Add the cell's latest motion to its track.
+
+        legs is the frame's /pf/leg values for the cell, indexed by leg
+        (see frame.py); legs it doesn't have are missing from the sample.
+        """
+        cell = self.m_cell_dict[uid]
+        if uid not in self.m_track_dict:
+            self.m_track_dict[uid] = Track(config.track_length)
+        if t is None:
+            t = self.now()
+        if legs is None:
+            legs = {}
+        # (nlegs, x, y, ...)
+        legs = [(legs[leg][1], legs[leg][2]) if leg in legs else None
+                for leg in (0, 1)]
+        self.m_track_dict[uid].add(t, cell.m_x, cell.m_y, cell.m_vx, cell.m_vy,
+                                   cell.m_body.m_facing, legs[0], legs[1])
+
+    def get_track(self, uid):
+        """Return the cell's Track, or None if we don't have one."""
+        return self.m_track_dict.get(uid)
+
+    def record_history(self, atype, uid0, uid1, htime=None):
         """Record symetrical cell history."""
-        self.m_cell_dict[uid0].record_history(atype, uid1, value, htime)
-        self.m_cell_dict[uid1].record_history(atype, uid0, value, htime)
+        if htime is None:
+            htime = time()
+        self.m_pair_history.record(uid0, uid1, atype, htime)
 
     def get_history(self, uid0, uid1):
-        """What history do these cells have?"""
-        return self.m_cell_dict[uid0].get_history(uid1)
-
-    def have_history(self, uid0, uid1):
-        """Do these cells have history?"""
-        return self.m_cell_dict[uid0].have_history(uid1)
+        """What history do these cells have? (a PairRecord or None)"""
+        return self.m_pair_history.get(uid0, uid1)
+
+    def have_history(self, uid0, uid1, exclude=()):
+        """Have these cells ever been connected (other than by the types
+        in exclude)?"""
+        return self.m_pair_history.have_history(
+            uid0, uid1, self.m_pair_history.mask(exclude))
 
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tracker frame record for CRS.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+
+__appname__ = "frame.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# core modules
+from time import time
+
+
+class Frame(object):
+    """Collects everything the tracker tells us about one frame.
+
+    The tracker sends /pf/update, /pf/body, /pf/geo and a /pf/leg for each
+    leg of each person, plus a /pf/group for each group. Rather than poke
+    each of these into the field as it arrives, we gather them here and
+    let Field.apply_frame() apply the whole frame at once.
+
+    Stores the following values:
+        m_frame: frame number
+        m_tracktime: tracker's elapsed time for this frame (sec)
+        m_updates: /pf/update values (x, y, vx, vy, major, minor, gid, gsize)
+            indexed by uid
+        m_bodies: /pf/body values (x, y, ex, ey, spd, espd, facing, efacing,
+            diam, sigmadiam, sep, sigmasep, leftness, vis) indexed by uid
+        m_legs: dict of /pf/leg values (nlegs, x, y, ex, ey, spd, espd,
+            heading, eheading, vis) indexed by leg, indexed by uid
+        m_geos: /pf/geo values (fromcenter, fromnearest, fromexit) indexed
+            by uid
+        m_groups: /pf/group values (gsize, duration, x, y, diam) indexed by
+            gid
+        m_touchtime: when we last added to this record
+
+    """
+
+    def __init__(self, frame):
+        self.m_frame = frame
+        self.m_tracktime = None
+        self.m_updates = {}
+        self.m_bodies = {}
+        self.m_legs = {}
+        self.m_geos = {}
+        self.m_groups = {}
+        self.m_touchtime = time()
+
+    def add_update(self, uid, x, y, vx, vy, major, minor, gid, gsize,
+                   tracktime=None):
+        if tracktime is not None:
+            self.m_tracktime = tracktime
+        self.m_updates[uid] = (x, y, vx, vy, major, minor, gid, gsize)
+        self.m_touchtime = time()
+
+    def add_body(self, uid, x, y, ex, ey, spd, espd, facing, efacing,
+                 diam, sigmadiam, sep, sigmasep, leftness, vis):
+        self.m_bodies[uid] = (x, y, ex, ey, spd, espd, facing, efacing,
+                              diam, sigmadiam, sep, sigmasep, leftness, vis)
+        self.m_touchtime = time()
+
+    def add_leg(self, uid, leg, nlegs, x, y, ex, ey, spd, espd,
+                heading, eheading, vis):
+        if uid not in self.m_legs:
+            self.m_legs[uid] = {}
+        self.m_legs[uid][leg] = (nlegs, x, y, ex, ey, spd, espd,
+                                 heading, eheading, vis)
+        self.m_touchtime = time()
+
+    def add_geo(self, uid, fromcenter, fromnearest, fromexit):
+        self.m_geos[uid] = (fromcenter, fromnearest, fromexit)
+        self.m_touchtime = time()
+
+    def add_group(self, gid, gsize, duration, x, y, diam):
+        self.m_groups[gid] = (gsize, duration, x, y, diam)
+        self.m_touchtime = time()
+
+    def forget(self, uid):
+        """Drop anything we have for a cell (e.g., when it exits)."""
+        for table in (self.m_updates, self.m_bodies, self.m_legs, self.m_geos):
+            if uid in table:
+                del table[uid]
+
+    def uids(self):
+        """Return every uid mentioned in this frame."""
+        uids = set(self.m_updates)
+        uids.update(self.m_bodies, self.m_legs, self.m_geos)
+        return uids
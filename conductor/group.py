@@ -16,6 +16,9 @@ __appname__ = "group.py"
 __author__  = "Wes Modes (modes.io)"
 __version__ = "0.1pre0"
 __license__ = "GNU GPL 3.0 or later"
+# core modules
+from time import time
+
 # local classes
 from attr import Attr
 
@@ -33,9 +36,14 @@ class Group(object):
         m_cell_dict: dictionary of cells in this group (indexed by uid)
         m_attr_dict: dict of attrs applied to this cell (indexed by type)
         m_visible: is this group displayed currently? (boolean)
+        m_updatetime: last time this group was seen
 
     """
 
+    __slots__ = ('m_field', 'm_id', 'm_gsize', 'm_duration', 'm_x', 'm_y',
+                 'm_diam', 'm_cell_dict', 'm_attr_dict', 'm_visible',
+                 'm_updatetime')
+
     def __init__(self, field, gid, gsize=None, duration=None, x=None, y=None,
                  diam=None):
         self.m_field=field
@@ -48,6 +56,7 @@ class Group(object):
         self.m_cell_dict = {}
         self.m_attr_dict = {}
         self.m_visible = True
+        self.m_updatetime = time()
 
     def update(self, gsize=None, duration=None, x=None, y=None, diam=None,
                 visible=None):
@@ -63,6 +72,7 @@ class Group(object):
             self.m_diam = diam
         if visible is not None:
             self.m_visible = visible
+        self.m_updatetime = time()
 
     def add_attr(self, atype, value):
         self.m_attr_dict[atype] = Attr(atype, self.m_id, value)
@@ -82,6 +92,6 @@ class Group(object):
             del self.m_cell_dict[uid]
 
     def drop_all_cells(self):
-        for uid in self.m_cell_dict:
+        for uid in self.m_cell_dict.keys():
             if uid in self.m_cell_dict:
                 del self.m_cell_dict[uid]
@@ -31,6 +31,10 @@ class Leg(object):
 
     """
 
+    __slots__ = ('m_field', 'm_id', 'm_leg', 'm_nlegs', 'm_x', 'm_y', 'm_ex',
+                 'm_ey', 'm_spd', 'm_heading', 'm_espd', 'm_eheading',
+                 'm_vis')
+
     def __init__(self, field, uid, leg=None, nlegs=None, x=None, y=None,
                  ex=None, ey=None, spd=None, espd=None,
                  heading=None, eheading=None, vis=None):
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Liveness tracking for cells and groups.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+
+__appname__ = "liveness.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# core modules
+from heapq import heappush, heappop
+
+
+class Liveness(object):
+    """Finds things we haven't heard from in a while without looking at
+    everything.
+
+    Each watched key has one deadline (last seen + patience) in a min-heap.
+    Updates don't touch the heap: the owner keeps its own last seen time
+    (e.g., m_updatetime) and we only read it when a deadline comes up. If
+    the key was seen since, we push a new deadline and move on. So each
+    frame costs only the deadlines that have passed.
+
+    Stores the following values:
+        m_patience: how long a key can go unseen (sec)
+        m_heap: min-heap of (deadline, key)
+        m_deadlines: the current deadline for each key, indexed by key;
+            heap entries that don't match are stale and dropped
+
+    """
+
+    def __init__(self, patience):
+        self.m_patience = patience
+        self.m_heap = []
+        self.m_deadlines = {}
+
+    def watch(self, key, lastseen):
+        """Start watching key, if we aren't already."""
+        if key not in self.m_deadlines:
+            self.schedule(key, lastseen + self.m_patience)
+
+    def schedule(self, key, deadline):
+        self.m_deadlines[key] = deadline
+        heappush(self.m_heap, (deadline, key))
+
+    def forget(self, key):
+        """Stop watching key. Its heap entry goes stale and is dropped later."""
+        if key in self.m_deadlines:
+            del self.m_deadlines[key]
+
+    def expired(self, now, lastseen):
+        """Return the keys that haven't been seen within patience of now.
+
+        lastseen(key) returns when key was last seen, or None if it is gone.
+        Expired keys are no longer watched.
+        """
+        expired = []
+        heap = self.m_heap
+        while heap and heap[0][0] <= now:
+            (deadline, key) = heappop(heap)
+            if self.m_deadlines.get(key) != deadline:
+                continue
+            del self.m_deadlines[key]
+            seen = lastseen(key)
+            if seen is None:
+                continue
+            if seen + self.m_patience <= now:
+                expired.append(key)
+            else:
+                self.schedule(key, seen + self.m_patience)
+        return expired
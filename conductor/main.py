@@ -35,6 +35,7 @@ import config
 from field import Field
 from oschandler import OSCHandler
 from conductor import Conductor
+from scheduler import Scheduler
 
 # init logging
 def setup_logging(default_path='logging.json',     default_level=logging.DEBUG,env_key='LOG_CFG'):
@@ -67,6 +68,7 @@ def main():
     field.update(osc=osc)
     osc.update(field=field, conductor=conductor)
     conductor.update(field=field)
+    scheduler = Scheduler(osc=osc, conductor=conductor)
 
     if os.path.isfile('settings.py'):
         logger.info( "Loading settings from settings.py")
@@ -75,19 +77,31 @@ def main():
     keep_running = True
     lastframe = None
     lasttime = 0
+    # we can run inference slower than the tracker sends frames
+    if config.conductor_rate:
+        tick = 1.0/config.conductor_rate
+    else:
+        tick = 0
     while keep_running:
         # call user script
+        scheduler.start_frame()
         osc.each_frame()
+        scheduler.end_stage('ingest')
 
-        if field.m_frame != lastframe or \
+        if (field.m_frame != lastframe and time() - lasttime >= tick) or \
             time() - lasttime > 1:
             # do conductor calculations and inferences
             field.check_for_abandoned_cells()
+            scheduler.end_stage('housekeeping')
             conductor.update_all_cells()
+            scheduler.end_stage('cells')
             conductor.update_all_conx()
+            scheduler.end_stage('conx')
 
             # send regular reports out
             osc.send_regular_reports()
+            scheduler.end_stage('reports')
+            scheduler.end_frame(field.m_frame)
             lastframe = field.m_frame
             lasttime = time()
         else:
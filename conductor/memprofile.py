@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Memory footprint benchmark for cells and connectors.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+Usage: python memprofile.py [ncells]
+
+Fills a Field the way the tracker would (update, body, two legs, geo for each
+cell, one attr on each connector) and reports the bytes each cell and each
+connector holds on to, not counting the field or anything shared.
+
+"""
+
+__appname__ = "memprofile.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# core modules
+import sys
+import gc
+import types
+import logging
+from itertools import combinations
+from timeit import timeit
+
+# local classes
+from field import Field
+
+# things we never count as belonging to a cell or connector
+SKIP_TYPES = (types.ModuleType, type, types.FunctionType,
+              types.BuiltinFunctionType, types.MethodType)
+
+
+def deep_sizeof(roots, exclude):
+    """Total bytes reachable from roots, not following anything in exclude."""
+    seen = set(id(obj) for obj in exclude)
+    pending = list(roots)
+    total = 0
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen or isinstance(obj, SKIP_TYPES):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        pending.extend(gc.get_referents(obj))
+    return total
+
+
+def fill_field(ncells):
+    field = Field()
+    for uid in range(1, ncells+1):
+        field.update_cell(uid, x=uid*0.5, y=1.0, vx=0.1, vy=0.2, major=0.4,
+                          minor=0.3, gid=0, gsize=1, frame=1)
+        field.update_body(uid, x=uid*0.5, y=1.0, ex=0.01, ey=0.01, spd=0.2,
+                          espd=0.01, facing=45.0, efacing=5.0, diam=0.15,
+                          sigmadiam=0.01, sep=0.3, sigmasep=0.02,
+                          leftness=0.5, vis=0)
+        for leg in range(2):
+            field.update_leg(uid, leg, nlegs=2, x=uid*0.5, y=1.0+leg*0.3,
+                             ex=0.01, ey=0.01, spd=0.2, espd=0.01,
+                             heading=45.0, eheading=5.0, vis=0)
+        field.update_geo(uid, fromcenter=1.0, fromnearest=0.5, fromexit=2.0)
+    for (uid0, uid1) in combinations(range(1, ncells+1), 2):
+        cid = field.get_cid(uid0, uid1)
+        field.update_conx_attr(cid, uid0, uid1, 'friends', 0.5, True)
+    return field
+
+
+def main(ncells=50):
+    field = fill_field(ncells)
+    cells = field.m_cell_dict.values()
+    conxs = field.m_conx_dict.values()
+    # cells reference their connectors and vice versa, so measure each with
+    # the other excluded
+    exclude = [field] + [field.m_cell_dict, field.m_conx_dict]
+    cell_bytes = deep_sizeof(cells, exclude + conxs)
+    conx_bytes = deep_sizeof(conxs, exclude + cells)
+    cell = cells[0]
+    access = timeit(lambda: (cell.m_x, cell.m_y, cell.m_vx, cell.m_vy),
+                    number=200000)
+    print "%d cells, %d connectors" % (len(cells), len(conxs))
+    print "bytes per cell:      %8.1f" % (float(cell_bytes)/len(cells))
+    print "bytes per connector: %8.1f" % (float(conx_bytes)/len(conxs))
+    print "attr access (200k x 4): %.3f sec" % access
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    if len(sys.argv) > 1:
+        sys.exit(main(int(sys.argv[1])))
+    sys.exit(main())
@@ -21,17 +21,22 @@ __license__ = "GNU GPL 3.0 or later"
 import types
 from time import time
 import socket
+import select
 import sys
 
 # installed modules
 sys.path.append('..')
-from OSC import OSCServer, OSCClient, OSCMessage, OSCClientError
+from OSC import OSCServer, OSCClient, OSCMessage, OSCClientError, decodeOSC
 #import pyglet
 
 # local modules
 import config
 import logging
 
+# local classes
+from frame import Frame
+from schema import compile_schemas
+
 # Auto-configuration of hosts
 hostname=socket.gethostname()
 print "hostname=",hostname
@@ -88,6 +93,16 @@ EVENT_TYPES = [
     'tag',
 ]
 
+# Tracker messages that carry the frame number as their first arg
+FRAME_PATHS = [
+    '/pf/frame',
+    '/pf/update',
+    '/pf/body',
+    '/pf/leg',
+    '/pf/geo',
+    '/pf/group',
+]
+
 # init logging
 logger=logging.getLogger(__name__)
 
@@ -114,6 +129,11 @@ class OSCHandler(object):
         self.m_xmax = 0
         self.m_ymax = 0
         self.m_health = 0
+        self.m_report_stretch = 1
+        self.m_coalesce = False
+        self.m_coalesced = 0
+        self.m_frame_record = None
+        self.m_schemas = compile_schemas()
         
         # Setup OSC server and clients
         osc_server = []
@@ -159,9 +179,9 @@ class OSCHandler(object):
         # from tracker
         self.m_oscserver.addMsgHandler("/pf/started",self.event_tracking_start)
         self.m_oscserver.addMsgHandler("/pf/stopped",self.event_tracking_stop)
-        self.m_oscserver.addMsgHandler("/pf/entry",self.event_tracking_entry)
-        self.m_oscserver.addMsgHandler("/pf/exit",self.event_tracking_exit)
-        self.m_oscserver.addMsgHandler("/pf/frame",self.event_tracking_frame)
+        self.add_tracker_handler("/pf/entry",self.event_tracking_entry)
+        self.add_tracker_handler("/pf/exit",self.event_tracking_exit)
+        self.add_tracker_handler("/pf/frame",self.event_tracking_frame)
         self.m_oscserver.addMsgHandler("/pf/set/minx",self.event_tracking_set)
         self.m_oscserver.addMsgHandler("/pf/set/miny",self.event_tracking_set)
         self.m_oscserver.addMsgHandler("/pf/set/maxx",self.event_tracking_set)
@@ -170,11 +190,11 @@ class OSCHandler(object):
         self.m_oscserver.addMsgHandler("/pf/set/groupdist",self.event_tracking_set)
         self.m_oscserver.addMsgHandler("/pf/set/ungroupdist",self.event_tracking_set)
         self.m_oscserver.addMsgHandler("/pf/set/fps",self.event_tracking_set)
-        self.m_oscserver.addMsgHandler("/pf/update",self.event_tracking_update)
-        self.m_oscserver.addMsgHandler("/pf/leg",self.event_tracking_leg)
-        self.m_oscserver.addMsgHandler("/pf/body",self.event_tracking_body)
-        self.m_oscserver.addMsgHandler("/pf/group",self.event_tracking_group)
-        self.m_oscserver.addMsgHandler("/pf/geo",self.event_tracking_geo)
+        self.add_tracker_handler("/pf/update",self.event_tracking_update)
+        self.add_tracker_handler("/pf/leg",self.event_tracking_leg)
+        self.add_tracker_handler("/pf/body",self.event_tracking_body)
+        self.add_tracker_handler("/pf/group",self.event_tracking_group)
+        self.add_tracker_handler("/pf/geo",self.event_tracking_geo)
 
         # to conductor
         self.m_oscserver.addMsgHandler( "/conductor/dump",self.event_conduct_dump)
@@ -203,12 +223,98 @@ class OSCHandler(object):
 
         self.honey_im_home()
 
+    def add_tracker_handler(self, path, handler):
+        """Register a handler that takes a decoded record (see schema.py)."""
+        self.m_oscserver.addMsgHandler(path, self.m_schemas[path].handler(handler))
+
+    def malformed_counts(self):
+        """Return the count of malformed messages, indexed by path."""
+        return dict((path, schema.m_malformed)
+                    for path, schema in self.m_schemas.iteritems()
+                    if schema.m_malformed)
+
     def each_frame(self):
         # clear timed_out flag
         self.m_oscserver.timed_out = False
+        if self.m_coalesce:
+            self.each_frame_coalesced()
+            return
         # handle all pending requests then return
         while not self.m_oscserver.timed_out:
             self.m_oscserver.handle_request()
+        self.check_frame_record()
+
+    def each_frame_coalesced(self):
+        """Handle all pending requests, skipping stale tracker frames.
+
+        When we fall behind, several tracker frames pile up in the socket. We
+        read everything that is waiting before dispatching any of it, find the
+        newest frame number, and drop the frame messages from older frames so
+        only the newest one is processed.
+        """
+        server = self.m_oscserver
+        pending = []
+        newest = None
+        while select.select([server.socket], [], [], 0)[0]:
+            (packet, source) = server.socket.recvfrom(server.max_packet_size)
+            for msg in self.unbundle(decodeOSC(packet)):
+                # ('nan' frames are malformed, and would sort after any int)
+                if msg[0] == '/pf/frame' and len(msg) > 2 and \
+                        isinstance(msg[2], int):
+                    if newest is None or msg[2] > newest:
+                        newest = msg[2]
+                pending.append((msg, source))
+        for (msg, source) in pending:
+            if newest is not None and msg[0] in FRAME_PATHS and \
+                    len(msg) > 2 and msg[2] < newest:
+                self.m_coalesced += 1
+                continue
+            try:
+                server.dispatchMessage(msg[0], msg[1][1:], msg[2:], source)
+            except Exception:
+                logger.warning("each_frame_coalesced:Unable to handle %s", msg[0],
+                               exc_info=True)
+        self.check_frame_record()
+
+    def get_frame_record(self, frame):
+        """Return the record we are assembling for this frame.
+
+        A message from a different frame means the tracker has moved on, so
+        we apply the record we have and start a new one.
+        """
+        if self.m_frame_record is not None and \
+                self.m_frame_record.m_frame != frame:
+            self.flush_frame_record()
+        if self.m_frame_record is None:
+            self.m_frame_record = Frame(frame)
+        return self.m_frame_record
+
+    def flush_frame_record(self):
+        """Apply the frame record we are assembling to the field."""
+        if self.m_frame_record is not None:
+            record = self.m_frame_record
+            self.m_frame_record = None
+            self.m_field.apply_frame(record)
+
+    def check_frame_record(self):
+        """Apply the frame record if the tracker has gone quiet.
+
+        Otherwise the last frame would wait for the next one to arrive.
+        """
+        if self.m_frame_record is not None and \
+                time() - self.m_frame_record.m_touchtime > config.frame_assembly_timeout:
+            self.flush_frame_record()
+
+    def unbundle(self, decoded):
+        """Flatten a decoded OSC packet into a list of decoded messages."""
+        if not len(decoded):
+            return []
+        if decoded[0] != "#bundle":
+            return [decoded]
+        msgs = []
+        for msg in decoded[2:]:
+            msgs += self.unbundle(msg)
+        return msgs
 
     def user_callback(self, path, tags, args, source):
         # which user will be determined by path:
@@ -319,48 +425,39 @@ class OSCHandler(object):
             self.m_field.update(oscfps=args[0])
             
 
-    def event_tracking_entry(self, path, tags, args, source):
+    def event_tracking_entry(self, path, tags, msg, source):
         """Event when person enters field.
         Sent before first /pf/update message for that target
-        args:
+        msg:
             frame - frame number
             t - time of frame (elapsed time in seconds since
             beginning of run)
-            target - UID of target
+            uid - UID of target
             channel - channel number assigned
         """
-        #print "event_track_entry:",path,args,source
-        #print "args:",args,args[0],args[1],args[2]
-        #frame = args[0]
-        #etime = args[1]
-        uid = args[2]
-        logging.getLogger("cells").info("entry of cell "+str(uid))
-        self.m_field.create_cell(uid)
+        logging.getLogger("cells").info("entry of cell "+str(msg.uid))
+        self.m_field.create_cell(msg.uid)
 
-    def event_tracking_exit(self, path, tags, args, source):
+    def event_tracking_exit(self, path, tags, msg, source):
         """Event when person exits field.
-        args:
+        msg:
              frame - frame number
              t - time of frame (elapsed time in seconds since beginning of run)
-             target - UID of target
+             uid - UID of target
         """
-        #print "event_track_exit:",path,args,source
-        #frame = args[0]
-        #etime = args[1]
-        uid = args[2]
+        uid = msg.uid
         logging.getLogger("cells").info("exit of cell "+str(uid))
-        #print "BEFORE: cells:",self.m_field.m_cell_dict
-        #print "BEFORE: conx:",self.m_field.m_conx_dict
+        # don't let a pending frame bring it back
+        if self.m_frame_record is not None:
+            self.m_frame_record.forget(uid)
         self.m_field.del_cell(uid)
-        #print "AFTER: cells:",self.m_field.m_cell_dict
-        #print "AFTER: conx:",self.m_field.m_conx_dict
 
-    def event_tracking_body(self, path, tags, args, source):
+    def event_tracking_body(self, path, tags, msg, source):
         """Information about people's movement within field.
         Update position of target.
-        args:
+        msg:
             frame - frame number 
-            target - UID of target
+            uid - UID of target
             x,y - position of person within field in m
             ex,ey - standard error of measurement (SEM) of position, in meters 
             spd, heading - estimate of speed of person in m/s, heading in degrees
@@ -372,178 +469,120 @@ class OSCHandler(object):
             sep - estimated mean separation of legs
             sigmasep - estimated sigma (sqrt(variance)) of sep
             leftness - measure of how likely leg 0 is the left leg
-            visibility - number of frames since a fix was found for either leg
+            vis - number of frames since a fix was found for either leg
         """
-        for index, item in enumerate(args):
-            if item == 'nan':
-                args[index] = None
-        frame = args[0]
-        uid = args[1]
-        x = args[2]       # comes in meters
-        y = args[3]
-        ex = args[4]
-        ey = args[5]
-        spd = args[6]
-        #heading = args[7]
-        espd = args[8]
-        #eheading = args[9]
-        facing = args[10]
-        efacing = args[11]
-        diam = args[12]
-        sigmadiam = args[13]
-        sep = args[14]
-        sigmasep = args[15]
-        leftness = args[16]
-        vis = args[17]
+        uid = msg.uid
         if uid not in self.m_field.m_cell_dict:
             logger.info( "event_track_body:no uid "+str(uid)+" in registered cell list")
-        if frame%config.report_frequency['debug'] == 0:
-            logger.debug(" ".join([str(msgpart) for msgpart in [ "    event_track_body:id:",uid,"pos:", (x, y), "data:",
-                                                     ex, ey, spd, espd, facing, efacing, diam, sigmadiam,
-                                                     sep, sigmasep, leftness, vis]]))
-        self.m_field.update_body(uid, x, y, ex, ey, spd, espd, facing, efacing, 
-                           diam, sigmadiam, sep, sigmasep, leftness, vis)
-
-    def event_tracking_leg(self, path, tags, args, source):
+        if msg.frame%config.report_frequency['debug'] == 0:
+            logger.debug(" ".join([str(msgpart) for msgpart in [ "    event_track_body:id:",uid,"pos:", (msg.x, msg.y), "data:",
+                                                     msg.ex, msg.ey, msg.spd, msg.espd, msg.facing, msg.efacing,
+                                                     msg.diam, msg.sigmadiam, msg.sep, msg.sigmasep,
+                                                     msg.leftness, msg.vis]]))
+        self.get_frame_record(msg.frame).add_body(uid, msg.x, msg.y, msg.ex, msg.ey,
+                                                  msg.spd, msg.espd, msg.facing,
+                                                  msg.efacing, msg.diam, msg.sigmadiam,
+                                                  msg.sep, msg.sigmasep, msg.leftness,
+                                                  msg.vis)
+
+    def event_tracking_leg(self, path, tags, msg, source):
         """Information about individual leg movement within field.
         Update position of leg.
-        args:
+        msg:
             frame - frame number 
-            id - UID of target
+            uid - UID of target
             leg - leg number (0..nlegs-1)
             nlegs - number of legs target is modeled with 
             x,y - position within field in m
             ex,ey - standard error of measurement (SEM) of position, in meters 
             spd, heading - estimate of speed of leg in m/s, heading in degrees
             espd, eheading - SEM of spd, heading
-            visibility - number of frames since a positive fix
+            vis - number of frames since a positive fix
         """
-        for index, item in enumerate(args):
-            if item == 'nan':
-                args[index] = None
-        frame = args[0]
-        uid = args[1]
-        leg = args[2]
-        nlegs = args[3]
-        x = args[4]       # comes in meters
-        y = args[5]
-        ex = args[6]
-        ey = args[7]
-        spd = args[8]
-        heading = args[9]
-        espd = args[10]
-        eheading = args[11]
-        vis = args[12]
+        uid = msg.uid
         if uid not in self.m_field.m_cell_dict:
             logger.info( "event_track_leg:no uid "+str(uid)+" in registered cell list")
-        if frame%config.report_frequency['debug'] == 0:
-            logger.debug(" ".join([str(msgpart) for msgpart in ["    event_track_leg:id:", uid, "leg:", leg, "pos:", (x,y),
-                                                        "data:", ex, ey, spd, espd, heading, eheading, vis]]))
-        self.m_field.update_leg(uid, leg, nlegs, x, y, ex, ey, spd, espd, 
-                                   heading, eheading, vis)
-
-    def event_tracking_update(self, path, tags, args, source):
+        if msg.frame%config.report_frequency['debug'] == 0:
+            logger.debug(" ".join([str(msgpart) for msgpart in ["    event_track_leg:id:", uid, "leg:", msg.leg,
+                                                        "pos:", (msg.x, msg.y), "data:", msg.ex, msg.ey,
+                                                        msg.spd, msg.espd, msg.heading, msg.eheading, msg.vis]]))
+        self.get_frame_record(msg.frame).add_leg(uid, msg.leg, msg.nlegs, msg.x, msg.y,
+                                                 msg.ex, msg.ey, msg.spd, msg.espd,
+                                                 msg.heading, msg.eheading, msg.vis)
+
+    def event_tracking_update(self, path, tags, msg, source):
         """Information about people's movement within field.
         Update position of target.
-        args:
+        msg:
             /pf/update frame t target x y vx vy major minor groupid groupsize channel
                 frame - frame number
                 t - time of frame (elapsed time in seconds)
-                target - UID of target, always increments
+                uid - UID of target, always increments
                 x,y - position within field in meters
                 vx,vy - estimate of velocity in m/s
                 major,minor - major/minor axis size in m
-                groupid - id number of group (0 if not in any group)
-                groupsize - number of people in group (including this person)
+                gid - id number of group (0 if not in any group)
+                gsize - number of people in group (including this person)
                 channel - channel number assigned
         """
-        for index, item in enumerate(args):
-            if item == 'nan':
-                args[index] = None
-        frame = args[0]
-        # etime = args[1]
-        uid = args[2]
+        uid = msg.uid
         if uid not in self.m_field.m_cell_dict:
             logger.info( "event_track_update:no uid "+str(uid)+" in registered cell list")
-        x = args[3]       # comes in meters
-        y = args[4]
-        vx = args[5]
-        vy = args[6]
-        major = args[7]
-        minor = args[8]
-        gid = args[9]
-        gsize = args[10]
-        #channel = args[11]
-        #print "event_track_update:",path,args,source
-        if frame%config.report_frequency['debug'] == 0:
-            #print "event_track_update:",path,args,source
-            logger.debug(" ".join([str(msgpart) for msgpart in [ " event_track_update:id:",uid,"pos:", (x, y), "data:", \
-                        vx, vy, major, minor, gid, gsize]]))
-        self.m_field.update_cell(uid, x, y, vx, vy, major, minor, gid, gsize,
-                                 frame=frame)
-
-    def event_tracking_group(self, path, tags, args, source):
+        if msg.frame%config.report_frequency['debug'] == 0:
+            logger.debug(" ".join([str(msgpart) for msgpart in [ " event_track_update:id:",uid,"pos:", (msg.x, msg.y), "data:", \
+                        msg.vx, msg.vy, msg.major, msg.minor, msg.gid, msg.gsize]]))
+        self.get_frame_record(msg.frame).add_update(uid, msg.x, msg.y, msg.vx, msg.vy,
+                                                    msg.major, msg.minor, msg.gid,
+                                                    msg.gsize, tracktime=msg.t)
+
+    def event_tracking_group(self, path, tags, msg, source):
         """Information about people's movement within field.
         Update info about group
         /pf/group frame gid gsize duration centroidX centroidY diameter
-        args:
+        msg:
             frame - frame number
             gid - group ID 
             gsize - number of people in group
             duration - time since first formed in seconds
-            centroidX, centroidY - location of centroid of group
-            diameter - current diameter (mean distance from centroid)
+            x, y - location of centroid of group
+            diam - current diameter (mean distance from centroid)
         """
-        for index, item in enumerate(args):
-            if item == 'nan':
-                args[index] = None
-        #frame = args[0]
-        gid = args[1]
-        gsize = args[2]       # comes in meters
-        duration = args[3]
-        x = args[4]
-        y = args[5]
-        diam = args[6]
+        gid = msg.gid
         if gid not in self.m_field.m_group_dict:
             logger.info( "event_track_group:no gid "+str(gid)+" in group list")
-#        if frame%config.report_frequency['debug'] == 0:
-        logger.debug(" ".join([str(msgpart) for msgpart in ["    event_track_group:gid:",gid, "pos:", (x, y), "data:",gsize, duration, diam]]))
-        self.m_field.update_group(gid, gsize, duration, x, y, diam)
+        logger.debug(" ".join([str(msgpart) for msgpart in ["    event_track_group:gid:",gid, "pos:", (msg.x, msg.y),
+                                                            "data:",msg.gsize, msg.duration, msg.diam]]))
+        self.get_frame_record(msg.frame).add_group(gid, msg.gsize, msg.duration,
+                                                   msg.x, msg.y, msg.diam)
 
-    def event_tracking_geo(self, path, tags, args, source):
+    def event_tracking_geo(self, path, tags, msg, source):
         """Information about people's movement within field.
         Update info about group
         /pf/geo frame target fromcenter fromothers fromexit
-        args:
+        msg:
             frame - frame number 
             uid - UID of target
             fromcenter -target's distance from geographic center of everyone
             fromnearest - target's distance from the nearest other person (-1 if nobody else)
             fromexit - This person's distance from nearest exit from tracked area
         """
-        for index, item in enumerate(args):
-            if item == 'nan':
-                args[index] = None
-        frame = args[0]
-        uid = args[1]
-        fromcenter = args[2]       # comes in meters
-        fromnearest = args[3]
-        fromexit = args[4]
+        uid = msg.uid
         if uid not in self.m_field.m_cell_dict:
             logger.info("event_track_geo:no uid "+str(uid)+" in registered cell list")
-        if frame%config.report_frequency['debug'] == 0:
+        if msg.frame%config.report_frequency['debug'] == 0:
             logger.debug(" ".join([str(x) for x in ["    event_track_geo:uid:",uid, "data:",
-                                                    fromcenter, fromnearest, fromexit]]))
-        self.m_field.update_geo(uid, fromcenter, fromnearest, fromexit)
+                                                    msg.fromcenter, msg.fromnearest, msg.fromexit]]))
+        self.get_frame_record(msg.frame).add_geo(uid, msg.fromcenter, msg.fromnearest,
+                                                 msg.fromexit)
 
-    def event_tracking_frame(self, path, tags, args, source):
+    def event_tracking_frame(self, path, tags, msg, source):
         """New frame event.
-        args:
+        msg:
             frame - frame number
         """
-        #print "event_track_frame:",path,args,source
-        frame = args[0]
-        self.m_field.update(frame=frame)
+        frame = msg.frame
+        # applies the previous frame's record and starts this one
+        self.get_frame_record(frame)
         if frame%config.report_frequency['debug'] == 0:
             logger.debug( "event_track_frame::"+str(frame))
         return None
@@ -554,9 +593,16 @@ class OSCHandler(object):
         return None
 
 
-    def update(self, field=None, conductor=None):
-        self.m_field = field
-        self.m_conductor = conductor
+    def update(self, field=None, conductor=None, reportstretch=None,
+               coalesce=None):
+        if field is not None:
+            self.m_field = field
+        if conductor is not None:
+            self.m_conductor = conductor
+        if reportstretch is not None:
+            self.m_report_stretch = reportstretch
+        if coalesce is not None:
+            self.m_coalesce = coalesce
 
     #
     # INCOMING to Conductor
@@ -641,15 +687,17 @@ class OSCHandler(object):
     def send_regular_reports(self):
         """Send all the reports that are send every cycle."""
         frame = self.m_field.m_frame
-        if frame%config.report_frequency['rollcall'] == 0:
+        # when we are shedding load, we report less often
+        stretch = self.m_report_stretch
+        if frame%(config.report_frequency['rollcall']*stretch) == 0:
             self.send_rollcall()
-        if frame%config.report_frequency['attrs'] == 0:
+        if frame%(config.report_frequency['attrs']*stretch) == 0:
             self.send_cell_attrs()
-        if frame%config.report_frequency['conxs'] == 0:
+        if frame%(config.report_frequency['conxs']*stretch) == 0:
             self.send_conx_attr()
-        if frame%config.report_frequency['gattrs'] == 0:
+        if frame%(config.report_frequency['gattrs']*stretch) == 0:
             self.send_group_attrs()
-        if frame%config.report_frequency['uisettings'] == 0:
+        if frame%(config.report_frequency['uisettings']*stretch) == 0:
             self.send_uisettings()
         if frame%config.report_frequency['health'] == 0:
             self.send_health()
@@ -657,6 +705,15 @@ class OSCHandler(object):
     def send_health(self):
         self.m_field.m_osc.send_to("touchosc","/health/COND",self.m_health)
         self.m_health=1-self.m_health
+
+    def send_load(self, level, frametime):
+        """Sends the load shedding level so operators can see it.
+        /health/load [level,frametime,coalesced,malformed]
+        """
+        args = [level, frametime, self.m_coalesced,
+                sum(self.malformed_counts().values())]
+        self.send_to("touchosc", "/health/load", args)
+        self.send_to("recorder", "/health/load", args)
         
     def send_uisettings(self):
         #print "Sending ui settings"
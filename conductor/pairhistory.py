@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Lifetime history of pairs of cells.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+
+__appname__ = "pairhistory.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# core modules
+import logging
+
+# local modules
+import config
+
+# init logging
+logger = logging.getLogger(__name__)
+
+
+class PairRecord(object):
+    """What we remember about one pair.
+
+    Stores the following values:
+        m_first: time of first contact (any type)
+        m_last: time of last contact (any type)
+        m_mask: bitmask of the conx types that have ever connected them
+        m_times: [cumulative sec, last time] indexed by type bit; only types
+            in m_mask have an entry
+
+    """
+
+    __slots__ = ('m_first', 'm_last', 'm_mask', 'm_times')
+
+    def __init__(self, now):
+        self.m_first = now
+        self.m_last = now
+        self.m_mask = 0
+        self.m_times = {}
+
+
+class PairHistory(object):
+    """Remembers which pairs of cells have been connected, and for how long.
+
+    Records are indexed by (uid0, uid1) with uid0 < uid1, and are kept after
+    the cells are deleted, until they have gone config.pair_history_retention
+    seconds without contact. If there are still more than
+    config.pair_history_max pairs, the ones with the oldest last contact go
+    first.
+
+    Time connected only counts between updates that are less than
+    config.pair_history_gap apart, so a connection that lapses and comes
+    back doesn't count the time in between.
+
+    Stores the following values:
+        m_pairs: PairRecords indexed by (uid0, uid1)
+        m_bits: bit for each conx type, indexed by type (assigned as we go)
+        m_lastprune: when we last pruned
+
+    """
+
+    def __init__(self):
+        self.m_pairs = {}
+        self.m_bits = {}
+        self.m_lastprune = 0
+
+    def key(self, uid0, uid1):
+        if uid0 < uid1:
+            return (uid0, uid1)
+        return (uid1, uid0)
+
+    def bit(self, atype):
+        if atype not in self.m_bits:
+            self.m_bits[atype] = 1 << len(self.m_bits)
+        return self.m_bits[atype]
+
+    def mask(self, atypes):
+        """Bitmask for a list of conx types."""
+        mask = 0
+        for atype in atypes:
+            mask |= self.bit(atype)
+        return mask
+
+    def record(self, uid0, uid1, atype, now):
+        """Note that uid0 and uid1 are connected by atype as of now."""
+        key = self.key(uid0, uid1)
+        pair = self.m_pairs.get(key)
+        if pair is None:
+            pair = self.m_pairs[key] = PairRecord(now)
+        bit = self.bit(atype)
+        if pair.m_mask & bit:
+            times = pair.m_times[bit]
+            since = now - times[1]
+            if 0 < since < config.pair_history_gap:
+                times[0] += since
+            times[1] = now
+        else:
+            pair.m_mask |= bit
+            pair.m_times[bit] = [0.0, now]
+        pair.m_last = now
+
+    def get(self, uid0, uid1):
+        """Return the PairRecord for these cells, or None."""
+        return self.m_pairs.get(self.key(uid0, uid1))
+
+    def have_history(self, uid0, uid1, exclude=0):
+        """Have these cells ever been connected (by a type not in the
+        exclude mask)?"""
+        pair = self.m_pairs.get(self.key(uid0, uid1))
+        return pair is not None and bool(pair.m_mask & ~exclude)
+
+    def connected_time(self, uid0, uid1, atype):
+        """Total time these cells have been connected by atype (sec)."""
+        pair = self.m_pairs.get(self.key(uid0, uid1))
+        bit = self.m_bits.get(atype)
+        if pair is None or bit is None or not pair.m_mask & bit:
+            return 0.0
+        return pair.m_times[bit][0]
+
+    def types(self, uid0, uid1):
+        """List the conx types that have ever connected these cells."""
+        pair = self.m_pairs.get(self.key(uid0, uid1))
+        if pair is None:
+            return []
+        return [atype for atype, bit in self.m_bits.iteritems()
+                if pair.m_mask & bit]
+
+    def prune(self, now):
+        """Forget pairs past retention (and the oldest if we have too many).
+        Only does the work every config.pair_history_prune_interval sec."""
+        if now - self.m_lastprune < config.pair_history_prune_interval:
+            return
+        self.m_lastprune = now
+        horizon = now - config.pair_history_retention
+        for key in [key for key, pair in self.m_pairs.iteritems()
+                    if pair.m_last < horizon]:
+            del self.m_pairs[key]
+        extra = len(self.m_pairs) - config.pair_history_max
+        if extra > 0:
+            oldest = sorted(self.m_pairs, key=lambda k: self.m_pairs[k].m_last)
+            for key in oldest[:extra]:
+                del self.m_pairs[key]
+            logger.info("pair history full, forgot %d pairs", extra)
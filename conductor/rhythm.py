@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Batched rhythm analysis of cell motion.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+
+__appname__ = "rhythm.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# installed modules
+import numpy
+
+# local modules
+import config
+
+# the track channels we look for a beat in
+# (velocity rather than speed, since speed doubles the frequency of a sway)
+RHYTHM_CHANNELS = ('vx', 'vy', 'legsep')
+
+
+class Rhythm(object):
+    """Scores how rhythmic each cell's recent motion is.
+
+    Every config.rhythm_cadence calls, we take the last config.rhythm_window
+    samples of velocity and leg separation from up to config.rhythm_batch cells
+    (taking turns if there are more), stack them into one 2-D array and run
+    a single real FFT across it. A cell's rhythmicity is the share of its
+    motion's power that falls in the strongest bin within
+    config.rhythm_band (Hz), taking the better of its channels.
+
+    Stores the following values:
+        m_window: how many samples we look at
+        m_scores: latest rhythmicity (0..1), indexed by uid
+        m_calls: how many times we've been called
+        m_next: where we are in taking turns through the cells
+        m_taper: Hann window applied to each row before the FFT
+        m_band: boolean mask of the FFT bins within the band
+
+    """
+
+    def __init__(self, window=None):
+        if window is None:
+            window = config.rhythm_window
+        self.m_window = window
+        self.m_scores = {}
+        self.m_calls = 0
+        self.m_next = 0
+        self.m_taper = numpy.hanning(window)
+        freqs = numpy.fft.rfftfreq(window, 1.0/config.framerate)
+        (low, high) = config.rhythm_band
+        self.m_band = (freqs >= low) & (freqs <= high)
+
+    def update(self, field):
+        """Call once per conductor tick; analyzes on our cadence."""
+        self.m_calls += 1
+        if self.m_calls % config.rhythm_cadence:
+            return
+        # forget cells that are gone
+        for uid in self.m_scores.keys():
+            if uid not in field.m_cell_dict:
+                del self.m_scores[uid]
+        ready = sorted(uid for uid, track in field.m_track_dict.iteritems()
+                       if track.m_count >= self.m_window)
+        if not ready:
+            return
+        if len(ready) > config.rhythm_batch:
+            start = self.m_next % len(ready)
+            ready = (ready[start:] + ready[:start])[:config.rhythm_batch]
+            self.m_next = start + config.rhythm_batch
+        self.analyze(ready, [field.m_track_dict[uid] for uid in ready])
+
+    def analyze(self, uids, tracks):
+        window = self.m_window
+        nchan = len(RHYTHM_CHANNELS)
+        rows = numpy.empty((len(tracks)*nchan, window))
+        for i, track in enumerate(tracks):
+            for j, channel in enumerate(RHYTHM_CHANNELS):
+                rows[i*nchan+j] = track.window(channel)[-window:]
+        # fill gaps (legsep without both legs) with the rest's mean, so
+        # they don't add any power
+        missing = numpy.isnan(rows)
+        if missing.any():
+            present = ~missing
+            means = numpy.where(present, rows, 0).sum(axis=1) / \
+                    numpy.maximum(present.sum(axis=1), 1)
+            rows = numpy.where(missing, means[:, numpy.newaxis], rows)
+        rows -= rows.mean(axis=1)[:, numpy.newaxis]
+        rows *= self.m_taper
+        power = numpy.abs(numpy.fft.rfft(rows, axis=1)) ** 2
+        # leave out DC, it's mostly what's left of the mean
+        total = power[:, 1:].sum(axis=1)
+        peak = power[:, self.m_band].max(axis=1)
+        share = numpy.where(total > 0, peak / numpy.maximum(total, 1e-12), 0)
+        share = share.reshape(len(tracks), nchan).max(axis=1)
+        for uid, score in zip(uids, share):
+            self.m_scores[uid] = float(score)
+
+    def get_score(self, uid):
+        """Latest rhythmicity of this cell (0 if we haven't judged it)."""
+        return self.m_scores.get(uid, 0.0)
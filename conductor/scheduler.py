@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Frame-budget scheduler for the conductor main loop.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+__appname__ = "scheduler.py"
+__author__ = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# core modules
+from time import time
+import logging
+
+# local modules
+import config
+
+# init logging
+logger = logging.getLogger(__name__)
+
+class Scheduler(object):
+    """Measures each stage of a frame and sheds load when we fall behind.
+
+    Stores the following values:
+        m_osc: back ref to the osc handler
+        m_conductor: back ref to the conductor
+        m_budget: how much time we have for each frame (sec)
+        m_level: how many of config.load_shed_steps are in effect (0 = none)
+        m_stage_times: time spent in each stage of the current frame (sec)
+        m_frame_time: total time spent on the last frame (sec)
+        m_overruns: count of consecutive frames over budget
+        m_underruns: count of consecutive frames comfortably under budget
+
+    start_frame: start the clock on a new frame
+    end_stage: record the time spent on a stage of the frame
+    end_frame: stop the clock and raise or lower the degradation level
+
+    The degradation steps are applied in the order they are listed in the
+    config. Each time we are over budget for load_shed_overrun_frames frames
+    in a row, we apply one more step. Each time we are under budget for
+    load_shed_recover_frames frames in a row, we back off one step.
+    """
+
+    def __init__(self, osc=None, conductor=None, budget=None):
+        self.m_osc = osc
+        self.m_conductor = conductor
+        if budget is None:
+            if config.frame_budget:
+                budget = config.frame_budget
+            elif config.conductor_rate:
+                budget = 1.0/config.conductor_rate
+            else:
+                budget = 1.0/config.framerate
+        self.m_budget = budget
+        self.m_level = 0
+        self.m_stage_times = {}
+        self.m_frame_start = time()
+        self.m_stage_start = self.m_frame_start
+        self.m_frame_time = 0
+        self.m_overruns = 0
+        self.m_underruns = 0
+
+    def update(self, osc=None, conductor=None, budget=None):
+        if osc is not None:
+            self.m_osc = osc
+        if conductor is not None:
+            self.m_conductor = conductor
+        if budget is not None:
+            self.m_budget = budget
+
+    def start_frame(self):
+        """Start the clock on a new frame."""
+        self.m_stage_times = {}
+        self.m_frame_start = time()
+        self.m_stage_start = self.m_frame_start
+
+    def end_stage(self, stage):
+        """Record the time spent on a stage since the last mark."""
+        now = time()
+        self.m_stage_times[stage] = now - self.m_stage_start
+        self.m_stage_start = now
+
+    def end_frame(self, frame):
+        """Stop the clock on this frame and adjust our degradation level."""
+        self.m_frame_time = time() - self.m_frame_start
+        if self.m_frame_time > self.m_budget:
+            self.m_overruns += 1
+            self.m_underruns = 0
+        elif self.m_frame_time < self.m_budget*config.load_shed_recover_fraction:
+            self.m_underruns += 1
+            self.m_overruns = 0
+        else:
+            self.m_overruns = 0
+            self.m_underruns = 0
+
+        if self.m_overruns >= config.load_shed_overrun_frames and \
+                self.m_level < len(config.load_shed_steps):
+            self.set_level(self.m_level + 1)
+        elif self.m_underruns >= config.load_shed_recover_frames and \
+                self.m_level > 0:
+            self.set_level(self.m_level - 1)
+        elif frame%config.report_frequency['load'] == 0:
+            self.m_osc.send_load(self.m_level, self.m_frame_time)
+
+    def is_active(self, step):
+        """Is this degradation step currently in effect?"""
+        return step in config.load_shed_steps[:self.m_level]
+
+    def set_level(self, level):
+        """Change the degradation level, apply it, and tell the operators."""
+        stages = ", ".join(["%s=%.1fms" % (stage, secs*1000)
+                            for stage, secs in sorted(self.m_stage_times.iteritems())])
+        if level > self.m_level:
+            logger.warning("load shedding up to level %d (%s): frame took %.1fms of %.1fms budget (%s)",
+                           level, config.load_shed_steps[level-1], self.m_frame_time*1000,
+                           self.m_budget*1000, stages)
+        else:
+            logger.warning("load shedding down to level %d: frame took %.1fms of %.1fms budget (%s)",
+                           level, self.m_frame_time*1000, self.m_budget*1000, stages)
+        self.m_level = level
+        self.m_overruns = 0
+        self.m_underruns = 0
+        self.apply()
+        self.m_osc.send_load(self.m_level, self.m_frame_time)
+
+    def apply(self):
+        """Push the current degradation level out to the parts that shed load."""
+        if self.is_active('skip_low_priority'):
+            self.m_conductor.update(skiptypes=config.load_shed_low_priority)
+        else:
+            self.m_conductor.update(skiptypes=[])
+        if self.is_active('stretch_reports'):
+            self.m_osc.update(reportstretch=config.load_shed_report_stretch)
+        else:
+            self.m_osc.update(reportstretch=1)
+        self.m_osc.update(coalesce=self.is_active('coalesce_frames'))
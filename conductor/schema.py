@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Message schemas for incoming tracker OSC messages.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+
+__appname__ = "schema.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# core modules
+from collections import namedtuple
+import logging
+
+# init logging
+logger = logging.getLogger(__name__)
+
+# Field lists for each path. Each field is (name, type), where type is one of
+#   'int' - an integer, 'nan' becomes None
+#   'float' - a float, 'nan' (or a real NaN) becomes None
+#   'any' - passed through as is
+# Trailing args beyond the schema are ignored. Fields named in
+# REQUIRED_FIELDS can't be 'nan'; a message where one is counts as malformed.
+
+TRACKER_SCHEMAS = {
+    '/pf/frame': [
+        ('frame', 'int'),
+    ],
+    '/pf/entry': [
+        ('frame', 'int'), ('t', 'float'), ('uid', 'int'),
+    ],
+    '/pf/exit': [
+        ('frame', 'int'), ('t', 'float'), ('uid', 'int'),
+    ],
+    '/pf/update': [
+        ('frame', 'int'), ('t', 'float'), ('uid', 'int'),
+        ('x', 'float'), ('y', 'float'), ('vx', 'float'), ('vy', 'float'),
+        ('major', 'float'), ('minor', 'float'),
+        ('gid', 'int'), ('gsize', 'int'),
+    ],
+    '/pf/body': [
+        ('frame', 'int'), ('uid', 'int'),
+        ('x', 'float'), ('y', 'float'), ('ex', 'float'), ('ey', 'float'),
+        ('spd', 'float'), ('heading', 'float'),
+        ('espd', 'float'), ('eheading', 'float'),
+        ('facing', 'float'), ('efacing', 'float'),
+        ('diam', 'float'), ('sigmadiam', 'float'),
+        ('sep', 'float'), ('sigmasep', 'float'),
+        ('leftness', 'float'), ('vis', 'int'),
+    ],
+    '/pf/leg': [
+        ('frame', 'int'), ('uid', 'int'), ('leg', 'int'), ('nlegs', 'int'),
+        ('x', 'float'), ('y', 'float'), ('ex', 'float'), ('ey', 'float'),
+        ('spd', 'float'), ('heading', 'float'),
+        ('espd', 'float'), ('eheading', 'float'),
+        ('vis', 'int'),
+    ],
+    '/pf/group': [
+        ('frame', 'int'), ('gid', 'int'), ('gsize', 'int'),
+        ('duration', 'float'), ('x', 'float'), ('y', 'float'),
+        ('diam', 'float'),
+    ],
+    '/pf/geo': [
+        ('frame', 'int'), ('uid', 'int'),
+        ('fromcenter', 'float'), ('fromnearest', 'float'),
+        ('fromexit', 'float'),
+    ],
+}
+
+# we can't place a message in a frame without its frame number
+REQUIRED_FIELDS = ('frame',)
+
+# log the first malformed message on a path, then every this many
+MALFORMED_LOG_EVERY = 100
+
+
+class MalformedMessage(Exception):
+    """Raised when a message doesn't fit its schema."""
+    pass
+
+
+def _to_int(value):
+    if value is None or value == 'nan':
+        return None
+    return int(value)
+
+def _to_float(value):
+    # NaN is the only value that isn't equal to itself
+    if value is None or value == 'nan' or value != value:
+        return None
+    return float(value)
+
+def _to_any(value):
+    return value
+
+CONVERTERS = {
+    'int': _to_int,
+    'float': _to_float,
+    'any': _to_any,
+}
+
+
+class Schema(object):
+    """Decodes the args of one OSC path into a typed record.
+
+    Stores the following values:
+        m_path: the OSC path this schema is for
+        m_fields: list of (name, type) for each arg
+        m_record: the namedtuple class we decode into
+        m_decoded: count of messages decoded
+        m_malformed: count of messages that didn't fit the schema
+
+    """
+
+    def __init__(self, path, fields, required=REQUIRED_FIELDS):
+        self.m_path = path
+        self.m_fields = fields
+        self.m_record = namedtuple(path.strip('/').replace('/', '_'),
+                                   [name for (name, atype) in fields])
+        self.m_decoded = 0
+        self.m_malformed = 0
+        # compile the field list down to a tuple of converters
+        self._converters = tuple(CONVERTERS[atype] for (name, atype) in fields)
+        self._nargs = len(fields)
+        self._required = tuple(i for (i, (name, atype)) in enumerate(fields)
+                               if name in required)
+
+    def decode(self, args):
+        """Return a record for these args, or raise MalformedMessage."""
+        if len(args) < self._nargs:
+            raise MalformedMessage("%s: expected %d args, got %d" %
+                                   (self.m_path, self._nargs, len(args)))
+        try:
+            values = [convert(arg) for (convert, arg)
+                      in zip(self._converters, args)]
+        except (ValueError, TypeError), e:
+            raise MalformedMessage("%s: %s" % (self.m_path, e))
+        for i in self._required:
+            if values[i] is None:
+                raise MalformedMessage("%s: no %s" % (self.m_path,
+                                                      self.m_fields[i][0]))
+        self.m_decoded += 1
+        return self.m_record._make(values)
+
+    def handler(self, func):
+        """Wrap a record handler as an OSC message handler.
+
+        func is called as func(path, tags, record, source). Malformed
+        messages are counted and dropped.
+        """
+        def decode_and_handle(path, tags, args, source):
+            try:
+                record = self.decode(args)
+            except MalformedMessage, e:
+                self.m_malformed += 1
+                if self.m_malformed % MALFORMED_LOG_EVERY == 1:
+                    logger.warning("malformed message #%d %s (args=%s)",
+                                   self.m_malformed, e, args)
+                return None
+            return func(path, tags, record, source)
+        return decode_and_handle
+
+
+def compile_schemas(schemas=TRACKER_SCHEMAS):
+    """Return a dict of Schemas, indexed by path."""
+    return dict((path, Schema(path, fields))
+                for path, fields in schemas.iteritems())
@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Incremental matching of happenings that unfold over time.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+
+__appname__ = "sequence.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# core modules
+import logging
+from math import hypot
+
+# local modules
+import config
+
+# init logging
+logger = logging.getLogger(__name__)
+
+
+class TimerWheel(object):
+    """Hashed timer wheel of deadlines.
+
+    Time is cut into ticks of m_resolution sec, and each key sits in the
+    slot for its deadline's tick (mod the number of slots). Scheduling and
+    cancelling are O(1), and each call to expired() only looks at the slots
+    for the ticks that have gone by since the last call, plus the slot for
+    the tick we're in (every call, since its deadlines come due one by one
+    as the tick goes on). Deadlines more than a turn of the wheel away stay
+    put until their turn comes around.
+
+    Stores the following values:
+        m_resolution: how long a tick is (sec)
+        m_slots: list of {key: deadline}, one per tick around the wheel
+        m_where: which slot each key is in, indexed by key
+        m_tick: the last tick we've swept all of (None until the first sweep)
+
+    """
+
+    def __init__(self, resolution, nslots):
+        self.m_resolution = resolution
+        self.m_slots = [{} for _ in range(nslots)]
+        self.m_where = {}
+        self.m_tick = None
+
+    def __contains__(self, key):
+        return key in self.m_where
+
+    def schedule(self, key, deadline):
+        """Set key's deadline, replacing any it had."""
+        self.cancel(key)
+        tick = int(deadline / self.m_resolution)
+        if self.m_tick is not None and tick <= self.m_tick:
+            # that slot has already been swept, catch it on the next one
+            tick = self.m_tick + 1
+        slot = tick % len(self.m_slots)
+        self.m_slots[slot][key] = deadline
+        self.m_where[key] = slot
+
+    def cancel(self, key):
+        slot = self.m_where.pop(key, None)
+        if slot is not None:
+            del self.m_slots[slot][key]
+
+    def expired(self, now):
+        """Remove and return the keys whose deadlines are <= now."""
+        tick = int(now / self.m_resolution)
+        nslots = len(self.m_slots)
+        if self.m_tick is None:
+            self.m_tick = tick - 1
+        if tick <= self.m_tick:
+            if (self.m_tick + 1 - tick) * self.m_resolution <= \
+                    config.clock_restart_jump:
+                # jitter, nothing new can be due yet
+                return []
+            # the clock went back a long way (tracker restart), nothing is
+            # current
+            expired = self.m_where.keys()
+            for slot in self.m_slots:
+                slot.clear()
+            self.m_where = {}
+            self.m_tick = tick - 1
+            return expired
+        # the ticks that are over, and the one we're in
+        if tick - self.m_tick >= nslots:
+            slots = range(nslots)
+        else:
+            slots = [t % nslots for t in range(self.m_tick + 1, tick + 1)]
+        # the current tick isn't over, so we'll look at it again next time
+        self.m_tick = tick - 1
+        expired = []
+        for i in slots:
+            slot = self.m_slots[i]
+            for key in [k for k, deadline in slot.iteritems()
+                        if deadline <= now]:
+                del slot[key]
+                del self.m_where[key]
+                expired.append(key)
+        return expired
+
+
+class SequenceMatcher(object):
+    """Matches config.sequence_rules against pairs of cells as they move.
+
+    Each rule is a list of steps, and each step names a condition (one of
+    the cond_ methods), its parameters, and how long after the previous
+    step it has to happen (sec). A pair that isn't part way through a rule
+    has no state at all; once the first step holds, the pair remembers
+    which step it's waiting for and gets a deadline on the timer wheel. The
+    deadline moves along while the previous step still holds (so the time
+    limit counts from the end of a touch, not the start). If the deadline
+    passes, the pair starts over. When the last step holds, we emit an
+    event and forget the pair.
+
+    Some conditions bind roles: which of the two cells is the "actor." Once
+    bound, later steps see the cells in that order, and the event is
+    emitted with the actor first.
+
+    Stores the following values:
+        m_rules: the rules, indexed by event type
+        m_states: [next step, whether cell1 is the actor] indexed by
+            (cid, etype), for pairs part way through a rule
+        m_timers: TimerWheel of the deadlines of m_states
+
+    """
+
+    def __init__(self, rules=None):
+        if rules is None:
+            rules = config.sequence_rules
+        self.m_rules = rules
+        self.m_states = {}
+        self.m_timers = TimerWheel(config.sequence_resolution,
+                                   config.sequence_slots)
+        for etype, steps in rules.iteritems():
+            for (cond, params, within) in steps:
+                if not hasattr(self, 'cond_' + cond):
+                    logger.error("sequence rule %s: no condition %s",
+                                 etype, cond)
+
+    def expire(self, now):
+        """Forget pairs that ran out of time. Call before advance()."""
+        for key in self.m_timers.expired(now):
+            del self.m_states[key]
+
+    def advance(self, cid, cell0, cell1, dist, now):
+        """Move this pair along each rule; return a list of
+        (etype, uid0, uid1, score) for the rules that completed."""
+        completed = []
+        for etype, steps in self.m_rules.iteritems():
+            key = (cid, etype)
+            state = self.m_states.get(key)
+            if state is None:
+                (cond, params, within) = steps[0]
+                (score, actor, other) = self.check(cond, params, cell0, cell1,
+                                                   dist)
+                if score > 0:
+                    self.m_states[key] = [1, actor is cell1]
+                    self.m_timers.schedule(key, now + steps[1][2])
+                continue
+            (step, swapped) = state
+            if swapped:
+                (actor, other) = (cell1, cell0)
+            else:
+                (actor, other) = (cell0, cell1)
+            (cond, params, within) = steps[step]
+            (score, actor, other) = self.check(cond, params, actor, other, dist)
+            if score > 0:
+                if step + 1 == len(steps):
+                    del self.m_states[key]
+                    self.m_timers.cancel(key)
+                    completed.append((etype, actor.m_id, other.m_id, score))
+                else:
+                    self.m_states[key] = [step + 1, actor is cell1]
+                    self.m_timers.schedule(key, now + steps[step + 1][2])
+                continue
+            # still doing the last step? then the clock hasn't started
+            (cond, params, within) = steps[step - 1]
+            if self.check(cond, params, actor, other, dist)[0] > 0:
+                self.m_timers.schedule(key, now + steps[step][2])
+        return completed
+
+    def check(self, cond, params, cell0, cell1, dist):
+        """Return (score, actor, other) for a condition."""
+        result = getattr(self, 'cond_' + cond)(params, cell0, cell1, dist)
+        if isinstance(result, tuple):
+            return result
+        return (result, cell0, cell1)
+
+    #
+    # Conditions
+    #   Each gets its params, the cells (in role order once roles are
+    #   bound), and the distance between them. They return a score (0 if
+    #   the condition doesn't hold), or (score, actor, other) to bind roles.
+    #
+
+    def separating(self, cell0, cell1, dist):
+        """How fast the cells are moving apart (m/s, negative if closing)."""
+        if not dist:
+            return 0.0
+        return ((cell1.m_vx - cell0.m_vx)*(cell1.m_x - cell0.m_x) +
+                (cell1.m_vy - cell0.m_vy)*(cell1.m_y - cell0.m_y)) / dist
+
+    def speed(self, cell):
+        return hypot(cell.m_vx, cell.m_vy)
+
+    def cond_touch(self, params, cell0, cell1, dist):
+        """Within params['dist'] of each other."""
+        if dist < params['dist']:
+            return 1.0
+        return 0.0
+
+    def cond_part(self, params, cell0, cell1, dist):
+        """At least params['dist'] apart and separating at params['speed']
+        or more. Scores by how fast (1.0 at twice the minimum)."""
+        speed = self.separating(cell0, cell1, dist)
+        if dist < params['dist'] or speed < params['speed']:
+            return 0.0
+        return min(1.0, speed / (2.0 * params['speed']))
+
+    def cond_meet(self, params, cell0, cell1, dist):
+        """Within params['dist'], one moving at params['moving'] or more and
+        the other slower than params['still']. Binds the moving one as the
+        actor."""
+        if dist >= params['dist']:
+            return 0.0
+        speed0 = self.speed(cell0)
+        speed1 = self.speed(cell1)
+        if speed0 >= params['moving'] and speed1 < params['still']:
+            return (1.0, cell0, cell1)
+        if speed1 >= params['moving'] and speed0 < params['still']:
+            return (1.0, cell1, cell0)
+        return 0.0
+
+    def cond_swap(self, params, cell0, cell1, dist):
+        """The actor has stopped (slower than params['still']) and the other
+        is moving at params['moving'] or more, at least params['dist']
+        away."""
+        if dist < params['dist']:
+            return 0.0
+        if self.speed(cell0) < params['still'] and \
+                self.speed(cell1) >= params['moving']:
+            return 1.0
+        return 0.0
+
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Trajectory ring buffer for a cell.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+
+__appname__ = "track.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# core modules
+from math import hypot
+
+# installed modules
+import numpy
+
+# the channels we keep for each sample
+CHANNELS = ('t', 'x', 'y', 'vx', 'vy', 'spd', 'facing',
+            'leg0x', 'leg0y', 'leg1x', 'leg1y', 'legsep')
+CH = dict((name, i) for i, name in enumerate(CHANNELS))
+
+
+class Track(object):
+    """Fixed-size ring buffer of a cell's recent motion.
+
+    Keeps the last m_capacity samples of each channel, along with running
+    sums and sums of squares, so the mean and variance over the window are
+    O(1) to read. Facing is unwrapped as it comes in (359 -> 1 reads as +2
+    degrees), so the change in facing over the window is how far the person
+    has turned. Missing values repeat the last value we had, except for
+    legsep: unless both legs came in with the sample, it's missing (NaN),
+    and the mean and variance are over the samples that have it.
+
+    Stores the following values:
+        m_capacity: how many samples we keep
+        m_buf: (capacity, channels) array of samples
+        m_head: where the next sample goes
+        m_count: how many samples we have (up to capacity)
+        m_sum, m_sumsq: running sums of each channel over the window
+        m_present: how many samples in the window have each channel
+        m_last: the last sample we stored (for filling gaps)
+        m_rawfacing: last facing as reported (for unwrapping)
+        m_adds: samples since we last recomputed the sums
+
+    """
+
+    __slots__ = ('m_capacity', 'm_buf', 'm_head', 'm_count', 'm_sum',
+                 'm_sumsq', 'm_present', 'm_last', 'm_rawfacing', 'm_adds')
+
+    def __init__(self, capacity):
+        self.m_capacity = capacity
+        self.m_buf = numpy.zeros((capacity, len(CHANNELS)))
+        self.m_sum = numpy.zeros(len(CHANNELS))
+        self.m_sumsq = numpy.zeros(len(CHANNELS))
+        self.m_present = numpy.zeros(len(CHANNELS))
+        self.m_last = numpy.zeros(len(CHANNELS))
+        self.m_head = 0
+        self.m_count = 0
+        self.m_rawfacing = None
+        self.m_adds = 0
+
+    def clear(self):
+        self.m_buf.fill(0)
+        self.m_sum.fill(0)
+        self.m_sumsq.fill(0)
+        self.m_present.fill(0)
+        self.m_last.fill(0)
+        self.m_head = 0
+        self.m_count = 0
+        self.m_rawfacing = None
+        self.m_adds = 0
+
+    def add(self, t, x, y, vx, vy, facing=None, leg0=None, leg1=None):
+        """Add a sample. leg0 and leg1 are (x, y) or None."""
+        if self.m_count and t < self.m_last[CH['t']]:
+            # the tracker clock restarted, this history is no good
+            self.clear()
+        row = self.m_last.copy()
+        row[CH['t']] = t
+        for name, value in (('x', x), ('y', y), ('vx', vx), ('vy', vy)):
+            if value is not None:
+                row[CH[name]] = value
+        row[CH['spd']] = hypot(row[CH['vx']], row[CH['vy']])
+        if facing is not None:
+            if self.m_rawfacing is None:
+                row[CH['facing']] = facing
+            else:
+                # take the short way around
+                row[CH['facing']] += (facing - self.m_rawfacing + 180) % 360 - 180
+            self.m_rawfacing = facing
+        legs = 0
+        for prefix, leg in (('leg0', leg0), ('leg1', leg1)):
+            if leg is not None and leg[0] is not None and leg[1] is not None:
+                row[CH[prefix+'x']] = leg[0]
+                row[CH[prefix+'y']] = leg[1]
+                legs += 1
+        if legs == 2:
+            row[CH['legsep']] = hypot(row[CH['leg0x']] - row[CH['leg1x']],
+                                      row[CH['leg0y']] - row[CH['leg1y']])
+        else:
+            row[CH['legsep']] = numpy.nan
+
+        if self.m_count == self.m_capacity:
+            (old, present) = self.known(self.m_buf[self.m_head])
+            self.m_sum -= old
+            self.m_sumsq -= old*old
+            self.m_present -= present
+        else:
+            self.m_count += 1
+        self.m_buf[self.m_head] = row
+        (new, present) = self.known(row)
+        self.m_sum += new
+        self.m_sumsq += new*new
+        self.m_present += present
+        self.m_last = row
+        self.m_head = (self.m_head + 1) % self.m_capacity
+        # every so often, recompute the sums so rounding errors don't pile up
+        self.m_adds += 1
+        if self.m_adds >= self.m_capacity:
+            self.m_adds = 0
+            (window, present) = self.known(self.window_rows())
+            self.m_sum = window.sum(axis=0)
+            self.m_sumsq = (window*window).sum(axis=0)
+            self.m_present = present.sum(axis=0)
+
+    @staticmethod
+    def known(rows):
+        """Return (rows with missing values as 0, which values we have)."""
+        present = ~numpy.isnan(rows)
+        return (numpy.where(present, rows, 0.0), present)
+
+    def window_rows(self):
+        """Return the samples in the window, oldest first (a copy)."""
+        if self.m_count < self.m_capacity:
+            return self.m_buf[:self.m_count].copy()
+        return numpy.roll(self.m_buf, -self.m_head, axis=0)
+
+    def window(self, name):
+        """Return one channel over the window, oldest first."""
+        col = self.m_buf[:, CH[name]]
+        if self.m_count < self.m_capacity:
+            return col[:self.m_count].copy()
+        return numpy.roll(col, -self.m_head)
+
+    def mean(self, name):
+        count = self.m_present[CH[name]]
+        if not count:
+            return 0.0
+        return self.m_sum[CH[name]] / count
+
+    def var(self, name):
+        count = self.m_present[CH[name]]
+        if not count:
+            return 0.0
+        mean = self.m_sum[CH[name]] / count
+        return max(0.0, self.m_sumsq[CH[name]] / count - mean*mean)
+
+    def std(self, name):
+        return self.var(name) ** 0.5
+
+    def first(self, name):
+        """Oldest value in the window."""
+        if self.m_count < self.m_capacity:
+            return self.m_buf[0, CH[name]]
+        return self.m_buf[self.m_head, CH[name]]
+
+    def last(self, name):
+        """Newest value in the window."""
+        return self.m_last[CH[name]]
+
+    def duration(self):
+        """Time spanned by the window (sec)."""
+        if self.m_count < 2:
+            return 0.0
+        return self.last('t') - self.first('t')
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Batched lagged cross-correlation of cell velocities.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+
+__appname__ = "xcorr.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# core modules
+from math import hypot
+from itertools import combinations
+
+# installed modules
+import numpy
+
+# local modules
+import config
+
+
+class CrossCorrelator(object):
+    """Finds pairs whose movements follow each other, possibly with a lag.
+
+    Every config.xcorr_cadence calls, we pick the candidate pairs (cells
+    within config.xcorr_max_dist of each other, or already connected), take
+    the last config.xcorr_window velocity samples of each cell from its
+    track, and FFT every cell's vx and vy in one batch. Each pair's
+    cross-correlation then costs one spectrum product and one inverse FFT.
+    We look at lags up to config.xcorr_max_lag samples either way.
+
+    Two correlations per pair:
+        coord: velocities as they are (moving the same way, so walking
+            side by side at the same pace counts)
+        mirror: how the velocities change, less their means, with the
+            second cell's reflected across the line halfway between them
+            (as if the first were looking in a mirror)
+
+    Correlations are normalized (1 = identical motion, -1 = opposite). A
+    pair where either cell's RMS speed is below config.xcorr_min_speed
+    scores 0.
+
+    Stores the following values:
+        m_calls: how many times we've been called
+        m_results: (coord_peak, coord_lag, mirror_peak, mirror_lag) indexed
+            by cid, lags in sec (positive means cell1 follows cell0)
+        m_speeds: each cell's RMS speed over the window, indexed by uid
+
+    """
+
+    def __init__(self):
+        self.m_calls = 0
+        self.m_results = {}
+        self.m_speeds = {}
+
+    def update(self, field):
+        """Call once per conductor tick; correlates on our cadence."""
+        self.m_calls += 1
+        if self.m_calls % config.xcorr_cadence:
+            return
+        window = config.xcorr_window
+        ready = [uid for uid, track in field.m_track_dict.iteritems()
+                 if track.m_count >= window and uid in field.m_cell_dict]
+        pairs = []
+        for (uid0, uid1) in combinations(sorted(ready), 2):
+            cell0 = field.m_cell_dict[uid0]
+            cell1 = field.m_cell_dict[uid1]
+            cid = field.get_cid(uid0, uid1)
+            if cid in field.m_conx_dict or \
+                    hypot(cell0.m_x - cell1.m_x, cell0.m_y - cell1.m_y) <= \
+                    config.xcorr_max_dist:
+                pairs.append((cid, uid0, uid1))
+        self.m_results = {}
+        self.m_speeds = {}
+        if pairs:
+            self.correlate(field, pairs)
+
+    def correlate(self, field, pairs):
+        window = config.xcorr_window
+        maxlag = min(config.xcorr_max_lag, window-1)
+        uids = sorted(set([p[1] for p in pairs] + [p[2] for p in pairs]))
+        row = dict((uid, i) for i, uid in enumerate(uids))
+        vx = numpy.empty((len(uids), window))
+        vy = numpy.empty((len(uids), window))
+        for uid, i in row.iteritems():
+            track = field.m_track_dict[uid]
+            vx[i] = track.window('vx')[-window:]
+            vy[i] = track.window('vy')[-window:]
+        energy = (vx*vx + vy*vy).sum(axis=1)
+        rms = numpy.sqrt(energy/window)
+        for uid, i in row.iteritems():
+            self.m_speeds[uid] = float(rms[i])
+        # the mirror is of how they move, not where they drift
+        dx = vx - vx.mean(axis=1)[:, numpy.newaxis]
+        dy = vy - vy.mean(axis=1)[:, numpy.newaxis]
+        denergy = (dx*dx + dy*dy).sum(axis=1)
+        # zero pad so the correlation doesn't wrap around
+        nfft = 1
+        while nfft < 2*window:
+            nfft *= 2
+        fx = numpy.fft.rfft(vx, nfft, axis=1)
+        fy = numpy.fft.rfft(vy, nfft, axis=1)
+        fdx = numpy.fft.rfft(dx, nfft, axis=1)
+        fdy = numpy.fft.rfft(dy, nfft, axis=1)
+
+        i0 = numpy.array([row[p[1]] for p in pairs])
+        i1 = numpy.array([row[p[2]] for p in pairs])
+        # unit vector from cell0 to cell1, for the mirror
+        ux = numpy.empty(len(pairs))
+        uy = numpy.empty(len(pairs))
+        for k, (cid, uid0, uid1) in enumerate(pairs):
+            cell0 = field.m_cell_dict[uid0]
+            cell1 = field.m_cell_dict[uid1]
+            dx = cell1.m_x - cell0.m_x
+            dy = cell1.m_y - cell0.m_y
+            dist = hypot(dx, dy) or 1.0
+            ux[k] = dx/dist
+            uy[k] = dy/dist
+        ux = ux[:, numpy.newaxis]
+        uy = uy[:, numpy.newaxis]
+
+        norm = numpy.sqrt(energy[i0]*energy[i1])
+        norm[norm == 0] = 1.0
+        coord = self.lagged(fx[i0], fy[i0], fx[i1], fy[i1], nfft, maxlag) / \
+                norm[:, numpy.newaxis]
+        bx = fdx[i1]
+        by = fdy[i1]
+        # reflecting is linear, so we can do it to the spectra
+        mx = (1 - 2*ux*ux)*bx - 2*ux*uy*by
+        my = -2*ux*uy*bx + (1 - 2*uy*uy)*by
+        norm = numpy.sqrt(denergy[i0]*denergy[i1])
+        norm[norm == 0] = 1.0
+        mirror = self.lagged(fdx[i0], fdy[i0], mx, my, nfft, maxlag) / \
+                 norm[:, numpy.newaxis]
+        moving = (rms[i0] >= config.xcorr_min_speed) & \
+                 (rms[i1] >= config.xcorr_min_speed)
+        lags = numpy.arange(-maxlag, maxlag+1) / float(config.framerate)
+        coord_at = coord.argmax(axis=1)
+        mirror_at = mirror.argmax(axis=1)
+        for k, (cid, uid0, uid1) in enumerate(pairs):
+            if moving[k]:
+                self.m_results[cid] = (float(coord[k, coord_at[k]]),
+                                       float(lags[coord_at[k]]),
+                                       float(mirror[k, mirror_at[k]]),
+                                       float(lags[mirror_at[k]]))
+            else:
+                self.m_results[cid] = (0.0, 0.0, 0.0, 0.0)
+
+    def lagged(self, ax, ay, bx, by, nfft, maxlag):
+        """Sum of the x and y cross-correlations for lags -maxlag..maxlag."""
+        corr = numpy.fft.irfft(numpy.conj(ax)*bx + numpy.conj(ay)*by, nfft,
+                               axis=1)
+        # negative lags wrap around to the end
+        return numpy.hstack((corr[:, nfft-maxlag:], corr[:, :maxlag+1]))
+
+    def get_coord(self, cid):
+        """Return (peak, lag) of the coord correlation, or None."""
+        if cid in self.m_results:
+            return self.m_results[cid][0:2]
+        return None
+
+    def get_speed(self, uid):
+        """Return the cell's RMS speed over the window, or None."""
+        return self.m_speeds.get(uid)
+
+    def get_mirror(self, cid):
+        """Return (peak, lag) of the mirror correlation, or None."""
+        if cid in self.m_results:
+            return self.m_results[cid][2:4]
+        return None
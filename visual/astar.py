@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Array-based A* over a GridMap.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+__appname__ = "astar.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# core modules
+from heapq import heappush, heappop
+from math import hypot
+from time import time
+
+# installed modules
+
+# local modules
+
+# local classes
+from gridmap import PATH_COST_ZIG, PATH_COST_MID
+
+# constants
+DEADLINE_CHECK = 256    # look at the clock every this many squares
+
+
+class AStar(object):
+    """ Computes paths on a GridMap with A*, without making objects per node.
+
+        Squares are flat integer indices (x * ymax + y). The g costs, parents
+        and closed set live in lists that are allocated once and reused for
+        every search: instead of clearing them, each search has a number,
+        and an entry only counts if it was stamped with the current search's
+        number. The open set is a plain heap; when we find a cheaper way to a
+        square we just push it again and skip the stale entry when it comes
+        up.
+
+        The cost of a move is the same as GridMap.move_cost: one step, plus
+        twice the proximity cost of the square we move into, plus
+        PATH_COST_ZIG if we turn, minus PATH_COST_MID if we're on the
+        midpoint row or column between start and goal.
+
+        Has the same compute_path() as PathFinder, so it can stand in for it.
+
+    """
+
+    def __init__(self, gridmap):
+        self.gridmap = gridmap
+        self.size = 0
+        self.search = 0
+        self.g_cost = []
+        self.parent = []
+        self.seen = []
+        self.closed = []
+        # twice the proximity costs as a flat list, and the map version
+        # they're from
+        self.prox_list = []
+        self.prox_version = None
+        self.alloc()
+
+    def alloc(self):
+        """ (Re)allocate the per-square lists if the grid changed size. """
+        size = self.gridmap.xmax * self.gridmap.ymax
+        if size != self.size:
+            self.size = size
+            self.g_cost = [0] * size
+            self.parent = [-1] * size
+            self.seen = [0] * size
+            self.closed = [0] * size
+            self.search = 0
+            self.prox_version = None
+
+    def prox(self):
+        """ Return twice the proximity cost of each square (as move_cost
+            counts it twice) as a flat list, patching just the squares
+            that have changed since last time. """
+        gridmap = self.gridmap
+        if self.prox_version == gridmap.version:
+            return self.prox_list
+        xmax = gridmap.xmax
+        ymax = gridmap.ymax
+        changes = gridmap.changes(self.prox_version)
+        if changes is None:
+            self.prox_list = (gridmap.map[:xmax, :ymax].ravel().astype(int)
+                              * 2).tolist()
+        else:
+            prox = self.prox_list
+            area = gridmap.map
+            for (version, cells, x0, x1, y0, y1) in changes:
+                if x1 - x0 == 1 and y1 - y0 == 1:
+                    prox[x0*ymax + y0] = int(area[x0, y0]) * 2
+                    continue
+                rows = (area[x0:x1, y0:y1].astype(int) * 2).tolist()
+                for (x, row) in enumerate(rows, x0):
+                    prox[x*ymax + y0:x*ymax + y1] = row
+        self.prox_version = gridmap.version
+        return self.prox_list
+
+    def compute_path(self, start, goal, deadline=None, corridor=None,
+                     midpoint=None):
+        """ Compute the path between the 'start' point and the
+            'goal' point.
+
+            The path is returned as a list of the points, including the
+            start and goal points themselves.
+
+            If no path was found, an empty list is returned. If we're still
+            looking at time() 'deadline', we give up and return None. If
+            we're given a corridor (a flat sequence that's true for each
+            square we may use), we stay inside it. The midpoint bonus goes
+            to the midpoint of start and goal unless we're given another
+            (when this is one leg of a longer path).
+        """
+        self.alloc()
+        xmax = self.gridmap.xmax
+        ymax = self.gridmap.ymax
+        (sx, sy) = start
+        (gx, gy) = goal
+        if not (0 <= sx < xmax and 0 <= sy < ymax and
+                0 <= gx < xmax and 0 <= gy < ymax):
+            return []
+        self.search += 1
+        search = self.search
+        g_cost = self.g_cost
+        parent = self.parent
+        seen = self.seen
+        closed = self.closed
+        prox = self.prox()
+        if midpoint is None:
+            midpoint = self.gridmap.midpoint(start, goal)
+        (midx, midy) = midpoint
+
+        start_i = sx * ymax + sy
+        goal_i = gx * ymax + gy
+        g_cost[start_i] = 0
+        parent[start_i] = -1
+        seen[start_i] = search
+        open_heap = [(hypot(sx - gx, sy - gy), start_i)]
+        expanded = 0
+
+        while open_heap:
+            (f, i) = heappop(open_heap)
+            if closed[i] == search:
+                continue
+            if i == goal_i:
+                return self.reconstruct(i, ymax)
+            closed[i] = search
+            expanded += 1
+            if deadline is not None and not expanded % DEADLINE_CHECK and \
+                    time() > deadline:
+                return None
+            (x, y) = divmod(i, ymax)
+            pred = parent[i]
+            if pred >= 0:
+                (px, py) = divmod(pred, ymax)
+            g = g_cost[i]
+            for (nx, ny) in ((x, y-1), (x-1, y), (x, y+1), (x+1, y)):
+                if not (0 <= nx < xmax and 0 <= ny < ymax):
+                    continue
+                n = nx * ymax + ny
+                if closed[n] == search:
+                    continue
+                if corridor is not None and not corridor[n]:
+                    continue
+                cost = g + 1 + prox[n]
+                if pred >= 0 and nx != px and ny != py:
+                    cost += PATH_COST_ZIG
+                if nx == midx or ny == midy:
+                    cost -= PATH_COST_MID
+                if seen[n] != search or cost < g_cost[n]:
+                    seen[n] = search
+                    g_cost[n] = cost
+                    parent[n] = i
+                    heappush(open_heap, (cost + hypot(nx - gx, ny - gy), n))
+        return []
+
+    def reconstruct(self, i, ymax):
+        """ Follow the parents back from square i to the start. """
+        path = []
+        parent = self.parent
+        while i >= 0:
+            path.append(divmod(i, ymax))
+            i = parent[i]
+        path.reverse()
+        return path
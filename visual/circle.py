@@ -25,7 +25,7 @@ import pyglet
 # local modules
 from shared import config
 from shared import debug
-import curves
+import tessellate
 
 # local classes
 
@@ -40,6 +40,8 @@ GRAPHOPTS = {'screen': 1, 'osc': 2, 'etherdream':3}
 
 OSCPATH = config.oscpath
 
+MOVE_EPSILON = 0.001    # (m) moves smaller than this don't redo the geometry
+
 # init debugging
 dbug = debug.Debug()
 
@@ -58,6 +60,17 @@ class Circle(object):
             m_arcindex: the index to connect the above arcpoints
             m_points: a list of points that make up the circle
             m_index: the index to connect the above points
+            m_controls: the control points of every arc, (arcs x 4 x 2)
+            m_dirty: whether the geometry needs redoing before we draw
+            m_screen: cached (npoints, index, scaled points) of each arc, to
+                draw on screen
+            m_scale_version: the field's scaling m_screen was made with
+            m_laser: cached cubic messages for the laser
+
+        We only redo the geometry when the center, radius or solidity
+        change (by more than MOVE_EPSILON), and only rescale it for the
+        screen when that or the field's scaling changes. Otherwise draw()
+        sends what it sent last time.
 
         """
 
@@ -76,17 +89,26 @@ class Circle(object):
         # TODO: possibly these could be melded into single dim lists
         self.m_points = []
         self.m_index = []
+        self.m_controls = None
+        self.m_dirty = True
+        self.m_screen = None
+        self.m_scale_version = None
+        self.m_laser = []
 
     def update(self, field, p, r, color=None, solid=None, visible=None):
-        """Circle constructor."""
-
-        self.m_field = field
-        self.m_center = p
-        self.m_radius = r
+        """Update circle information, noting if the geometry changed."""
+
+        if field is not self.m_field or moved(self.m_center, p) or \
+                self.m_radius is None or abs(r - self.m_radius) > MOVE_EPSILON:
+            self.m_field = field
+            self.m_center = p
+            self.m_radius = r
+            self.m_dirty = True
         if color is not None:
             self.m_color = color
-        if solid is not None:
+        if solid is not None and solid != self.m_solid:
             self.m_solid = solid
+            self.m_dirty = True
         if visible is not None:
             self.m_visible = visible
 
@@ -100,8 +122,12 @@ class Circle(object):
                            (x-r,y-kr), (x-kr,y-r), (x,y-r),
                             (x+kr,y-r), (x+r,y-kr)]
         self.m_arcindex = [(0, 1, 2, 3), (3, 4, 5, 6), (6, 7, 8, 9), (9, 10, 11, 0)]
+        self.m_controls = tessellate.arcs(self.m_arcpoints, self.m_arcindex)
+        self.m_laser = self.m_controls.reshape(-1, 8).tolist()
         self.m_points = []
         self.m_index = []
+        self.m_screen = None
+        self.m_dirty = False
 
     # Render functions moved into draw routine for simplicity
     #def render(self):
@@ -138,48 +164,25 @@ class Circle(object):
         The screen engine wants these arcs divded up into line segments
         The laser engine wants these arcs divied up into OSC messages
         """
-        if self.m_center and self.m_radius:
+        if self.m_dirty and self.m_center and self.m_radius:
             self.render()
         if self.m_field and self.m_arcpoints and self.m_arcindex and self.m_color:
             if GRAPHMODES & GRAPHOPTS['screen']:
-                # The screen engine, pyglet, wants output in this form
-                #   a list of points
-                #       points = [(10.0,10.0), (20.0,0), (-10.0,10.0), etc]
-                #   an index into points describing contiguous line segments
-                #       index = [(1,2), (2, 3), (3,4), etc]
-                # for each arc in the circle, convert to line segments
-                for i in range(len(self.m_arcindex)):
-                    # e.g., self.m_arcindex[i] = (0,1,2)
-                    p0 = self.m_arcpoints[self.m_arcindex[i][0]]
-                    p1 = self.m_arcpoints[self.m_arcindex[i][1]]
-                    p2 = self.m_arcpoints[self.m_arcindex[i][2]]
-                    p3 = self.m_arcpoints[self.m_arcindex[i][3]]
-                    (points,index) = curves.cubic_spline(p0,p1,p2,p3,CURVE_SEGS)
-                    if self.m_solid:
-                        points.append(self.m_center)
-                        nxlast_pt = len(points)-2
-                        last_pt = len(points)-1
-                        xtra_index = [nxlast_pt,last_pt,last_pt,0]
-                        index = index + xtra_index
-                    self.m_points.append(points)
-                    self.m_index.append(index)
+                if self.m_screen is None or \
+                        self.m_scale_version != self.m_field.m_scale_version:
+                    self.render_screen()
                 # now, for each segment, output a line to pyglet
-                for i in range(len(self.m_index)):
-                    points = self.m_points[i]
-                    if dbug.LEV & dbug.GRAPH: print "Circle:draw:Points =",points
-                    scaled_pts = self.m_field.rescale_pt2screen(points)
-                    if dbug.LEV & dbug.GRAPH: print "Circle:draw:screen:scaled_pts =",scaled_pts
-                    index = self.m_index[i]
-                    pyglet.gl.glColor3f(self.m_color[0],self.m_color[1],self.m_color[2])
+                pyglet.gl.glColor3f(self.m_color[0],self.m_color[1],self.m_color[2])
+                for (nverts, index, verts) in self.m_screen:
                     if not self.m_solid:
-                        pyglet.graphics.draw_indexed(len(scaled_pts), pyglet.gl.GL_LINES,
+                        pyglet.graphics.draw_indexed(nverts, pyglet.gl.GL_LINES,
                             index,
-                            ('v2i',tuple(chain(*scaled_pts))),
+                            ('v2i',verts),
                         )
                     else:
-                        pyglet.graphics.draw_indexed(len(scaled_pts), pyglet.gl.GL_POLYGON,
+                        pyglet.graphics.draw_indexed(nverts, pyglet.gl.GL_POLYGON,
                             index,
-                            ('v2i',tuple(chain(*scaled_pts))),
+                            ('v2i',verts),
                         )
             if GRAPHMODES & GRAPHOPTS['osc']:
                 # the laser engine wants output of this form:
@@ -193,18 +196,45 @@ class Circle(object):
                        [self.m_color[0],self.m_color[1],self.m_color[2]]
                 self.m_field.m_osc.send_laser(OSCPATH['graph_color'], 
                             [self.m_color[0],self.m_color[1],self.m_color[2]])
-                for i in range(len(self.m_arcindex)):
-                    # e.g., self.m_arcindex[i] = (0,1,2)
-                    p0 = self.m_arcpoints[self.m_arcindex[i][0]]
-                    p1 = self.m_arcpoints[self.m_arcindex[i][1]]
-                    p2 = self.m_arcpoints[self.m_arcindex[i][2]]
-                    p3 = self.m_arcpoints[self.m_arcindex[i][3]]
+                for arc in self.m_laser:
+                    # e.g., arc = [p0[0], p0[1], p1[0], p1[1], ... p3[1]]
                     if dbug.LEV & dbug.GRAPH: 
-                        print "Circle:OSC to laser:", OSCPATH['graph_cubic'], \
-                                [p0[0], p0[1], p1[0], p1[1],
-                                 p2[0], p2[1], p3[0], p3[1]]
-                    self.m_field.m_osc.send_laser(OSCPATH['graph_cubic'], 
-                                    [p0[0], p0[1], p1[0], p1[1], 
-                                     p2[0], p2[1], p3[0], p3[1]])
+                        print "Circle:OSC to laser:", OSCPATH['graph_cubic'], arc
+                    self.m_field.m_osc.send_laser(OSCPATH['graph_cubic'], arc)
 
+    def render_screen(self):
+        """Break the arcs into line segments and scale them for the screen.
 
+        The screen engine, pyglet, wants output in this form
+          a list of points
+              points = [(10.0,10.0), (20.0,0), (-10.0,10.0), etc]
+          an index into points describing contiguous line segments
+              index = [(1,2), (2, 3), (3,4), etc]
+        """
+        if not self.m_points:
+            # for each arc in the circle, convert to line segments
+            for points in tessellate.tessellate(self.m_controls, CURVE_SEGS):
+                index = tessellate.index(CURVE_SEGS)
+                if self.m_solid:
+                    points.append(self.m_center)
+                    nxlast_pt = len(points)-2
+                    last_pt = len(points)-1
+                    xtra_index = [nxlast_pt,last_pt,last_pt,0]
+                    index = index + xtra_index
+                self.m_points.append(points)
+                self.m_index.append(index)
+        self.m_screen = []
+        for i in range(len(self.m_index)):
+            points = self.m_points[i]
+            if dbug.LEV & dbug.GRAPH: print "Circle:draw:Points =",points
+            scaled_pts = self.m_field.rescale_pt2screen(points)
+            if dbug.LEV & dbug.GRAPH: print "Circle:draw:screen:scaled_pts =",scaled_pts
+            self.m_screen.append((len(scaled_pts), self.m_index[i],
+                                  tuple(chain(*scaled_pts))))
+        self.m_scale_version = self.m_field.m_scale_version
+
+
+def moved(p0, p1):
+    """Has point p0 moved to p1, by more than MOVE_EPSILON either way?"""
+    return p0 is None or abs(p0[0] - p1[0]) > MOVE_EPSILON or \
+           abs(p0[1] - p1[1]) > MOVE_EPSILON
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Clipping line segments against circles, many at a time.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+__appname__ = "clip.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# core modules
+
+# installed modules
+import numpy
+
+# local modules
+
+# local classes
+
+# constants
+
+
+def inside(points, center, radius):
+    """ Which of points (n x 2) are inside the circle. """
+    offset = points - center
+    return (offset * offset).sum(1) < radius * radius
+
+
+def exits(inpts, outpts, center, radius):
+    """ Where the segments from inpts to outpts (both n x 2) leave the circle.
+
+    Solves |inpt + t*(outpt - inpt) - center| = radius for t. inpt is inside,
+    so there's one root in [0, 1], the larger one. If inpt isn't inside after
+    all, we still return the nearest we can do (clamped to the segment).
+    """
+    d = outpts - inpts
+    f = inpts - center
+    a = (d * d).sum(1)
+    b = (f * d).sum(1)
+    c = (f * f).sum(1) - radius * radius
+    root = numpy.sqrt(numpy.maximum(b * b - a * c, 0))
+    # a segment of no length doesn't go anywhere
+    t = numpy.where(a > 0, (-b + root) / numpy.where(a > 0, a, 1), 0)
+    t = numpy.clip(t, 0, 1)
+    return inpts + d * t[:, None]
+
+
+def trim(ends0, ends1, p0, r0, p1, r1):
+    """ Trim segments (from ends0 to ends1, both n x 2, running from the
+    circle at p0 towards the one at p1) where they go inside the circles.
+
+    The near end is moved out to the edge of p0's circle (radius r0) if it's
+    inside it, and the far end to the edge of p1's (radius r1). Returns
+    (ends0, ends1, keep): the trimmed ends, and which segments are worth
+    keeping. Segments entirely inside one circle aren't, and are returned
+    as they were.
+
+    The circles can be the same for all the segments, or given for each
+    (p0 and p1 n x 2, r0 and r1 n long).
+    """
+    n = len(ends0)
+    p0 = numpy.broadcast_to(p0, (n, 2))
+    p1 = numpy.broadcast_to(p1, (n, 2))
+    r0 = numpy.broadcast_to(r0, (n,))
+    r1 = numpy.broadcast_to(r1, (n,))
+    in0 = inside(ends0, p0, r0)
+    in1 = inside(ends1, p1, r1)
+    keep = ~((in0 & inside(ends1, p0, r0)) | (in1 & inside(ends0, p1, r1)))
+    new0 = ends0.copy()
+    new1 = ends1.copy()
+    m = keep & in0
+    if m.any():
+        new0[m] = exits(ends0[m], ends1[m], p0[m], r0[m])
+    m = keep & in1
+    if m.any():
+        new1[m] = exits(ends1[m], ends0[m], p1[m], r1[m])
+    return (new0, new1, keep)
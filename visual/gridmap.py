@@ -42,6 +42,9 @@ DRAW_PATH_BLOCK = '0'
 
 MAX_CIRCLE_RADIUS = 20
 
+# the costs are small whole numbers, so we keep the map compact
+MAP_DTYPE = numpy.uint8
+
 
 # init debugging
 dbug = debug.Debug()
@@ -57,18 +60,61 @@ class GridMap(object):
         self.max_r = 0
         self.opencircle = []
         self.solidcircle = []
+        # stamps of proximity costs, indexed by (r, f), made as needed
+        self.stamps = {}
+        # goes up every time the map changes, so others can tell
+        self.version = 0
+        # goes up only when the cells change, not the paths laid over them
+        self.cell_version = 0
+        # what changed after version dirty_since, as (version, cells, x0, x1,
+        # y0, y1) in the order it happened (cells is whether it was a cell),
+        # so others can catch up on just those squares
+        self.dirty_since = 0
+        self.dirty = []
+        # how much of dirty is just the last reset clearing things
+        self.cleared = 0
         self.xmax = xmax
         self.ymax = ymax
 
         #self.map = [[0] * self.ymax+1 for i in range(self.xmax+1)]
-        self.map = numpy.zeros((self.xmax+1,self.ymax+1))
+        self.map = numpy.zeros((self.xmax+1,self.ymax+1), dtype=MAP_DTYPE)
         #self.blocked = defaultdict(lambda: False)
         self.gen_circles(MAX_CIRCLE_RADIUS)
 
     def reset_grid(self):
         """ Resets the grid between frames. """
         #self.map = [[0] * self.ymax for i in range(self.xmax)]
-        self.map = numpy.zeros((self.xmax,self.ymax))
+        self.map = numpy.zeros((self.xmax,self.ymax), dtype=MAP_DTYPE)
+        # only what was laid down since the last reset is any different
+        cleared = set(change[1:] for change in self.dirty[self.cleared:])
+        self.dirty_since = self.version
+        self.version += 1
+        self.dirty = [(self.version,) + change for change in cleared]
+        self.cleared = len(self.dirty)
+        if any(change[0] for change in cleared):
+            self.cell_version += 1
+
+    def set_map(self, area):
+        """ Replace the whole map (and its size) with area. """
+        (self.xmax, self.ymax) = area.shape
+        self.map = area
+        self.version += 1
+        self.cell_version += 1
+        # we can't say what changed, so everyone has to start over
+        self.dirty_since = self.version
+        self.dirty = []
+        self.cleared = 0
+
+    def changes(self, since):
+        """ Return what's changed after version since, as in dirty, or
+            None if it was too long ago to say (so look at everything). """
+        if since is None or since < self.dirty_since:
+            return None
+        dirty = self.dirty
+        i = len(dirty)
+        while i and dirty[i-1][0] > since:
+            i -= 1
+        return dirty[i:]
 
     def gen_circles (self, max_r):
         """ Pre-generate circles to some maximum radius. """
@@ -90,6 +136,29 @@ class GridMap(object):
                 newlist = [x for x in newlist if x not in self.solidcircle[k_r - 1]]
             self.opencircle.append(newlist)
 
+    def stamp(self, r, f):
+        """Return the proximity costs around a circle as a square array.
+
+        The array is 2*(r+f)+1 on a side, centered on the circle, with the
+        cost of each layer laid down in the same order set_blocked always
+        has (so where layers overlap, the outer one wins). Squares we don't
+        touch are 0.
+        """
+        key = (r, f)
+        if key not in self.stamps:
+            size = r + f
+            stamp = numpy.zeros((2*size+1, 2*size+1), dtype=MAP_DTYPE)
+            for i in range(f + 1):
+                if i == 0:
+                    circle = self.solidcircle[r]
+                else:
+                    circle = self.opencircle[r+i]
+                if circle:
+                    offsets = numpy.array(circle) + size
+                    stamp[offsets[:, 0], offsets[:, 1]] = PATH_COST_PROX[i]
+            self.stamps[key] = stamp
+        return self.stamps[key]
+
     def set_blocked(self, p, r, f):
         """Set the blocked state of a coordinate. 
 
@@ -105,33 +174,54 @@ class GridMap(object):
         if r + f > n:
             f = int(max(0, n - r))
 
+        stamp = self.stamp(r, f)
+        size = r + f
         (cx,cy) = p
-        for i in range(f + 1):
-            if i == 0:
-                for j in range(len(self.solidcircle[r])):
-                    (relx,rely) = self.solidcircle[r][j]
-                    x = cx + relx
-                    y = cy + rely
-                    if 0 <= x < self.xmax and \
-                       0 <= y < self.ymax:
-                        self.map[x][y] = PATH_COST_PROX[i]
-            else:
-                for j in range(len(self.opencircle[r+i])):
-                    (relx,rely) = self.opencircle[r+i][j]
-                    x = cx + relx
-                    y = cy + rely
-                    if 0 <= x < self.xmax and \
-                       0 <= y < self.ymax:
-                        self.map[x][y] = PATH_COST_PROX[i]
+        # clip the stamp to the map
+        x0 = max(0, cx - size)
+        x1 = min(self.xmax, cx + size + 1)
+        y0 = max(0, cy - size)
+        y1 = min(self.ymax, cy + size + 1)
+        if x0 >= x1 or y0 >= y1:
+            return
+        self.version += 1
+        self.cell_version += 1
+        self.dirty.append((self.version, True, x0, x1, y0, y1))
+        stamp = stamp[x0 - (cx - size):x1 - (cx - size),
+                      y0 - (cy - size):y1 - (cy - size)]
+        area = self.map[x0:x1, y0:y1]
+        touched = stamp > 0
+        area[touched] = stamp[touched]
 
     def set_block_line(self, pathlist):
         """Sets the blocked state of an entire path."""
-        for p in pathlist:
-            (x,y) = p
-            if 0 <= x < self.xmax and \
-               0 <= y < self.ymax:
-                if not self.map[x][y]:
-                    self.map[x][y] = PATH_COST_LINE
+        if not pathlist:
+            return
+        points = numpy.array(pathlist, dtype=int)
+        xs = points[:, 0]
+        ys = points[:, 1]
+        inside = (0 <= xs) & (xs < self.xmax) & (0 <= ys) & (ys < self.ymax)
+        xs = xs[inside]
+        ys = ys[inside]
+        free = self.map[xs, ys] == 0
+        xs = xs[free]
+        ys = ys[free]
+        self.map[xs, ys] = PATH_COST_LINE
+        self.version += 1
+        version = self.version
+        self.dirty.extend([(version, False, x, x + 1, y, y + 1)
+                           for (x, y) in zip(xs.tolist(), ys.tolist())])
+
+    def path_costs(self, pathlist):
+        """Return the costs of the squares along a path (as a string, so
+        it's cheap to compare)."""
+        if not pathlist:
+            return ''
+        points = numpy.array(pathlist, dtype=int)
+        xs = points[:, 0]
+        ys = points[:, 1]
+        inside = (0 <= xs) & (xs < self.xmax) & (0 <= ys) & (ys < self.ymax)
+        return self.map[xs[inside], ys[inside]].tostring()
 
     def midpoint(self, p1, p2):
         return ((p1[0]+p2[0])/2, (p1[1]+p2[1])/2)
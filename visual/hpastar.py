@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Hierarchical (coarse-to-fine) pathfinding over a GridMap.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+__appname__ = "hpastar.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# core modules
+from heapq import heappush, heappop
+from math import hypot
+from time import time
+
+# installed modules
+import numpy
+
+# local modules
+
+# local classes
+from astar import AStar
+from gridmap import PATH_COST_LINE
+
+# constants
+CLUSTER_SIZE = 16       # squares on a side of each cluster
+ENTRANCE_SPACING = 8    # squares between entrances along a cluster's border
+START = -1              # abstract node ids for the ends of a search
+GOAL = -2
+
+
+def flood(prox, ymax, src, bounds):
+    """Dijkstra from square src, without leaving bounds (x0, x1, y0, y1).
+
+    A step costs 1 plus prox of the square we step into. Returns the cost
+    to each square, indexed by square.
+    """
+    (x0, x1, y0, y1) = bounds
+    dist = {src: 0}
+    done = set()
+    heap = [(0, src)]
+    while heap:
+        (d, i) = heappop(heap)
+        if i in done:
+            continue
+        done.add(i)
+        (x, y) = divmod(i, ymax)
+        for (nx, ny) in ((x, y-1), (x-1, y), (x, y+1), (x+1, y)):
+            if not (x0 <= nx < x1 and y0 <= ny < y1):
+                continue
+            n = nx * ymax + ny
+            nd = d + 1 + prox[n]
+            if n not in dist or nd < dist[n]:
+                dist[n] = nd
+                heappush(heap, (nd, n))
+    return dist
+
+
+def occupied(area):
+    """ The cells' proximity costs in area, with the paths left out. """
+    area = area.astype(int)
+    return numpy.where(area > PATH_COST_LINE, area, 0)
+
+
+class HPAStar(object):
+    """ Computes paths on a GridMap in two levels, so big grids stay quick.
+
+        The grid is cut into clusters of CLUSTER_SIZE squares on a side.
+        Along each border between two clusters there are entrances every
+        ENTRANCE_SPACING squares: a pair of squares facing each other across
+        the border. Within a cluster, we keep the cost from each of its
+        entrances to each of the others. We find a coarse path with A* over
+        the entrances, which is small, instead of over every square.
+
+        The entrance-to-entrance costs only count the proximity of cells
+        (squares that other paths have been laid over are left out). We
+        redo them only for the clusters where that has changed since last
+        time, which in a slow-moving crowd is a few clusters a frame.
+
+        Then we refine it: AStar at full resolution, with all current costs
+        and the usual zig and midpoint terms, but only through the clusters
+        along the coarse path and the ones around them. Searches that start
+        and end in the same or neighboring clusters go straight to AStar.
+
+        Has the same compute_path() as AStar, so it can stand in for it.
+
+    """
+
+    def __init__(self, gridmap):
+        self.gridmap = gridmap
+        self.astar = AStar(gridmap)
+        self.shape = None
+        # the map's version and cell_version when we last caught up
+        self.version = None
+        self.cell_version = None
+        # twice the cells' proximity cost of each square (leaving out the
+        # paths), as a flat list
+        self.occ = []
+        # bounds (x0, x1, y0, y1) of each cluster, indexed by (cx, cy)
+        self.clusters = {}
+        # entrance squares in each cluster, indexed by (cx, cy)
+        self.entrances = {}
+        # the square across the border from each entrance, indexed by square
+        self.links = {}
+        # cost from an entrance to the others in its cluster, indexed by
+        # entrance square
+        self.edges = {}
+        # occupancy of each cluster last time we costed it, indexed by (cx, cy)
+        self.signatures = {}
+        # the squares AStar may use when refining (one cluster at a time)
+        self.corridor = bytearray()
+
+    def build(self):
+        """ Lay out clusters and entrances for the grid's current size. """
+        xmax = self.gridmap.xmax
+        ymax = self.gridmap.ymax
+        self.shape = (xmax, ymax)
+        self.version = None
+        self.cell_version = None
+        self.occ = []
+        self.clusters = {}
+        self.entrances = {}
+        self.links = {}
+        self.edges = {}
+        self.signatures = {}
+        self.corridor = bytearray(xmax * ymax)
+        for x0 in range(0, xmax, CLUSTER_SIZE):
+            for y0 in range(0, ymax, CLUSTER_SIZE):
+                key = (x0 // CLUSTER_SIZE, y0 // CLUSTER_SIZE)
+                self.clusters[key] = (x0, min(x0 + CLUSTER_SIZE, xmax),
+                                      y0, min(y0 + CLUSTER_SIZE, ymax))
+                self.entrances[key] = []
+        for (cx, cy), (x0, x1, y0, y1) in self.clusters.iteritems():
+            # the border with the cluster to the right
+            if (cx + 1, cy) in self.clusters:
+                for y in self.spaced(y0, y1):
+                    self.link((cx, cy), (x1 - 1, y), (cx + 1, cy), (x1, y))
+            # the border with the cluster above
+            if (cx, cy + 1) in self.clusters:
+                for x in self.spaced(x0, x1):
+                    self.link((cx, cy), (x, y1 - 1), (cx, cy + 1), (x, y1))
+
+    def spaced(self, lo, hi):
+        """ Where to put entrances along a border running from lo to hi. """
+        count = max(1, (hi - lo) // ENTRANCE_SPACING)
+        return [lo + (2*k + 1) * (hi - lo) // (2*count) for k in range(count)]
+
+    def link(self, key0, p0, key1, p1):
+        ymax = self.gridmap.ymax
+        i0 = p0[0] * ymax + p0[1]
+        i1 = p1[0] * ymax + p1[1]
+        self.entrances[key0].append(i0)
+        self.entrances[key1].append(i1)
+        self.links[i0] = i1
+        self.links[i1] = i0
+
+    def refresh(self):
+        """ Recost the clusters whose occupancy has changed. """
+        gridmap = self.gridmap
+        if self.shape != (gridmap.xmax, gridmap.ymax):
+            self.build()
+        if self.version == gridmap.version:
+            return
+        # paths laid down so far don't count, only the cells
+        if self.cell_version == gridmap.cell_version:
+            self.version = gridmap.version
+            return
+        changes = gridmap.changes(self.version)
+        self.version = gridmap.version
+        self.cell_version = gridmap.cell_version
+        (xmax, ymax) = self.shape
+        if changes is None:
+            self.occ = (occupied(gridmap.map[:xmax, :ymax]).ravel()
+                        * 2).tolist()
+            keys = self.clusters.keys()
+        else:
+            keys = set()
+            for (version, cells, x0, x1, y0, y1) in changes:
+                if not cells:
+                    continue
+                rows = (occupied(gridmap.map[x0:x1, y0:y1]) * 2).tolist()
+                for (x, row) in enumerate(rows, x0):
+                    self.occ[x*ymax + y0:x*ymax + y1] = row
+                for cx in range(x0 // CLUSTER_SIZE,
+                                (x1 - 1) // CLUSTER_SIZE + 1):
+                    for cy in range(y0 // CLUSTER_SIZE,
+                                    (y1 - 1) // CLUSTER_SIZE + 1):
+                        keys.add((cx, cy))
+        for key in keys:
+            (x0, x1, y0, y1) = self.clusters[key]
+            signature = occupied(gridmap.map[x0:x1, y0:y1]).tostring()
+            if self.signatures.get(key) == signature:
+                continue
+            self.signatures[key] = signature
+            self.cost_cluster(key, self.occ)
+
+    def cost_cluster(self, key, occ):
+        bounds = self.clusters[key]
+        ymax = self.shape[1]
+        entrances = self.entrances[key]
+        for i in entrances:
+            dist = flood(occ, ymax, i, bounds)
+            self.edges[i] = [(j, dist[j]) for j in entrances if j != i]
+
+    def cluster_of(self, p):
+        return (p[0] // CLUSTER_SIZE, p[1] // CLUSTER_SIZE)
+
+    def compute_path(self, start, goal, deadline=None):
+        """ Compute the path between the 'start' point and the
+            'goal' point.
+
+            The path is returned as a list of the points, including the
+            start and goal points themselves.
+
+            If no path was found, an empty list is returned. If we're still
+            looking at time() 'deadline', we give up and return None.
+        """
+        xmax = self.gridmap.xmax
+        ymax = self.gridmap.ymax
+        (sx, sy) = start
+        (gx, gy) = goal
+        if not (0 <= sx < xmax and 0 <= sy < ymax and
+                0 <= gx < xmax and 0 <= gy < ymax):
+            return []
+        skey = self.cluster_of(start)
+        gkey = self.cluster_of(goal)
+        if abs(skey[0] - gkey[0]) <= 1 and abs(skey[1] - gkey[1]) <= 1:
+            return self.astar.compute_path(start, goal, deadline)
+        self.refresh()
+        prox = self.astar.prox()
+
+        # cost from the ends to their clusters' entrances
+        sdist = flood(prox, ymax, sx * ymax + sy, self.clusters[skey])
+        gdist = flood(prox, ymax, gx * ymax + gy, self.clusters[gkey])
+        goal_entrances = set(self.entrances[gkey])
+
+        # A* over the entrances
+        g_cost = {START: 0}
+        parent = {START: None}
+        closed = set()
+        heap = [(hypot(sx - gx, sy - gy), START)]
+        while heap:
+            if deadline is not None and time() > deadline:
+                return None
+            (f, node) = heappop(heap)
+            if node in closed:
+                continue
+            if node == GOAL:
+                return self.refine(start, goal, parent, deadline)
+            closed.add(node)
+            g = g_cost[node]
+            if node == START:
+                steps = [(j, sdist[j]) for j in self.entrances[skey]]
+            else:
+                steps = list(self.edges[node])
+                across = self.links[node]
+                steps.append((across, 1 + prox[across]))
+                if node in goal_entrances:
+                    steps.append((GOAL, gdist[node]))
+            for (n, cost) in steps:
+                if n in closed:
+                    continue
+                cost += g
+                if n not in g_cost or cost < g_cost[n]:
+                    g_cost[n] = cost
+                    parent[n] = node
+                    if n == GOAL:
+                        heappush(heap, (cost, n))
+                    else:
+                        (nx, ny) = divmod(n, ymax)
+                        heappush(heap, (cost + hypot(nx - gx, ny - gy), n))
+        return []
+
+    def refine(self, start, goal, parent, deadline):
+        """ Fill in the coarse path at full resolution, one cluster at a
+            time: from the start to the first entrance, across each cluster
+            between entrances, and from the last entrance to the goal. """
+        (xmax, ymax) = self.shape
+        points = [goal]
+        node = parent[GOAL]
+        while node != START:
+            points.append(divmod(node, ymax))
+            node = parent[node]
+        points.append(start)
+        points.reverse()
+        midpoint = self.gridmap.midpoint(start, goal)
+        path = [start]
+        for (p0, p1) in zip(points, points[1:]):
+            if p0 == p1:
+                continue
+            if abs(p0[0] - p1[0]) + abs(p0[1] - p1[1]) == 1:
+                # across a border
+                path.append(p1)
+                continue
+            (x0, x1, y0, y1) = self.clusters[self.cluster_of(p0)]
+            self.fill(x0, x1, y0, y1, 1)
+            leg = self.astar.compute_path(p0, p1, deadline, self.corridor,
+                                          midpoint)
+            self.fill(x0, x1, y0, y1, 0)
+            if leg is None:
+                return None
+            path.extend(leg[1:])
+        return path
+
+    def fill(self, x0, x1, y0, y1, value):
+        """ Set a block of the corridor. """
+        ymax = self.shape[1]
+        run = bytearray([value]) * (y1 - y0)
+        for x in range(x0, x1):
+            self.corridor[x*ymax + y0:x*ymax + y1] = run
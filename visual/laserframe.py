@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Collecting a frame's laser messages into a few OSC bundles.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+__appname__ = "laserframe.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# core modules
+
+# installed modules
+# noinspection PyUnresolvedReferences
+from OSC import OSCMessage, OSCBundle
+
+# local modules
+
+# local classes
+
+# constants
+FRAME_PATH = "/laser/frame"     # header: [frame, bundles, messages, dropped]
+LASER_MTU = 1472        # (bytes) most in one UDP packet on ethernet
+LASER_MAX_PRIMITIVES = 400      # most primitives (cubics) in a frame
+BUNDLE_HEAD = 16        # "#bundle\0" and the timetag
+ELEMENT_HEAD = 4        # size of each message in a bundle
+
+
+class LaserFrame(object):
+    """ Collects the laser messages of a frame and packs them into bundles.
+
+        Instead of a UDP packet per message, the whole frame goes out as a
+        few bundles, each small enough for one packet. The first message of
+        the first bundle is a frame header:
+
+            /laser/frame [frame, bundles, messages, dropped]
+
+        so the laser server knows how many bundles make up the frame, and
+        can wait for them all before drawing it (it still gets graph_update
+        last). Past max primitives in a frame, we drop the rest (but not
+        the color and begin/end messages around them) and say how many in
+        the header.
+
+        Stores the following values:
+            m_frame: the frame we're collecting (None if we aren't)
+            m_messages: the frame's OSCMessages so far, in order
+            m_sizes: the encoded size of each message
+            m_primitives: how many primitives we've taken this frame
+            m_dropped: how many we've dropped this frame
+            m_max: most primitives in a frame
+            m_mtu: most bytes in a bundle
+
+    """
+
+    def __init__(self, max_primitives=LASER_MAX_PRIMITIVES, mtu=LASER_MTU):
+        self.m_frame = None
+        self.m_messages = []
+        self.m_sizes = []
+        self.m_primitives = 0
+        self.m_dropped = 0
+        self.m_max = max_primitives
+        self.m_mtu = mtu
+
+    def is_open(self):
+        return self.m_frame is not None
+
+    def begin(self, frame):
+        """ Start collecting a frame, forgetting anything uncompiled. """
+        self.m_frame = frame
+        self.m_messages = []
+        self.m_sizes = []
+        self.m_primitives = 0
+        self.m_dropped = 0
+
+    def add(self, path, args, primitive=False):
+        """ Add a message to the frame. Returns False if it was a primitive
+        we had no room for. """
+        if primitive:
+            if self.m_primitives >= self.m_max:
+                self.m_dropped += 1
+                return False
+            self.m_primitives += 1
+        msg = OSCMessage(path, args)
+        self.m_messages.append(msg)
+        self.m_sizes.append(len(msg.getBinary()))
+        return True
+
+    def compile(self):
+        """ Pack the frame into bundles, header first, and close it.
+
+        Returns the list of OSCBundles to send, in order.
+        """
+        # the header's args are all ints, so it's the same size whatever
+        # the numbers turn out to be
+        header_size = len(OSCMessage(FRAME_PATH, [0, 0, 0, 0]).getBinary())
+        room = self.m_mtu - BUNDLE_HEAD
+        packs = []
+        pack = []
+        used = ELEMENT_HEAD + header_size
+        for (msg, size) in zip(self.m_messages, self.m_sizes):
+            size += ELEMENT_HEAD
+            if pack and used + size > room:
+                packs.append(pack)
+                pack = []
+                used = 0
+            pack.append(msg)
+            used += size
+        packs.append(pack)
+        header = OSCMessage(FRAME_PATH, [self.m_frame, len(packs),
+                                         len(self.m_messages), self.m_dropped])
+        packs[0].insert(0, header)
+        bundles = []
+        for pack in packs:
+            bundle = OSCBundle()
+            for msg in pack:
+                bundle.append(msg)
+            bundles.append(bundle)
+        self.m_frame = None
+        self.m_messages = []
+        self.m_sizes = []
+        return bundles
@@ -18,15 +18,17 @@ __license__ = "GNU GPL 3.0 or later"
 
 # core modules
 from itertools import chain
-from math import sqrt
 
 # installed modules
+import numpy
 import pyglet
 
 # local modules
 from shared import config
 from shared import debug
-import curves
+import clip
+import tessellate
+from circle import moved, MOVE_EPSILON
 
 # local classes
 
@@ -59,6 +61,16 @@ class Line(object):
             m_arcindex: the index to connect the above arcpoints
             m_points: a list of points that make up the circle
             m_index: the index to connect the above points
+            m_controls: the control points of every arc, (arcs x 4 x 2)
+            m_dirty: whether the geometry needs redoing before we draw
+            m_screen: cached (npoints, index, scaled points) of each arc, to
+                draw on screen
+            m_scale_version: the field's scaling m_screen was made with
+            m_laser: cached cubic messages for the laser
+
+        As with Circle, we only redo the geometry (and trim the ends, which
+        is slow) when the ends, radii or path change by more than
+        MOVE_EPSILON.
 
         """
 
@@ -70,6 +82,7 @@ class Line(object):
         self.m_r0 = None
         self.m_r1 = None
         self.m_color = None
+        self.m_path = None
         self.m_arcpoints = None
         self.m_arcindex = None
         # each arc is broken down into a list of points and indecies
@@ -77,20 +90,41 @@ class Line(object):
         # TODO: possibly these could be melded into single dim lists
         self.m_points = []
         self.m_index = []
+        self.m_controls = None
+        self.m_dirty = True
+        self.m_screen = None
+        self.m_scale_version = None
+        self.m_laser = []
 
     def update(self, field, p0, p1, r0, r1, color, path=None):
-        """Update line information."""
-        self.m_field = field
-        self.m_p0 = p0
-        self.m_p1 = p1
-        self.m_r0 = r0
-        self.m_r1 = r1
-        self.m_color = color
+        """Update line information, noting if the geometry changed."""
         # if we were given a path, we will use it
         if path is None:
-            self.m_path = [p0, p1]
-        else:
+            path = [p0, p1]
+        if field is not self.m_field or \
+                moved(self.m_p0, p0) or moved(self.m_p1, p1) or \
+                self.m_r0 is None or abs(r0 - self.m_r0) > MOVE_EPSILON or \
+                self.m_r1 is None or abs(r1 - self.m_r1) > MOVE_EPSILON or \
+                self.path_moved(path):
+            self.m_field = field
+            self.m_p0 = p0
+            self.m_p1 = p1
+            self.m_r0 = r0
+            self.m_r1 = r1
             self.m_path = path
+            self.m_dirty = True
+        self.m_color = color
+
+    def path_moved(self, path):
+        """Is path different from the one we have (beyond MOVE_EPSILON)?"""
+        if path is self.m_path:
+            return False
+        if self.m_path is None or len(path) != len(self.m_path):
+            return True
+        for (p0, p1) in zip(self.m_path, path):
+            if moved(p0, p1):
+                return True
+        return False
 
     def fracpoint(self, p1, p2, fract):
         return (p1[0]+(p2[0]-p1[0])*fract, p1[1]+(p2[1]-p1[1])*fract)
@@ -103,55 +137,52 @@ class Line(object):
          m2 = self.fracpoint(p1, p2, 0.666)
          return (p1, m1, m2, p2)
 
-    def in_circle(self, p, center, radius):
-        """Is point, p, inside circle of given center and radius."""
-        square_dist = (center[0] - p[0]) ** 2 + (center[1] - p[1]) ** 2
-        return square_dist < radius ** 2
-
-    def find_intersect(self, inpt, outpt, center, radius):
-        # Here instead of checking whether the point is on the circle,
-        # we just see if the points have converged on each other.
-        # 1. test to end recursion
-        dist = sqrt((inpt[0] - outpt[0])**2 + (inpt[1] - outpt[1])**2)
-        #print "KILLME: dist",dist
-        if dist < .05:
-            return inpt
-        # 2. divide the segment in half
-        midpt = self.midpoint(outpt, inpt)
-        # 3. recurse with segment that stradles the circle boundary
-        if self.in_circle(midpt, center, radius):
-            return self.find_intersect(midpt, outpt, center, radius)
+    def trim_ends(self, ends0, ends1, p0, p1, r0, r1):
+        """Remove parts of segments within the radius of the cells.
+
+        Takes and returns lists of the segments' ends, and which segments
+        aren't entirely inside a cell (see clip.trim)."""
+        if not len(ends0):
+            return ([], [], [])
+        (ends0, ends1, keep) = clip.trim(numpy.array(ends0, dtype=float),
+                                         numpy.array(ends1, dtype=float),
+                                         p0, r0, p1, r1)
+        return (map(tuple, ends0.tolist()), map(tuple, ends1.tolist()),
+                keep.tolist())
+
+    def curve_arc(self):
+        """The arc of the 'curves' mode, before it's trimmed."""
+        p0 = self.m_p0
+        p1 = self.m_p1
+        (x0,y0)=p0
+        (x1,y1)=p1
+        # get position of p1 relative to p0
+        xdif = abs(x0 - x1)
+        ydif = abs(y0 - y1)
+        if not xdif or not ydif:
+            #print "straight x line: p0:",start,"p1:",goal,"xdif:",xdif,"ydif:",ydif
+            midpt = self.midpoint(p0,p1)
+            return [p0, midpt, midpt, p1]
+        elif (xdif > ydif):
+            xmid = (x0 + x1)/2
+            #print "longer on x: p0:",start,"p1:",goal,"xdif:",xdif,"ydif:",ydif,"xmidpt:",xmid
+            return [p0, (xmid,y0), (xmid,y1), p1]
         else:
-            return self.find_intersect(inpt, midpt, center, radius)
-
-    def trim_ends(self, end0, end1, p0, p1, r0, r1):
-        # Remove parts of path within the radius of cell
-        # TODO: Ensure that the logic here works in every case
-        # if both ends of this line segment are inside a circle fugetaboutit
-        #print "KILLME:start:",end0,end1,
-        if (self.in_circle(end0, p0, r0) and self.in_circle(end1, p0, r0)) or\
-            (self.in_circle(end0, p1, r1) and self.in_circle(end1, p1, r1)):
-            return (end0, end1)
-        # if near end of this line segment is inside first circle
-        if self.in_circle(end0, p0, r0):
-            # find the point intersecting circle
-            end0 = self.find_intersect(end0, end1, p0, r0)
-        # if far end of this line segment is inside first circle
-        if self.in_circle(end1, p0, r0):
-            # find the point intersecting the circle
-            end0 = self.find_intersect(end1, end0, p0, r0)
-        # if near end of this line segment is inside second circle
-        elif self.in_circle(end0, p1, r1):
-            # find the point intersecting the circle
-            end1 = self.find_intersect(end0, end1, p1, r1)
-        # if near end of this line segment is inside second circle
-        elif self.in_circle(end1, p1, r1):
-            # find the point intersecting the circle
-            end1 = self.find_intersect(end1, end0, p1, r1)
-        #print "end:",end0,end1
-        return (end0, end1)
-
-    def render(self):
+            ymid = (y0 + y1)/2
+            #print "longer on y: p0:",start,"p1:",goal,"xdif:",xdif,"ydif:",ydif,"ymidpt:",ymid
+            return [p0, (x0,ymid), (x0,ymid), p1]
+
+    def segments(self):
+        """Return the segments that need trimming to the cells, as lists of
+        their near ends and far ends."""
+        if LINEMODE == 'curves':
+            arcpts = self.curve_arc()
+            return ([arcpts[0], arcpts[2]], [arcpts[1], arcpts[3]])
+        elif LINEMODE == 'pathfinding':
+            return (self.m_path[:-1], self.m_path[1:])
+        return ([], [])
+
+    def render(self, trimmed=None):
         """Render the line.
 
         Going into this function, we know the end points of the cells we are
@@ -159,7 +190,14 @@ class Line(object):
 
         Exiting, we have a list of points that make up the line, and a list of
         indecies that tell us how the points are organized into cubic arcs.
+
+        trimmed is what trim_ends() makes of our segments(), if render_all()
+        has already done it along with other lines'.
         """
+        if trimmed is None:
+            (ends0, ends1) = self.segments()
+            trimmed = self.trim_ends(ends0, ends1, self.m_p0, self.m_p1,
+                                     self.m_r0, self.m_r1)
         p0 = self.m_p0
         p1 = self.m_p1
         r0 = self.m_r0
@@ -169,6 +207,10 @@ class Line(object):
         self.m_arcindex = None
         self.m_points = []
         self.m_index = []
+        self.m_controls = None
+        self.m_laser = []
+        self.m_screen = None
+        self.m_dirty = False
         # locals
         #index = [0] + [int(x * 0.5) for x in range(2, n*2)] + [n]
         lastpt = []
@@ -184,27 +226,10 @@ class Line(object):
             self.m_arcindex = [(0, 1, 2, 3)]
 
         elif LINEMODE == 'curves':
-            (x0,y0)=p0
-            (x1,y1)=p1
-            # get position of p1 relative to p0
-            xdif = abs(x0 - x1)
-            ydif = abs(y0 - y1)
-            if not xdif or not ydif:
-                #print "straight x line: p0:",start,"p1:",goal,"xdif:",xdif,"ydif:",ydif
-                midpt = self.midpoint(p0,p1)
-                arcpts = [p0, midpt, midpt, p1]
-            elif (xdif > ydif):
-                xmid = (x0 + x1)/2
-                #print "longer on x: p0:",start,"p1:",goal,"xdif:",xdif,"ydif:",ydif,"xmidpt:",xmid
-                arcpts = [p0, (xmid,y0), (xmid,y1), p1]
-            else:
-                ymid = (y0 + y1)/2
-                #print "longer on y: p0:",start,"p1:",goal,"xdif:",xdif,"ydif:",ydif,"ymidpt:",ymid
-                arcpts = [p0, (x0,ymid), (x0,ymid), p1]
-            (arcpts[0],arcpts[1]) = self.trim_ends(arcpts[0],arcpts[1], p0, p1, r0, r1)
-            (arcpts[2],arcpts[3]) = self.trim_ends(arcpts[2],arcpts[3], p0, p1, r0, r1)
-            self.m_arcpoints = arcpts
-            #print "KILLME:",arcpts
+            # trimmed (both arcs are kept, even if they're inside a cell)
+            ((arcpts0, arcpts2), (arcpts1, arcpts3), keep) = trimmed
+            self.m_arcpoints = [arcpts0, arcpts1, arcpts2, arcpts3]
+            #print "KILLME:",self.m_arcpoints
             self.m_arcindex = [(0, 1, 2, 3)]
 
         elif LINEMODE == 'simple':
@@ -239,29 +264,14 @@ class Line(object):
             pass
 
         elif LINEMODE == 'pathfinding':
-            #n = len(path) - 1
-            for i in range(0, len(self.m_path)-1):
-                thispt = self.m_path[i]
-                nextpt = self.m_path[i+1]
-                # Remove parts of path within the radius of cell
-                # TODO: Ensure that the logic here works in every case
-                # if both ends of this line segment are inside a circle fugetaboutit
-                if (self.in_circle(thispt, p0, r0) and self.in_circle(nextpt, p0, r0)) or\
-                    (self.in_circle(thispt, p1, r1) and self.in_circle(nextpt, p1, r1)):
+            # parts of path within the radius of cell are already trimmed,
+            # and we drop the segments entirely inside one
+            (ends0, ends1, keep) = trimmed
+            for i in range(len(keep)):
+                if not keep[i]:
                     continue
-                # if near end of this line segment is inside a circle
-                if self.in_circle(thispt, p0, r0):
-                    # find the point intersecting the circle
-                    thispt = self.find_intersect(thispt, nextpt, p0, r0)
-                # if far end of this line segment is inside the other circle
-                elif self.in_circle(nextpt, p1, r1):
-                    # find the point intersecting the circle
-                    nextpt = self.find_intersect(nextpt, thispt, p1, r1)
-
-                # if neither point is inside one of our circles, use it
-                #print path[i],"inside cell"
                 # take segment of two points, and transform to three point arc
-                arc = self.make_arc(thispt,nextpt)
+                arc = self.make_arc(ends0[i],ends1[i])
                 npath.append(arc[0])
                 npath.append(arc[1])
                 npath.append(arc[2])
@@ -274,6 +284,10 @@ class Line(object):
         elif LINEMODE == 'improved_pathfinding':
             pass
 
+        if self.m_arcpoints and self.m_arcindex:
+            self.m_controls = tessellate.arcs(self.m_arcpoints, self.m_arcindex)
+            self.m_laser = self.m_controls.reshape(-1, 8).tolist()
+
     def draw(self):
         """Draw a line, which is actually a path made up of cubicsplines.
 
@@ -286,49 +300,19 @@ class Line(object):
         The screen engine wants these arcs divded up into line segments
         The laser engine wants these arcs divied up into OSC messages
         """
-        if self.m_p0 and self.m_p1:
+        if self.m_dirty and self.m_p0 and self.m_p1:
             self.render()
         if self.m_field and self.m_arcpoints and self.m_arcindex and self.m_color:
             if GRAPHMODES & GRAPHOPTS['screen']:
-                # The screen engine, pyglet, wants output in this form
-                #   a list of points
-                #       points = [(10.0,10.0), (20.0,0), (-10.0,10.0), etc]
-                #   an index into points describing contiguous line segments
-                #       index = [(1,2), (2, 3), (3,4), etc]
-                # for each arc in the circle, convert to line segments
-                if dbug.LEV & dbug.GRAPH: print "Graph:draw:self.m_arcpoints = ",self.m_arcpoints
-                if dbug.LEV & dbug.GRAPH: print "Graph:draw:self.m_arcindex = ",self.m_arcindex
-                for i in range(len(self.m_arcindex)):
-                    # e.g., self.m_arcindex[i] = (0,1,2,3)
-                    p0 = self.m_arcpoints[self.m_arcindex[i][0]]
-                    p1 = self.m_arcpoints[self.m_arcindex[i][1]]
-                    p2 = self.m_arcpoints[self.m_arcindex[i][2]]
-                    p3 = self.m_arcpoints[self.m_arcindex[i][3]]
-                    # if this is a straight line, don't chop into cubicSplines
-                    #TODO: Replace with colinear test
-                    if p0[0] == p1[0] == p2[0] == p3[0] or \
-                            p0[1] == p1[1] == p2[1] == p3[1]:
-                        points = [p0,p1,p2,p3]
-                        index = [0,1,1,2,2,3]
-                        # TODO: convert CURVE_SEGS into a passable parameter, so in the
-                        # case of a straight line, we pass t=1 so it makes ONE slice
-                    else:
-                        (points,index) = curves.cubic_spline(p0,p1,p2,p3,CURVE_SEGS)
-                    self.m_points.append(points)
-                    self.m_index.append(index)
-                if dbug.LEV & dbug.GRAPH: print "Graph:draw:self.m_points =",self.m_points
-                if dbug.LEV & dbug.GRAPH: print "Graph:draw:index:",self.m_index
+                if self.m_screen is None or \
+                        self.m_scale_version != self.m_field.m_scale_version:
+                    self.render_screen()
                 # now, for each segment, output a line to pyglet
-                for i in range(len(self.m_index)):
-                    points = self.m_points[i]
-                    if dbug.LEV & dbug.GRAPH: print "Graph:draw:points =",points
-                    scaled_pts = self.m_field.rescale_pt2screen(points)
-                    if dbug.LEV & dbug.GRAPH: print "Graph:draw:screen:scaled_points =",scaled_pts
-                    index = self.m_index[i]
-                    pyglet.gl.glColor3f(self.m_color[0],self.m_color[1],self.m_color[2])
-                    pyglet.graphics.draw_indexed(len(scaled_pts), pyglet.gl.GL_LINES,
+                pyglet.gl.glColor3f(self.m_color[0],self.m_color[1],self.m_color[2])
+                for (nverts, index, verts) in self.m_screen:
+                    pyglet.graphics.draw_indexed(nverts, pyglet.gl.GL_LINES,
                         index,
-                        ('v2i',tuple(chain(*scaled_pts))),
+                        ('v2i',verts),
                     )
             if GRAPHMODES & GRAPHOPTS['osc']:
                 # the laser engine wants output of this form:
@@ -341,16 +325,76 @@ class Line(object):
                        [self.m_color[0],self.m_color[1],self.m_color[2]]
                 self.m_field.m_osc.send_laser(OSCPATH['graph_color'],
                                 [self.m_color[0],self.m_color[1],self.m_color[2]])
-                for i in range(len(self.m_arcindex)):
-                    # e.g., self.m_arcindex[i] = (0,1,2)
-                    p0 = self.m_arcpoints[self.m_arcindex[i][0]]
-                    p1 = self.m_arcpoints[self.m_arcindex[i][1]]
-                    p2 = self.m_arcpoints[self.m_arcindex[i][2]]
-                    p3 = self.m_arcpoints[self.m_arcindex[i][3]]
+                for arc in self.m_laser:
+                    # e.g., arc = [p0[0], p0[1], p1[0], p1[1], ... p3[1]]
                     if dbug.LEV & dbug.GRAPH:
-                        print "Line:OSC to laser:", OSCPATH['graph_cubic'], \
-                                [p0[0], p0[1], p1[0], p1[1],
-                                 p2[0], p2[1], p3[0], p3[1]]
-                    self.m_field.m_osc.send_laser(OSCPATH['graph_cubic'],
-                                    [p0[0], p0[1], p1[0], p1[1],
-                                     p2[0], p2[1], p3[0], p3[1]])
+                        print "Line:OSC to laser:", OSCPATH['graph_cubic'], arc
+                    self.m_field.m_osc.send_laser(OSCPATH['graph_cubic'], arc)
+
+    def render_screen(self):
+        """Break the arcs into line segments and scale them for the screen.
+
+        The screen engine, pyglet, wants output in this form
+          a list of points
+              points = [(10.0,10.0), (20.0,0), (-10.0,10.0), etc]
+          an index into points describing contiguous line segments
+              index = [(1,2), (2, 3), (3,4), etc]
+        """
+        if not self.m_points:
+            controls = self.m_controls
+            if dbug.LEV & dbug.GRAPH: print "Graph:draw:self.m_arcpoints = ",self.m_arcpoints
+            if dbug.LEV & dbug.GRAPH: print "Graph:draw:self.m_arcindex = ",self.m_arcindex
+            # if an arc is a straight line, don't chop it into cubicSplines
+            #TODO: Replace with colinear test
+            straight = (controls[:, :, 0] == controls[:, :1, 0]).all(1) | \
+                       (controls[:, :, 1] == controls[:, :1, 1]).all(1)
+            curved = iter(tessellate.tessellate(controls[~straight],
+                                                CURVE_SEGS))
+            for i in range(len(self.m_arcindex)):
+                if straight[i]:
+                    points = map(tuple, controls[i].tolist())
+                    index = [0,1,1,2,2,3]
+                else:
+                    points = next(curved)
+                    index = tessellate.index(CURVE_SEGS)
+                self.m_points.append(points)
+                self.m_index.append(index)
+            if dbug.LEV & dbug.GRAPH: print "Graph:draw:self.m_points =",self.m_points
+            if dbug.LEV & dbug.GRAPH: print "Graph:draw:index:",self.m_index
+        self.m_screen = []
+        for i in range(len(self.m_index)):
+            points = self.m_points[i]
+            if dbug.LEV & dbug.GRAPH: print "Graph:draw:points =",points
+            scaled_pts = self.m_field.rescale_pt2screen(points)
+            if dbug.LEV & dbug.GRAPH: print "Graph:draw:screen:scaled_points =",scaled_pts
+            self.m_screen.append((len(scaled_pts), self.m_index[i],
+                                  tuple(chain(*scaled_pts))))
+        self.m_scale_version = self.m_field.m_scale_version
+
+
+def render_all(lines):
+    """Render the lines that need it, trimming all their ends at once."""
+    lines = [line for line in lines
+             if line.m_dirty and line.m_p0 and line.m_p1]
+    segments = [line.segments() for line in lines]
+    counts = [len(near) for (near, far) in segments]
+    ends0 = list(chain(*[near for (near, far) in segments]))
+    ends1 = list(chain(*[far for (near, far) in segments]))
+    keep = []
+    if ends0:
+        # each line's cells, once for each of its segments
+        p0 = numpy.repeat([line.m_p0 for line in lines], counts, axis=0)
+        p1 = numpy.repeat([line.m_p1 for line in lines], counts, axis=0)
+        r0 = numpy.repeat([line.m_r0 for line in lines], counts)
+        r1 = numpy.repeat([line.m_r1 for line in lines], counts)
+        (ends0, ends1, keep) = clip.trim(numpy.array(ends0, dtype=float),
+                                         numpy.array(ends1, dtype=float),
+                                         p0, r0, p1, r1)
+        ends0 = map(tuple, ends0.tolist())
+        ends1 = map(tuple, ends1.tolist())
+        keep = keep.tolist()
+    start = 0
+    for (line, count) in zip(lines, counts):
+        end = start + count
+        line.render((ends0[start:end], ends1[start:end], keep[start:end]))
+        start = end
@@ -102,6 +102,9 @@ def main():
             #CHANGE: incorporated into draw
             #field.render_all()
             field.check_for_abandoned_cells()
+            if GRAPHMODES & GRAPHOPTS['osc']:
+                # everything drawn for the laser goes out in one go, below
+                osc.begin_laser_frame(field.m_frame)
             field.draw_all()
             window.dispatch_event('on_draw')
             #window.clear()
@@ -112,7 +115,8 @@ def main():
                 if dbug.LEV & dbug.GRAPH: 
                     print "Main:OSC to laser:", OSCPATH['graph_update'],\
                         ", frame=",field.m_frame
-                field.m_osc.send_laser(OSCPATH['graph_update'],[field.m_frame])
+                osc.end_laser_frame()
+            osc.send_routing()
 
             lastframe=field.m_frame
             lasttime = time()
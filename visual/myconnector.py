@@ -85,7 +85,9 @@ class MyConnector(Connector):
         #print "KILLME:add_path:",path
         self.m_path = path
 
-    def draw(self):
+    def update_shape(self):
+        """Bring our shape up to date, if both cells are placed. Returns
+        whether they are."""
         if self.m_cell0.m_x is not None and self.m_cell0.m_y is not None and \
            self.m_cell1.m_x is not None and self.m_cell1.m_y is not None:
             self.m_shape.update(self.m_field, 
@@ -94,6 +96,11 @@ class MyConnector(Connector):
                                 self.m_cell0.m_diam/2, self.m_cell1.m_diam/2,
                                 color=self.m_color,
                                 path=self.m_path)
+            return True
+        return False
+
+    def draw(self):
+        if self.update_shape():
             self.m_field.m_osc.send_laser(OSCPATH['graph_begin_conx'],[self.m_id])
             self.m_shape.draw()
             self.m_field.m_osc.send_laser(OSCPATH['graph_end_conx'],[self.m_id])
@@ -20,17 +20,23 @@ __license__ = "GNU GPL 3.0 or later"
 
 # core modules
 from math import sqrt
+from time import time
+from heapq import heappush, heappop
 
 # installed modules
 
 # local modules
 from shared import config
 from shared import debug
+import line
 
 # local classes
 from window import Window
 from gridmap import GridMap
-from pathfinder import PathFinder
+from astar import AStar
+from hpastar import HPAStar
+from parallelroute import ParallelRouter
+from transform import Affine
 from shared.field import Field
 from myconnector import MyConnector
 
@@ -72,6 +78,9 @@ YMAX_SCREEN = config.ymax_screen
 DEF_MARGIN = config.default_margin
 PATH_UNIT = config.path_unit
 BLOCK_FUZZ = config.fuzzy_area_for_cells
+ROUTE_BUDGET = 0.3 / config.framerate   # (sec) most time we route per frame
+HIERARCHICAL_MIN_SQUARES = 40000    # path grids this big route in two levels
+ROUTE_WORKERS = 0       # processes to route separate regions in (0 = don't)
 
 # init debugging
 dbug = debug.Debug()
@@ -102,6 +111,13 @@ class MyField(Field):
         self.m_path_scale = 1.0/self.m_path_unit
         self.m_screen_scale = 1
         self.m_vector_scale = 1
+        # goes up every time the scaling changes, so shapes know to rescale
+        self.m_scale_version = 0
+        # transforms for the scaling, made by set_scaling
+        self.m_to_screen = None
+        self.m_to_vector = None
+        self.m_to_path = None
+        self.m_from_path = None
         # our default margins, one will be overwriten below
         self.m_xmargin = int(self.m_xmax_screen*DEF_MARGIN)
         self.m_ymargin = int(self.m_ymax_screen*DEF_MARGIN)
@@ -109,6 +125,15 @@ class MyField(Field):
         self.m_screen = object
         self.m_pathgrid = object
         self.m_pathfinder = object
+        # routes regions of the floor in other processes, if we do that
+        self.m_router = None
+        # last path of each connector, indexed by cid:
+        #   (start, goal, path, costs along path, rescaled path)
+        self.m_path_cache = {}
+        # how many frames since we last routed each connector, indexed by cid
+        self.m_path_stale = {}
+        # how many connectors we ran out of time for last frame
+        self.m_route_backlog = 0
         super(MyField, self).__init__()
         self.make_path_grid()
 
@@ -151,6 +176,7 @@ class MyField(Field):
 
          """
 
+        self.m_scale_version += 1
         if pmin_field is not None:
             self.m_xmin_field = pmin_field[0]
             self.m_ymin_field = pmin_field[1]
@@ -234,10 +260,26 @@ class MyField(Field):
                                                           (xmax_screen,ymax_screen)
             #print "Screen scale:",self.m_screen_scale
             #print "Screen margins:",(self.m_xmargin,self.m_ymargin)
+        self.make_transforms()
+        if GRAPHMODES & GRAPHOPTS['screen']:
             if dbug.LEV & dbug.MORE: print "Used screen space:",\
                         self.rescale_pt2screen((xmin_field,ymin_field)),\
                         self.rescale_pt2screen((xmax_field,ymax_field))
 
+    def make_transforms(self):
+        """Work out the transforms from the field to the screen, the laser
+        and the path grid, and back from the path grid, for the scaling we
+        have now."""
+        field_min = (self.m_xmin_field,self.m_ymin_field)
+        self.m_to_screen = Affine(self.m_screen_scale, field_min,
+                                  (self.m_xmin_screen+self.m_xmargin,
+                                   self.m_ymin_screen+self.m_ymargin),
+                                  ints=True)
+        self.m_to_vector = Affine(self.m_vector_scale, field_min,
+                                  (self.m_xmin_vector,self.m_ymin_vector))
+        self.m_to_path = Affine(self.m_path_scale, field_min, (0,0), ints=True)
+        self.m_from_path = Affine(1.0/self.m_path_scale, (0.0,0.0), field_min)
+
     # Everything
 
     #CHANGE: incorporated into draw
@@ -310,8 +352,16 @@ class MyField(Field):
     def draw_all_connectors(self):
         # we don't call the Connector's draw-er directly because we may want
         # to introduce logic at this level
+        shapes = []
         for connector in self.m_conx_dict.values():
             connector.update()
+            if self.is_conx_good_to_go(connector.m_id) and \
+                    connector.update_shape():
+                shapes.append(connector.m_shape)
+        # render the lines that moved together, so their ends are trimmed
+        # to the cells all at once
+        line.render_all(shapes)
+        for connector in self.m_conx_dict.values():
             self.draw_connector(connector)
 
 
@@ -366,10 +416,15 @@ class MyField(Field):
         self.m_pathgrid = GridMap(
                                 *self.rescale_pt2path(
                                         (self.m_xmax_field, self.m_ymax_field)))
-        self.m_pathfinder = PathFinder(
-                                self.m_pathgrid.successors, 
-                                self.m_pathgrid.move_cost, 
-                                self.m_pathgrid.estimate)
+        if self.m_pathgrid.xmax * self.m_pathgrid.ymax >= HIERARCHICAL_MIN_SQUARES:
+            self.m_pathfinder = HPAStar(self.m_pathgrid)
+        else:
+            self.m_pathfinder = AStar(self.m_pathgrid)
+        if self.m_router is not None:
+            self.m_router.close()
+            self.m_router = None
+        if ROUTE_WORKERS:
+            self.m_router = ParallelRouter(self.m_pathgrid, ROUTE_WORKERS)
 
     def reset_path_grid(self):
         self.m_pathgrid.reset_grid()
@@ -388,45 +443,155 @@ class MyField(Field):
                         BLOCK_FUZZ)
 
     def calc_connector_paths(self):
-        """ Find path for all the connectors.
+        """ Find path for all the connectors, within ROUTE_BUDGET.
+
+        Connectors we haven't tried to route yet go first. The rest go
+        shortest first, moved up by how many squares their ends have moved
+        since we last routed them. When we run out of time, the rest keep
+        their last path if their ends are still in the same squares, or
+        get an easy path if not, and we count them as backlog.
 
-        We sort the connectors by distance and do easy paths for the closest 
-        ones first.
+        If we have ROUTE_WORKERS, see calc_connector_paths_parallel instead.
+        """
+        if self.m_router is not None:
+            self.calc_connector_paths_parallel()
+            self.forget_stale_paths()
+            return
+        started = time()
+        queue = []
+        for connector in self.m_conx_dict.values():
+            if self.is_conx_good_to_go(connector.m_id):
+                dist = sqrt((connector.m_cell0.m_x - connector.m_cell1.m_x)**2 + \
+                        (connector.m_cell0.m_y - connector.m_cell1.m_y)**2)
+                connector.update(dist=dist)
+                moved = self.path_moved(connector)
+                tried = connector.m_id in self.m_path_cache or \
+                        connector.m_id in self.m_path_stale
+                heappush(queue, (tried,
+                                 dist / (1.0 + moved), connector.m_id))
+        self.m_route_backlog = 0
+        deadline = started + ROUTE_BUDGET
+        while queue:
+            (routed, priority, cid) = heappop(queue)
+            connector = self.m_conx_dict[cid]
+            if time() < deadline:
+                path = self.find_path(connector, deadline)
+                if path is not None:
+                    connector.add_path(path)
+                    self.m_path_stale[cid] = 0
+                    continue
+            self.m_route_backlog += 1
+            self.m_path_stale[cid] = self.m_path_stale.get(cid, 0) + 1
+            (start, goal) = self.path_ends(connector)
+            cached = self.m_path_cache.get(cid)
+            if cached is not None and cached[0] == start and cached[1] == goal:
+                # still in the way of the others
+                self.m_pathgrid.set_block_line(cached[2])
+                connector.add_path(cached[4])
+            else:
+                # the ends moved, so the old path won't do; an easy path will
+                # until we get to it
+                path = self.m_pathgrid.easy_path(start, goal)
+                self.m_pathgrid.set_block_line(path)
+                connector.add_path(self.rescale_path2pt(path))
+        self.forget_stale_paths()
+
+    def calc_connector_paths_parallel(self):
+        """ Find path for all the connectors, routing separate regions of
+        the floor in other processes.
+
+        Connectors go shortest first. Those whose ends are near each other
+        share a region, and the router routes each region's connectors in
+        that order, in its own process. Once they're all back and blocked
+        on the grid, we route the rest (those in regions too big to send
+        out) here, in the same order.
+
+        So that the same frame always gets the same paths, we route them
+        all, from scratch: no time budget and no reusing last frame's paths.
         """
-        #conx_dict_rekeyed = self.m_conx_dict
-        #for i in conx_dict_rekeyed.iterkeys():
-        conx_dict_rekeyed = {}
+        order = []
         for connector in self.m_conx_dict.values():
             if self.is_conx_good_to_go(connector.m_id):
-                # normally we'd take the sqrt to get the distance, but here this is 
-                # just used as a sort comparison, so we'll not take the hit for sqrt
                 dist = sqrt((connector.m_cell0.m_x - connector.m_cell1.m_x)**2 + \
                         (connector.m_cell0.m_y - connector.m_cell1.m_y)**2)
-                # here we save time by reindexing as we go through it
                 connector.update(dist=dist)
-                conx_dict_rekeyed[dist] = connector
-        for i in sorted(conx_dict_rekeyed.iterkeys()):
-            connector = conx_dict_rekeyed[i]
-            #print "findpath--id:",connector.m_id,"dist:",i**0.5
-            path = self.find_path(connector)
-            connector.add_path(path)
-            #import pdb;pdb.set_trace()
-
-    def find_path(self, connector):
-        """ Find path in path_grid and then scale it appropriately."""
-        start = self.rescale_pt2path((connector.m_cell0.m_x, connector.m_cell0.m_y))
-        goal = self.rescale_pt2path((connector.m_cell1.m_x, connector.m_cell1.m_y))
-        # TODO: Either here or in compute_path we first try several simple/dumb
-        # paths, reserving A* for the ones that are blocked and need more
-        # smarts. We sort the connectors by distance and do easy paths for the
-        # closest ones first.
-        path = list(self.m_pathgrid.easy_path(start, goal))
-        #if not path:
-        #path = list(self.m_pathfinder.compute_path(start, goal))
+                order.append((dist, connector.m_id))
+        order.sort()
+        conx = [(cid,) + self.path_ends(self.m_conx_dict[cid])
+                for (dist, cid) in order]
+        (paths, leftover) = self.m_router.route(conx)
+        self.m_route_backlog = 0
+        ends = dict((cid, (start, goal)) for (cid, start, goal) in conx)
+        for (cid, path) in paths:
+            if not path:
+                path = list(self.m_pathgrid.easy_path(*ends[cid]))
+            self.m_pathgrid.set_block_line(path)
+            self.m_conx_dict[cid].add_path(self.rescale_path2pt(path))
+            self.m_path_stale[cid] = 0
+        for (cid, start, goal) in leftover:
+            path = self.m_pathfinder.compute_path(start, goal)
+            if not path:
+                path = list(self.m_pathgrid.easy_path(start, goal))
+            self.m_pathgrid.set_block_line(path)
+            self.m_conx_dict[cid].add_path(self.rescale_path2pt(path))
+            self.m_path_stale[cid] = 0
+
+    def forget_stale_paths(self):
+        """ Forget paths of connectors that are gone or not good to go. """
+        for cid in self.m_path_stale.keys():
+            if cid not in self.m_conx_dict or \
+                    not self.is_conx_good_to_go(cid):
+                del self.m_path_stale[cid]
+                if cid in self.m_path_cache:
+                    del self.m_path_cache[cid]
+
+    def path_ends(self, connector):
+        """ Return the connector's start and goal squares on the path grid."""
+        return (self.rescale_pt2path((connector.m_cell0.m_x, connector.m_cell0.m_y)),
+                self.rescale_pt2path((connector.m_cell1.m_x, connector.m_cell1.m_y)))
+
+    def path_moved(self, connector):
+        """ How many squares the connector's ends have moved since we last
+        routed it (a lot, if we never have)."""
+        cached = self.m_path_cache.get(connector.m_id)
+        if cached is None:
+            return self.m_pathgrid.xmax + self.m_pathgrid.ymax
+        (start, goal) = self.path_ends(connector)
+        return abs(start[0] - cached[0][0]) + abs(start[1] - cached[0][1]) + \
+               abs(goal[0] - cached[1][0]) + abs(goal[1] - cached[1][1])
+
+    def routing_stats(self):
+        """ Return [backlog, most frames any connector's path is stale]."""
+        return [self.m_route_backlog, max(self.m_path_stale.values() or [0])]
+
+    def find_path(self, connector, deadline=None):
+        """ Find path in path_grid and then scale it appropriately.
+
+        If neither end has moved to another grid square, and the squares
+        the last path went through cost the same as they did then, we
+        reuse the last path without searching. Returns None if the search
+        is still going at time() 'deadline'.
+        """
+        (start, goal) = self.path_ends(connector)
+        cached = self.m_path_cache.get(connector.m_id)
+        if cached is not None and cached[0] == start and cached[1] == goal and \
+                self.m_pathgrid.path_costs(cached[2]) == cached[3]:
+            (start, goal, path, costs, rescaled_path) = cached
+            self.m_pathgrid.set_block_line(path)
+            return rescaled_path
+        path = self.m_pathfinder.compute_path(start, goal, deadline)
+        if path is None:
+            return None
+        if not path:
+            # off the grid, fall back on a dumb path
+            path = list(self.m_pathgrid.easy_path(start, goal))
+        costs = self.m_pathgrid.path_costs(path)
         # take results of found paths and block them on the map
         self.m_pathgrid.set_block_line(path)
         #self.allpaths = self.allpaths + path
         rescaled_path = self.rescale_path2pt(path)
+        self.m_path_cache[connector.m_id] = (start, goal, path, costs,
+                                             rescaled_path)
         #import pdb;pdb.set_trace()
         return rescaled_path
         
@@ -474,70 +639,31 @@ class MyField(Field):
         return self._convert(n,1/self.m_path_scale,0,self.m_xmin_field)
 
     def _rescale_pts(self,obj,scale,orig_pmin,new_pmin,type=None):
-        """Recursively rescales points or lists of points.
+        """Rescales points or lists of points.
 
-        This function accepts single integers, tuples, lists, or combinations.
+        This function accepts single points, lists of them, or combinations.
+        If type is 'int' (pixel scaling), we return ints, otherwise floats.
+        The rescale_ functions below use the transforms we keep for the
+        current scaling instead.
 
         """
-        # if this is a point, rescale it
-        if isinstance(obj, tuple) and len(obj) == 2 and \
-                isinstance(obj[0], (int,float)) and \
-                isinstance(obj[1], (int,float)):
-            # if we were given ints (pixel scaling), return ints
-            if type == 'int':
-                x = int((obj[0]-orig_pmin[0])*scale) + new_pmin[0]
-                y = int((obj[1]-orig_pmin[1])*scale) + new_pmin[1]
-            # otherwise (m scaling), return floats
-            else:
-                x = float(obj[0]-orig_pmin[0])*scale + new_pmin[0]
-                y = float(obj[1]-orig_pmin[1])*scale + new_pmin[1]
-            return x,y
-        # if this is a list, examine each element, return list
-        elif isinstance(obj, (list,tuple)):
-            mylist = []
-            for i in obj:
-                mylist.append(self._rescale_pts(i, scale, orig_pmin, 
-                              new_pmin, type))
-            return mylist
-        # if this is a tuple, examine each element, return tuple
-        elif isinstance(obj, tuple):
-            mylist = []
-            for i in obj:
-                mylist.append(self._rescale_pts(i, scale, orig_pmin, new_pmin))
-            return tuple(mylist)
-        # otherwise, we don't know what to do with it, return it
-        # TODO: Consider throwing an exception
-        else:
-            print "ERROR: Can only rescale a point, not",obj
-            return obj
+        return Affine(scale, orig_pmin, new_pmin, ints=(type == 'int'))(obj)
 
     def rescale_pt2screen(self,p):
         """Convert coord in internal units (cm) to units usable for the vector or screen. """
-        orig_pmin = (self.m_xmin_field,self.m_ymin_field)
-        scale = self.m_screen_scale
-        new_pmin = (self.m_xmin_screen+self.m_xmargin,self.m_ymin_screen+self.m_ymargin)
-        return self._rescale_pts(p,scale,orig_pmin,new_pmin, 'int')
+        return self.m_to_screen(p)
 
     def rescale_pt2vector(self,p):
         """Convert coord in internal units (cm) to units usable for the vector or screen. """
-        orig_pmin = (self.m_xmin_field,self.m_ymin_field)
-        scale = self.m_vector_scale
-        new_pmin = (self.m_xmin_vector,self.m_ymin_vector)
-        return self._rescale_pts(p,scale,orig_pmin,new_pmin, 'float')
+        return self.m_to_vector(p)
 
     def rescale_pt2path(self,p):
         """Convert coord in internal units (cm) to units usable for the vector or screen. """
-        orig_pmin = (self.m_xmin_field,self.m_ymin_field)
-        scale = self.m_path_scale
-        new_pmin = (0,0)
-        return self._rescale_pts(p,scale,orig_pmin,new_pmin, 'int')
+        return self.m_to_path(p)
 
     def rescale_path2pt(self,p):
         """Convert coord in internal units (cm) to units usable for the vector or screen. """
-        orig_pmin = (0.0,0.0)
-        scale = 1.0/self.m_path_scale
-        new_pmin = (self.m_xmin_field,self.m_ymin_field)
-        return self._rescale_pts(p, scale, orig_pmin, new_pmin, 'float')
+        return self.m_from_path(p)
 
     def rescale_num2screen(self,n):
         """Convert num in internal units (cm) to units usable for screen. """
@@ -31,6 +31,7 @@ from shared import config
 from shared import debug
 
 # local Classes
+from laserframe import LaserFrame
 
 # configure servers & clients properly
 import socket
@@ -48,6 +49,9 @@ else:
 OSCTIMEOUT = config.osctimeout
 OSCPATH = config.oscpath
 REPORT_FREQ = config.report_frequency
+ROUTING_PATH = "/health/routing"
+ROUTING_FREQ = 25   # report routing health every n frames
+LASER_CLIENTS = ('laser', 'recorder')   # who gets the laser frames
 
 # init debugging
 dbug = debug.Debug()
@@ -88,6 +92,10 @@ class MyOSCHandler(OSCHandler):
             'conduct_event': self.event_conduct_event,
         }
 
+        # collects each frame's laser messages, between begin_laser_frame()
+        # and end_laser_frame()
+        self.m_laser_frame = LaserFrame()
+
         super(MyOSCHandler, self).__init__(osc_server, osc_clients, field)
 
     def honey_im_home(self):
@@ -258,3 +266,58 @@ class MyOSCHandler(OSCHandler):
         """
         if dbug.LEV & dbug.MSGS: print "OSC:event_conduct_event"
 
+    #
+    # Visual OUTGOING
+    #
+
+    def send_routing(self):
+        """Report how far behind connector routing is, every ROUTING_FREQ
+        frames.
+
+        /health/routing [backlog, stale]
+            backlog: connectors we ran out of time to route last frame
+            stale: most frames any connector has gone without routing
+        """
+        if self.m_field.m_frame % ROUTING_FREQ == 0:
+            self.send_to_all_clients(ROUTING_PATH, self.m_field.routing_stats())
+
+    def send_laser(self, path, args):
+        """Send to the laser, or add to the frame if we're collecting one."""
+        if self.m_laser_frame.is_open():
+            if not self.m_laser_frame.add(path, args,
+                                          path == OSCPATH['graph_cubic']):
+                if dbug.LEV & dbug.GRAPH:
+                    print "OSC:send_laser:over max primitives, dropped",path
+            return
+        super(MyOSCHandler, self).send_laser(path, args)
+
+    def begin_laser_frame(self, frame):
+        """Collect laser messages from here on, until end_laser_frame()."""
+        self.m_laser_frame.begin(frame)
+
+    def end_laser_frame(self):
+        """End the frame with graph_update, and send it to the laser as a
+        few bundles.
+
+        /laser/frame [frame, bundles, messages, dropped] comes first, then
+        the frame's messages, then /laser/update [frame].
+        """
+        frame = self.m_laser_frame.m_frame
+        self.m_laser_frame.add(OSCPATH['graph_update'], [frame])
+        bundles = self.m_laser_frame.compile()
+        if dbug.LEV & dbug.GRAPH:
+            print "OSC:end_laser_frame:frame",frame,"in",len(bundles),"bundles"
+        for clientkey in LASER_CLIENTS:
+            if clientkey in self.m_osc_clients:
+                for bundle in bundles:
+                    self.send_bundle(clientkey, bundle)
+
+    def send_bundle(self, clientkey, bundle):
+        """Send an OSC bundle to one client."""
+        try:
+            self.m_osc_clients[clientkey].send(bundle)
+        except:
+            if dbug.LEV & dbug.MSGS:
+                print "OSC:send_bundle:Unable to reach host",clientkey
+            return False
+        return True
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Routing connectors in separate regions of the floor at the same time.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+__appname__ = "parallelroute.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# core modules
+from multiprocessing import Pool
+from multiprocessing.sharedctypes import RawArray
+
+# installed modules
+import numpy
+
+# local modules
+
+# local classes
+from gridmap import GridMap, MAP_DTYPE
+from astar import AStar
+
+# constants
+REGION_MARGIN = 4       # squares around a connector's ends it may wander into
+MAX_REGION_SHARE = 0.5  # regions bigger than this part of the grid aren't worth it
+
+# the cost grid, shared with the workers, and each worker's own GridMap and
+# AStar, reused for every region it routes (set up by init_worker)
+shared_grid = None
+worker_grid = None
+worker_astar = None
+
+
+def init_worker(grid, shape):
+    """Runs in each worker: keep a numpy view of the shared cost grid, and
+    make the GridMap (slow to make) we'll load regions into."""
+    global shared_grid, worker_grid, worker_astar
+    shared_grid = numpy.frombuffer(grid, dtype=MAP_DTYPE).reshape(shape)
+    worker_grid = GridMap(1, 1)
+    worker_astar = AStar(worker_grid)
+
+
+def route_region(job):
+    """Runs in a worker: route a region's connectors, in order.
+
+    job is ((x0, x1, y0, y1), [(cid, start, goal), ...]). Each path is
+    blocked on our own copy of the region before the next is routed, just
+    as MyField does. Returns [(cid, path), ...] in grid coords.
+    """
+    ((x0, x1, y0, y1), conx) = job
+    grid = worker_grid
+    grid.set_map(shared_grid[x0:x1, y0:y1].copy())
+    astar = worker_astar
+    results = []
+    for (cid, start, goal) in conx:
+        path = astar.compute_path((start[0] - x0, start[1] - y0),
+                                  (goal[0] - x0, goal[1] - y0))
+        grid.set_block_line(path)
+        results.append((cid, [(x + x0, y + y0) for (x, y) in path]))
+    return results
+
+
+def overlaps(box0, box1):
+    return box0[0] < box1[1] and box1[0] < box0[1] and \
+           box0[2] < box1[3] and box1[2] < box0[3]
+
+
+def union(box0, box1):
+    return (min(box0[0], box1[0]), max(box0[1], box1[1]),
+            min(box0[2], box1[2]), max(box0[3], box1[3]))
+
+
+class ParallelRouter(object):
+    """ Routes connectors in worker processes, one region of the floor each.
+
+        Each connector gets a box around its two ends (plus REGION_MARGIN),
+        and connectors whose boxes overlap are put in the same region, until
+        no two regions overlap. Since a path stays inside its region, and
+        regions don't overlap, paths in different regions can't get in each
+        other's way, and each region can be routed on its own. Within a
+        region, connectors are routed in the order we're given, as they
+        would be one after another.
+
+        Regions that end up bigger than MAX_REGION_SHARE of the grid aren't
+        sent out; we hand their connectors back to be routed one after
+        another once the regions' paths are in.
+
+        The workers read the cost grid from shared memory, so we copy it
+        in once a frame rather than sending it to each of them.
+
+        Stores the following values:
+            gridmap: the GridMap we route on
+            shape: (xmax, ymax) of the grid
+            grid: the shared copy of the cost grid
+            view: numpy view of grid
+            pool: the worker processes (started when first needed)
+            workers: how many workers
+
+    """
+
+    def __init__(self, gridmap, workers):
+        self.gridmap = gridmap
+        self.shape = (gridmap.xmax, gridmap.ymax)
+        self.grid = RawArray('B', gridmap.xmax * gridmap.ymax)
+        self.view = numpy.frombuffer(self.grid, dtype=MAP_DTYPE).reshape(
+                self.shape)
+        self.pool = None
+        self.workers = workers
+
+    def partition(self, conx):
+        """ Sort connectors into regions.
+
+        conx is [(cid, start, goal), ...] in the order they should be
+        routed. Returns (regions, leftover): regions is [(box, conx), ...]
+        and leftover is the connectors to route one after another. Both
+        keep the order we were given, so the same input gives the same
+        result.
+        """
+        (xmax, ymax) = self.shape
+        regions = []
+        for (order, (cid, start, goal)) in enumerate(conx):
+            box = (max(0, min(start[0], goal[0]) - REGION_MARGIN),
+                   min(xmax, max(start[0], goal[0]) + REGION_MARGIN + 1),
+                   max(0, min(start[1], goal[1]) - REGION_MARGIN),
+                   min(ymax, max(start[1], goal[1]) + REGION_MARGIN + 1))
+            members = [order]
+            # merge with every region we touch, and again if that grows us
+            # into more
+            merged = True
+            while merged:
+                merged = False
+                for region in regions:
+                    if overlaps(box, region[0]):
+                        regions.remove(region)
+                        box = union(box, region[0])
+                        members.extend(region[1])
+                        merged = True
+                        break
+            regions.append((box, members))
+        most = MAX_REGION_SHARE * xmax * ymax
+        routed = []
+        leftover = []
+        for (box, members) in sorted(regions, key=lambda r: min(r[1])):
+            members = [conx[i] for i in sorted(members)]
+            if (box[1] - box[0]) * (box[3] - box[2]) > most:
+                leftover.extend(members)
+            else:
+                routed.append((box, members))
+        leftover.sort(key=conx.index)
+        return (routed, leftover)
+
+    def route(self, conx):
+        """ Route what we can in parallel.
+
+        conx is [(cid, start, goal), ...] in the order they should be
+        routed. Returns (paths, leftover): paths is [(cid, path), ...], in
+        the order given, and leftover the connectors the caller still has
+        to route, in order.
+        """
+        (xmax, ymax) = self.shape
+        (regions, leftover) = self.partition(conx)
+        if not regions:
+            return ([], leftover)
+        self.view[:, :] = self.gridmap.map[:xmax, :ymax]
+        if self.pool is None:
+            self.pool = Pool(self.workers, init_worker,
+                             (self.grid, self.shape))
+        results = {}
+        for region in self.pool.map(route_region, regions):
+            results.update(region)
+        paths = [(cid, results[cid]) for (cid, start, goal) in conx
+                 if cid in results]
+        return (paths, leftover)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Breaking cubic Bezier arcs into line segments, many at a time.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+__appname__ = "tessellate.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# core modules
+
+# installed modules
+import numpy
+
+# local modules
+
+# local classes
+
+# constants
+
+# the Bernstein basis and line index for each number of steps, made as needed
+bases = {}
+indexes = {}
+
+
+def basis(nsteps):
+    """ Return the (nsteps x 4) cubic Bernstein basis matrix.
+
+    Row i holds the weights of the four control points at t = i/(nsteps-1),
+    so the same points as curves.cubic_spline.
+    """
+    if nsteps not in bases:
+        t = numpy.linspace(0, 1, nsteps)
+        s = 1 - t
+        bases[nsteps] = numpy.column_stack((s*s*s, 3*s*s*t, 3*s*t*t, t*t*t))
+    return bases[nsteps]
+
+
+def index(nsteps):
+    """ Return the index joining nsteps points into line segments, the same
+    as curves.cubic_spline's. Don't change it, it's shared. """
+    if nsteps not in indexes:
+        indexes[nsteps] = [0] + [int(x * 0.5) for x in range(2, (nsteps-1)*2)] + \
+                          [nsteps-1]
+    return indexes[nsteps]
+
+
+def arcs(points, arcindex):
+    """ Return the control points of each arc as an (arcs x 4 x 2) array.
+
+    points is a list of (x, y) and arcindex a list of fourples of indexes
+    into it, as Circle and Line keep them.
+    """
+    return numpy.asarray(points, dtype=float)[numpy.asarray(arcindex)]
+
+
+def tessellate(controls, nsteps):
+    """ Break arcs into nsteps points each.
+
+    controls is an (arcs x 4 x 2) array of control points. Returns the
+    points as a list (one per arc) of lists of (x, y), all from one matrix
+    multiply.
+    """
+    if not len(controls):
+        return []
+    points = numpy.matmul(basis(nsteps), controls)
+    return [map(tuple, arc) for arc in points.tolist()]
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Affine transforms between the field and the screen, laser and path grid.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+__appname__ = "transform.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# core modules
+
+# installed modules
+import numpy
+
+# local modules
+
+# local classes
+
+# constants
+
+
+class Affine(object):
+    """ Moves points from one coordinate system to another.
+
+        p -> (p - origin) * scale + offset, done to a whole array of points
+        at once. With ints (for pixels and path squares), the scaled part
+        is truncated to an int before the offset is added.
+
+        We keep the parts rather than just the matrix, and apply them in
+        that order, so that points come out exactly as they did when we
+        worked them out one number at a time: a point on the edge of a path
+        square stays in the same square.
+
+        Stores the following values:
+            origin: (x, y) that maps to offset
+            scale: how many new units to one old one
+            offset: (x, y) where origin ends up
+            ints: whether to return ints
+            origin_array, offset_array: origin and offset as numpy arrays
+
+    """
+
+    def __init__(self, scale, origin=(0, 0), offset=(0, 0), ints=False):
+        self.scale = scale
+        self.origin = (float(origin[0]), float(origin[1]))
+        self.offset = tuple(offset)
+        self.ints = ints
+        # the same, for transforming arrays
+        self.origin_array = numpy.array(self.origin)
+        self.offset_array = numpy.array(self.offset)
+
+    def matrix(self):
+        """ Return the 3 x 3 matrix of the transform (ignoring ints). """
+        s = self.scale
+        (ox, oy) = self.origin
+        (dx, dy) = self.offset
+        return numpy.array([[s, 0, dx - ox*s],
+                            [0, s, dy - oy*s],
+                            [0, 0, 1]], dtype=float)
+
+    def apply(self, points):
+        """ Transform an (n x 2) array of points, returning a new one. """
+        scaled = (numpy.asarray(points, dtype=float) - self.origin_array) * \
+                 self.scale
+        if self.ints:
+            return scaled.astype(int) + self.offset_array
+        return scaled + self.offset_array
+
+    def apply_point(self, p):
+        """ Transform one point (x, y), without numpy (quicker for one). """
+        x = (p[0] - self.origin[0]) * self.scale
+        y = (p[1] - self.origin[1]) * self.scale
+        if self.ints:
+            return (int(x) + self.offset[0], int(y) + self.offset[1])
+        return (x + self.offset[0], y + self.offset[1])
+
+    def __call__(self, obj):
+        """ Transform a point, a list of points, or lists of those.
+
+        A point (x, y) comes back as a tuple, and lists (or tuples) of
+        points come back as lists, as MyField always has. Anything else is
+        returned as is.
+        """
+        if is_point(obj):
+            return self.apply_point(obj)
+        if not isinstance(obj, (list, tuple)):
+            print "ERROR: Can only rescale a point, not",obj
+            return obj
+        points = numpy.asarray(obj)
+        if points.ndim == 2 and points.shape[1] == 2 and \
+                points.dtype.kind in 'iuf':
+            return map(tuple, self.apply(points).tolist())
+        return [self(p) for p in obj]
+
+
+def is_point(obj):
+    return isinstance(obj, tuple) and len(obj) == 2 and \
+           isinstance(obj[0], (int, float)) and isinstance(obj[1], (int, float))